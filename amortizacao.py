@@ -0,0 +1,329 @@
+# amortizacao.py
+# Motor de amortização SAC/PRICE vetorizado (NumPy).
+#
+# Todas as funções aceitam escalares ou arrays (broadcast) para valor financiado e juros;
+# as tabelas completas têm shape (..., prazo) e são montadas de uma vez, sem loop por mês.
+#
+# Modelo de parcela (um só para todas as linhas, com os encargos configurados):
+#   - juros: taxa anual efetiva (%) convertida para a taxa mensal equivalente (1+j)^(1/12)-1
+#   - encargos: taxa de administração fixa por mês + seguro proporcional ao saldo devedor
+#     do início do mês (MIP), em fração do saldo por mês.
+#
+# O seed (tabela `expected` do banco) é a referência das parcelas cotadas. conferir_seed()
+# decide, por combinação, se o motor reproduz as quatro parcelas semeadas dentro de
+# TOLERANCIA_SEED com esses encargos; só então a cotação (parcelas()), a tabela mês a mês e a
+# grade de cenários usam o motor sem ressalva. Nas demais (o seed não segue um modelo único de
+# encargos; parcela 0 = fora da faixa de elegibilidade) a cotação é a do seed.
+#
+# Modo centavos (funções *_centavos): o mesmo modelo em ponto fixo, como nos extratos do
+# banco. Valores em centavos inteiros (int64); a cada mês juros e seguro são arredondados ao
+# centavo (meio para o par, o mesmo de np.rint e round()), o saldo é exato e a última
+# amortização quita o resíduo, então a soma das amortizações é exatamente o valor financiado.
+# A SAC é montada de uma vez; a PRICE depende do saldo arredondado do mês anterior, então
+# percorre os meses num loop vetorizado sobre todos os cenários do lote.
+import functools
+
+import numpy as np
+
+TAXA_ADM_PADRAO = 25.0         # R$ por mês
+TAXA_SEGURO_PADRAO = 0.000252  # fração do saldo devedor por mês
+# diferença máxima (R$) frente a cada parcela do seed
+TOLERANCIA_SEED = {'price_primeira': 0.20, 'price_ultima': 0.20, 'sac_primeira': 0.10, 'sac_ultima': 0.10}
+
+
+def taxa_mensal(juros):
+    # juros ao ano em % -> taxa efetiva mensal (fração)
+    return np.power(1.0 + np.asarray(juros, dtype=float) / 100.0, 1.0 / 12.0) - 1.0
+
+
+def _prestacao_price(valor, i, prazo):
+    # prestação fixa da PRICE; com juros zero vira valor/prazo
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pmt = valor * i / (1.0 - np.power(1.0 + i, -prazo))
+    return np.where(i == 0, valor / prazo, pmt)
+
+
+def _saldo_inicial_price(valor, i, prazo, k):
+    # saldo devedor no início do mês k (k = 0..prazo-1), forma fechada
+    f = 1.0 + i
+    fn = np.power(f, prazo)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        saldo = valor * (fn - np.power(f, k)) / (fn - 1.0)
+    return np.where(i == 0, valor * (1.0 - k / prazo), saldo)
+
+
+def tabela_sac(valor, juros, prazo, taxa_adm=0.0, taxa_seguro=0.0):
+    valor = np.asarray(valor, dtype=float)[..., None]
+    i = taxa_mensal(juros)[..., None]
+    k = np.arange(prazo, dtype=float)
+    amort = valor / prazo
+    saldo_ini = valor - amort * k
+    juros_mes = saldo_ini * i
+    encargos = saldo_ini * taxa_seguro + taxa_adm
+    amort = np.broadcast_to(amort, juros_mes.shape)
+    return {
+        'parcela': amort + juros_mes + encargos,
+        'juros': juros_mes,
+        'amortizacao': amort,
+        'encargos': encargos,
+        'saldo': saldo_ini - amort,
+    }
+
+
+def tabela_price(valor, juros, prazo, taxa_adm=0.0, taxa_seguro=0.0):
+    valor = np.asarray(valor, dtype=float)[..., None]
+    i = taxa_mensal(juros)[..., None]
+    k = np.arange(prazo, dtype=float)
+    pmt = _prestacao_price(valor, i, prazo)
+    saldo_ini = _saldo_inicial_price(valor, i, prazo, k)
+    juros_mes = saldo_ini * i
+    amort = pmt - juros_mes
+    encargos = saldo_ini * taxa_seguro + taxa_adm
+    return {
+        'parcela': pmt + encargos,
+        'juros': juros_mes,
+        'amortizacao': amort,
+        'encargos': encargos,
+        'saldo': saldo_ini - amort,
+    }
+
+
+def linhas_tabela(valor, juros, prazo, sistema='SAC', taxa_adm=0.0, taxa_seguro=0.0, centavos=False):
+    # a tabela completa de um financiamento, um mês por vez (gerador), para streaming:
+    # (mes, parcela, juros, amortizacao, encargos, saldo). Mesmas contas de tabela_sac /
+    # tabela_price (ou das versões *_centavos), em escalares, sem montar a tabela em memória
+    if centavos:
+        yield from _linhas_tabela_centavos(valor, juros, prazo, sistema, taxa_adm, taxa_seguro)
+        return
+    valor, prazo = float(valor), int(prazo)
+    i = float(taxa_mensal(juros))
+    if sistema == 'SAC':
+        amort = valor / prazo
+        pmt = None
+    else:
+        pmt = float(_prestacao_price(valor, i, prazo))
+        fn = (1.0 + i) ** prazo
+    for k in range(prazo):
+        if pmt is None:
+            saldo_ini = valor - amort * k
+        elif i == 0:
+            saldo_ini = valor * (1.0 - k / prazo)
+        else:
+            saldo_ini = valor * (fn - (1.0 + i) ** k) / (fn - 1.0)
+        juros_mes = saldo_ini * i
+        encargos = saldo_ini * taxa_seguro + taxa_adm
+        if pmt is not None:
+            amort = pmt - juros_mes
+        # última linha quita o saldo (sem o resíduo de ponto flutuante)
+        saldo = saldo_ini - amort if k < prazo - 1 else 0.0
+        yield k + 1, amort + juros_mes + encargos, juros_mes, amort, encargos, saldo
+
+
+def _linhas_tabela_centavos(valor, juros, prazo, sistema, taxa_adm, taxa_seguro):
+    # inteiros do Python, com o mesmo arredondamento de tabela_*_centavos; devolve em reais
+    saldo, prazo = int(_centavos(valor)), int(prazo)
+    i = float(taxa_mensal(juros))
+    adm = int(_centavos(taxa_adm))
+    v = saldo
+    pmt = round(float(_prestacao_price(saldo, i, prazo)))
+    for k in range(prazo):
+        juros_mes = round(saldo * i)
+        if k == prazo - 1:
+            amort = saldo
+        elif sistema == 'SAC':
+            amort = round(v * (k + 1) / prazo) - round(v * k / prazo)
+        else:
+            amort = pmt - juros_mes
+        encargos = round(saldo * taxa_seguro) + adm
+        saldo -= amort
+        yield k + 1, (amort + juros_mes + encargos) / 100, juros_mes / 100, amort / 100, encargos / 100, saldo / 100
+
+
+def _centavos(reais):
+    return np.rint(np.asarray(reais, dtype=float) * 100.0).astype(np.int64)
+
+
+def _arredondar(x):
+    return np.rint(x).astype(np.int64)
+
+
+def tabela_sac_centavos(valor, juros, prazo, taxa_adm=0.0, taxa_seguro=0.0):
+    # mesmas chaves de tabela_sac, em int64 centavos
+    # saldo no início do mês k = valor - round(valor * k / prazo): cada amortização fica a
+    # menos de 1 centavo de valor/prazo e a soma delas é exatamente o valor
+    v = _centavos(valor)[..., None]
+    i = taxa_mensal(juros)[..., None]
+    pago = _arredondar(v * np.arange(prazo + 1, dtype=np.int64) / prazo)
+    saldo_ini = v - pago[..., :-1]
+    amort = np.diff(pago, axis=-1)
+    juros_mes = _arredondar(saldo_ini * i)
+    encargos = _arredondar(saldo_ini * taxa_seguro) + _centavos(taxa_adm)
+    return {
+        'parcela': amort + juros_mes + encargos,
+        'juros': juros_mes,
+        'amortizacao': amort,
+        'encargos': encargos,
+        'saldo': saldo_ini - amort,
+    }
+
+
+def _saldos_price(v, i, pmt, prazo, todos=True):
+    # saldo do início de cada mês da PRICE arredondada, shape (..., max(prazo)); cenários com
+    # prazo menor param no saldo do seu último mês. Com todos=False devolve só o do último
+    # mês, sem guardar os outros. Depende do mês anterior, então é um loop nos meses: com um
+    # cenário só em inteiros do Python (sem o custo fixo de cada operação do NumPy); com
+    # vários, vetorizado, com os centavos em float64 de valor inteiro (exatos até 2**53) para
+    # não converter a cada mês
+    n = int(np.max(prazo))
+    if v.size == 1:
+        s, t, p = int(v.flat[0]), float(i.flat[0]), int(pmt.flat[0])
+        saldos = [s]
+        for _ in range(n - 1):
+            s += round(s * t) - p
+            saldos.append(s)
+        saldos = np.array(saldos, dtype=np.int64).reshape(v.shape + (n,))
+        return saldos if todos else saldos[..., -1]
+    ultimo = np.asarray(prazo) - 1
+    uniforme = ultimo.min() == ultimo.max()
+    saldos = np.empty(v.shape + (n,), dtype=np.int64) if todos else None
+    s, p = v.astype(float), pmt.astype(float)
+    t = np.empty_like(s)
+    for k in range(n - 1):
+        if todos:
+            saldos[..., k] = s
+        np.multiply(s, i, out=t)
+        np.rint(t, out=t)
+        t -= p
+        if uniforme:
+            s += t
+        else:
+            np.add(s, t, out=s, where=k < ultimo)
+    if not todos:
+        return s.astype(np.int64)
+    saldos[..., n - 1] = s
+    return saldos
+
+
+def tabela_price_centavos(valor, juros, prazo, taxa_adm=0.0, taxa_seguro=0.0):
+    # mesmas chaves de tabela_price, em int64 centavos; a prestação (sem encargos) é fixa e
+    # só a última muda, para quitar o resíduo dos arredondamentos
+    v = _centavos(valor)
+    i = np.broadcast_to(taxa_mensal(juros), v.shape)
+    pmt = _arredondar(_prestacao_price(v, i, prazo))
+    saldo_ini = _saldos_price(v, i, pmt, prazo)
+    juros_mes = _arredondar(saldo_ini * i[..., None])
+    amort = pmt[..., None] - juros_mes
+    amort[..., -1] = saldo_ini[..., -1]
+    encargos = _arredondar(saldo_ini * taxa_seguro) + _centavos(taxa_adm)
+    return {
+        'parcela': amort + juros_mes + encargos,
+        'juros': juros_mes,
+        'amortizacao': amort,
+        'encargos': encargos,
+        'saldo': saldo_ini - amort,
+    }
+
+
+def resumo_centavos(valor, juros, prazo, taxa_adm=0.0, taxa_seguro=0.0, price_ultima=True):
+    # resumo() em int64 centavos, aceitando prazo diferente por cenário. SAC e 1ª PRICE em
+    # forma fechada; a última PRICE percorre os meses (_saldos_price) e pode ser dispensada
+    v = _centavos(valor)
+    prazo = np.asarray(prazo, dtype=np.int64)
+    v, prazo = np.broadcast_arrays(v, prazo)
+    i = np.broadcast_to(taxa_mensal(juros), v.shape)
+    adm = _centavos(taxa_adm)
+    base = _arredondar(v / prazo)
+    ultimo_sac = v - _arredondar(v * (prazo - 1) / prazo)
+    pmt = _arredondar(_prestacao_price(v, i, prazo))
+    r = {
+        'sac_primeira': base + _arredondar(v * i) + _arredondar(v * taxa_seguro) + adm,
+        'sac_ultima': ultimo_sac + _arredondar(ultimo_sac * i) + _arredondar(ultimo_sac * taxa_seguro) + adm,
+        'price_primeira': pmt + _arredondar(v * taxa_seguro) + adm,
+    }
+    if price_ultima:
+        saldo = _saldos_price(v, i, pmt, prazo, todos=False)
+        r['price_ultima'] = saldo + _arredondar(saldo * i) + _arredondar(saldo * taxa_seguro) + adm
+    return r
+
+
+def tabelas(valor, juros, prazo, taxa_adm=0.0, taxa_seguro=0.0):
+    return (tabela_sac(valor, juros, prazo, taxa_adm, taxa_seguro),
+            tabela_price(valor, juros, prazo, taxa_adm, taxa_seguro))
+
+
+def resumo(valor, juros, prazo, taxa_adm=0.0, taxa_seguro=0.0):
+    # primeira/última parcela de cada sistema em forma fechada (não monta a tabela);
+    # aceita arrays de qualquer shape compatível, inclusive prazo por cenário
+    valor = np.asarray(valor, dtype=float)
+    prazo = np.asarray(prazo, dtype=float)
+    i = taxa_mensal(juros)
+    amort = valor / prazo
+    pmt = _prestacao_price(valor, i, prazo)
+    saldo_ultimo_price = _saldo_inicial_price(valor, i, prazo, prazo - 1)
+    return {
+        'sac_primeira': amort + valor * i + valor * taxa_seguro + taxa_adm,
+        'sac_ultima': amort * (1.0 + i) + amort * taxa_seguro + taxa_adm,
+        'price_primeira': pmt + valor * taxa_seguro + taxa_adm,
+        'price_ultima': pmt + saldo_ultimo_price * taxa_seguro + taxa_adm,
+    }
+
+
+@functools.lru_cache(maxsize=4096)
+def _conferir(valor, juros, prazo, semeado, taxa_adm, taxa_seguro, centavos):
+    if centavos:
+        r = {k: int(v) / 100 for k, v in resumo_centavos(valor, juros, prazo, taxa_adm, taxa_seguro).items()}
+    else:
+        r = {k: round(float(v), 2) for k, v in resumo(valor, juros, prazo, taxa_adm, taxa_seguro).items()}
+    diferencas = {k: round(r[k] - v, 2) for k, v in zip(TOLERANCIA_SEED, semeado)}
+    reproduz = all(semeado) and all(abs(d) <= TOLERANCIA_SEED[k] for k, d in diferencas.items())
+    return reproduz, r, diferencas
+
+
+def conferir_seed(s, prazo, taxa_adm=TAXA_ADM_PADRAO, taxa_seguro=TAXA_SEGURO_PADRAO, centavos=False):
+    # (reproduz, calculado, diferencas) para a linha do seed `s` (valor_liberado, juros e as
+    # parcelas de TOLERANCIA_SEED): reproduz é True se o motor chega às quatro parcelas semeadas
+    # dentro da tolerância; combinação sem valor ou com parcela 0 no seed nunca reproduz.
+    # É a decisão usada pela cotação, pela tabela e pela grade
+    semeado = tuple(float(getattr(s, k) or 0.0) for k in TOLERANCIA_SEED)
+    if not s.valor_liberado or s.valor_liberado <= 0:
+        return False, dict(zip(TOLERANCIA_SEED, semeado)), {k: 0.0 for k in TOLERANCIA_SEED}
+    return _conferir(float(s.valor_liberado), float(s.juros), int(prazo), semeado,
+                     float(taxa_adm), float(taxa_seguro), bool(centavos))
+
+
+def parcelas(s, prazo, taxa_adm=TAXA_ADM_PADRAO, taxa_seguro=TAXA_SEGURO_PADRAO, centavos=False):
+    # (price, sac_ini, sac_fim) em reais para gravar em cliente: as do motor quando ele
+    # reproduz a linha do seed `s` (conferir_seed), senão as semeadas
+    reproduz, calculado, _ = conferir_seed(s, prazo, taxa_adm, taxa_seguro, centavos)
+    if reproduz:
+        return calculado['price_primeira'], calculado['sac_primeira'], calculado['sac_ultima']
+    return float(s.price_primeira or 0.0), float(s.sac_primeira or 0.0), float(s.sac_ultima or 0.0)
+
+
+def valor_maximo_financiado(renda, juros, prazo, sistema='SAC', comprometimento=0.30,
+                            taxa_adm=TAXA_ADM_PADRAO, taxa_seguro=TAXA_SEGURO_PADRAO):
+    # maior valor financiado cuja primeira parcela (a maior nos dois sistemas) cabe em
+    # `comprometimento` da renda; a primeira parcela é linear no valor, então a inversão é exata
+    renda = np.asarray(renda, dtype=float)
+    prazo = np.asarray(prazo, dtype=float)
+    i = taxa_mensal(juros)
+    if sistema == 'SAC':
+        coef = 1.0 / prazo + i + taxa_seguro
+    else:
+        coef = _prestacao_price(1.0, i, prazo) + taxa_seguro
+    return np.maximum(renda * comprometimento - taxa_adm, 0.0) / coef
+
+
+def grade_primeiras(valor_liquido, juros, prazos, entradas,
+                    taxa_adm=TAXA_ADM_PADRAO, taxa_seguro=TAXA_SEGURO_PADRAO):
+    # primeira parcela PRICE e SAC de toda a grade juros × prazo × entrada numa conta só
+    # (broadcast), com shape (len(juros), len(prazos), len(entradas)).
+    # valor_liquido = valor do imóvel menos o subsídio; financia-se valor_liquido - entrada,
+    # e cenários em que a entrada cobre tudo ficam com parcela 0
+    j = np.asarray(juros, dtype=float)[:, None, None]
+    p = np.asarray(prazos, dtype=float)[None, :, None]
+    valor = np.maximum(valor_liquido - np.asarray(entradas, dtype=float), 0.0)[None, None, :]
+    r = resumo(valor, j, p, taxa_adm, taxa_seguro)
+    sem_financiamento = valor <= 0
+    return (np.where(sem_financiamento, 0.0, r['price_primeira']),
+            np.where(sem_financiamento, 0.0, r['sac_primeira']))
@@ -0,0 +1,157 @@
+# arquivo.py
+# Retenção: leva os leads parados há mais de N meses (criado_em, a data da última simulação)
+# para o arquivo morto e os tira de cliente.
+#
+#   python arquivo.py --meses 12 --dir /var/data/arquivo
+#
+# O arquivo morto é um NDJSON comprimido por mês de criado_em (clientes-aaaa-mm.ndjson.gz), um
+# lead por linha com o histórico das suas simulações em "historico" (cliente_simulacao),
+# só com acréscimos: cada lote vira um novo membro gzip no fim do arquivo do mês (zcat e
+# gzip.open leem os membros em sequência, como um arquivo só). O lote é gravado e
+# sincronizado em disco dentro da transação que apaga os leads (main.excluir_clientes) e o
+# tamanho confirmado de cada arquivo vai para arquivo_segmento na mesma transação. Se o
+# processo cair entre a escrita e o commit, a próxima execução corta o arquivo de volta ao
+# tamanho confirmado: nenhum lead fica nos dois lugares nem some.
+#
+# Só meses inteiros são arquivados (o corte é o dia 1º do mês de N meses atrás), e leads sem
+# data ficam na tabela. O resumo do painel é decrementado como numa exclusão. Rode por cron.
+import argparse
+import fcntl
+import gzip
+import json
+import logging
+import os
+import sys
+import time
+from datetime import date
+
+from sqlalchemy import select
+
+import modelos
+import resumo
+
+RETENCAO_MESES = 12
+
+
+def corte(meses, hoje=None):
+    # 1º dia do mês de `meses` meses atrás, como 'aaaa-mm-dd' (mesmo formato de resumo.dia)
+    hoje = hoje or date.today()
+    n = hoje.year * 12 + hoje.month - 1 - meses
+    return f'{n // 12:04d}-{n % 12 + 1:02d}-01'
+
+
+def nome(mes):
+    return f'clientes-{mes}.ndjson.gz'
+
+
+class Arquivo:
+    def __init__(self, diretorio, db, segmento, simulacao):
+        self.diretorio, self.db, self.segmento, self.simulacao = diretorio, db, segmento, simulacao
+        os.makedirs(diretorio, exist_ok=True)
+
+    def caminho(self, mes):
+        return os.path.join(self.diretorio, nome(mes))
+
+    def reconciliar(self):
+        # corta o que foi escrito sem commit: lote que falhou ou processo que caiu entre a
+        # escrita e o commit. O tamanho confirmado vem do banco, não da memória.
+        confirmados = {s.mes: s.bytes for s in self.db.session.query(self.segmento)}
+        self.db.session.rollback()
+        for arquivo in sorted(os.listdir(self.diretorio)):
+            if not (arquivo.startswith('clientes-') and arquivo.endswith('.ndjson.gz')):
+                continue
+            mes = arquivo[len('clientes-'):-len('.ndjson.gz')]
+            caminho, tamanho = self.caminho(mes), confirmados.get(mes, 0)
+            atual = os.path.getsize(caminho)
+            if atual < tamanho:
+                raise RuntimeError(f'{caminho}: {atual} bytes, menor que os {tamanho} confirmados')
+            if atual > tamanho:
+                logging.warning('%s: descartando %d bytes não confirmados', caminho, atual - tamanho)
+                os.truncate(caminho, tamanho)
+
+    def gravar(self, linhas):
+        # roda na transação do lote (antes_de_apagar do main.excluir_clientes)
+        s = self.simulacao.__table__
+        historico = {}
+        for h in self.db.session.execute(select(*s.columns).where(s.c.cliente_id.in_([r.id for r in linhas]))
+                                         .order_by(s.c.id)):
+            historico.setdefault(h.cliente_id, []).append({k: v for k, v in h._mapping.items() if k != 'cliente_id'})
+        por_mes = {}
+        for r in linhas:
+            por_mes.setdefault(resumo.dia(r.criado_em)[:7], []).append(
+                json.dumps(dict(r._mapping, historico=historico.get(r.id, [])), ensure_ascii=False,
+                           separators=(',', ':')))
+        for mes, jsons in sorted(por_mes.items()):
+            membro = gzip.compress(('\n'.join(jsons) + '\n').encode('utf-8'), compresslevel=6)
+            caminho = self.caminho(mes)
+            novo = not os.path.exists(caminho)
+            fd = os.open(caminho, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                antes = os.fstat(fd).st_size
+                os.write(fd, membro)
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            if novo:
+                _sincronizar_diretorio(self.diretorio)
+            s = self.db.session.get(self.segmento, mes)
+            if s is None:
+                s = self.segmento(mes=mes, bytes=0, linhas=0)
+                self.db.session.add(s)
+            s.bytes, s.linhas, s.atualizado_em = antes + len(membro), s.linhas + len(jsons), time.time()
+
+
+def _sincronizar_diretorio(diretorio):
+    fd = os.open(diretorio, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def arquivar(main, meses, diretorio, lote=None):
+    arquivo = Arquivo(diretorio, main.db, modelos.ArquivoSegmento, modelos.ClienteSimulacao)
+    with open(os.path.join(diretorio, '.trava'), 'a') as trava:
+        # uma execução por vez (cron sobreposto)
+        fcntl.flock(trava, fcntl.LOCK_EX)
+        arquivo.reconciliar()
+        dia = resumo.dia_sql(main.Cliente.criado_em)
+        consulta = (main.db.select(*main.Cliente.__table__.columns)
+                    .where(dia < corte(meses), dia != ''))
+        try:
+            return main.excluir_clientes(consulta, arquivo.gravar, lote)
+        except Exception:
+            # os lotes já confirmados ficam; o que falhou sai dos arquivos agora (ou na
+            # próxima execução, se nem o banco responder)
+            try:
+                arquivo.reconciliar()
+            except Exception:
+                logging.exception('Falha ao reconciliar o arquivo morto')
+            raise
+
+
+def main_cli():
+    p = argparse.ArgumentParser(description='Arquiva (NDJSON gzip por mês) e remove os leads antigos')
+    p.add_argument('--meses', type=int, default=int(os.getenv('RETENCAO_MESES', RETENCAO_MESES)),
+                   help='mantém na tabela os leads dos últimos N meses (padrão RETENCAO_MESES ou 12)')
+    p.add_argument('--dir', default=os.getenv('ARQUIVO_DIR'),
+                   help='diretório dos segmentos (padrão ARQUIVO_DIR ou arquivo/ ao lado do banco)')
+    p.add_argument('--lote', type=int, default=None, help='leads por transação (padrão EXCLUSAO_LOTE)')
+    args = p.parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import main
+    diretorio = args.dir or os.path.join(os.path.dirname(os.path.abspath(os.getenv('DB_PATH', 'simulador.db'))),
+                                         'arquivo')
+    inicio = time.perf_counter()
+    with main.app.app_context():
+        total, lotes = arquivar(main, args.meses, diretorio, args.lote)
+        segmentos = main.db.session.query(modelos.ArquivoSegmento).order_by(modelos.ArquivoSegmento.mes).all()
+    print(f'{total} leads anteriores a {corte(args.meses)} arquivados em {lotes} lote(s), '
+          f'{time.perf_counter() - inicio:.1f}s')
+    for s in segmentos:
+        print(f'  {nome(s.mes)}: {s.linhas} leads, {s.bytes / 1024:,.0f} KiB')
+
+
+if __name__ == '__main__':
+    main_cli()
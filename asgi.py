@@ -0,0 +1,296 @@
+# asgi.py
+# Variante ASGI do app, para muitas requisições lentas simultâneas num processo só.
+#
+#   uvicorn asgi:app --host 0.0.0.0 --port $PORT --workers 4
+#
+# As rotas que esperam pelo banco (/simular, /resultado/<id> e /admin) rodam aqui como
+# corrotinas, com o driver assíncrono (aiosqlite ou asyncpg, conforme o DATABASE_URL) e o
+# pool do create_async_engine: enquanto uma espera o commit ou a leitura, o event loop atende
+# as outras. O HTML, os cálculos e as consultas são os mesmos do main.py (dados_cliente,
+# render_resultado, pagina_admin, ...). As demais rotas vão para o próprio app Flask, num
+# pool de threads (a2wsgi). A sessão é o mesmo cookie assinado do Flask, então o login feito
+# numa rota vale na outra.
+#
+# O índice de simulações continua síncrono (é memória local; só o recarregamento após uma
+# mudança no seed consulta o banco).
+# Sem o gunicorn.conf.py ninguém limpa o diretório de métricas ao subir: aponte
+# PROMETHEUS_MULTIPROC_DIR para um diretório novo a cada deploy.
+import asyncio
+import logging
+import os
+import re
+import time
+from urllib.parse import parse_qs
+
+from a2wsgi import WSGIMiddleware
+from flask import session
+from sqlalchemy import event, insert, make_url, select
+from sqlalchemy.ext.asyncio import create_async_engine
+
+import conexao_sqlite
+import leads
+import main
+import metricas
+import paginas
+
+ASYNC_POOL_SIZE = int(os.getenv('ASYNC_POOL_SIZE', '20'))
+ASYNC_MAX_OVERFLOW = int(os.getenv('ASYNC_MAX_OVERFLOW', '20'))
+WSGI_THREADS = int(os.getenv('WSGI_THREADS', '16'))
+CORPO_MAX = 64 * 1024
+HTML = 'text/html; charset=utf-8'
+
+
+def url_async(url):
+    # mesmo banco do main.py, com o driver assíncrono
+    u = make_url(url)
+    if u.get_backend_name() == 'sqlite':
+        return u.set(drivername='sqlite+aiosqlite')
+    # client_encoding é parâmetro do psycopg2; o asyncpg já fala UTF-8
+    return u.set(drivername='postgresql+asyncpg',
+                 query={k: v for k, v in u.query.items() if k != 'client_encoding'})
+
+
+ENGINE = create_async_engine(url_async(main.DATABASE_URL), pool_size=ASYNC_POOL_SIZE,
+                             max_overflow=ASYNC_MAX_OVERFLOW)
+
+if ENGINE.dialect.name == 'sqlite':
+    @event.listens_for(ENGINE.sync_engine, 'connect')
+    def _configurar_sqlite(dbapi_con, registro):
+        conexao_sqlite.configurar(dbapi_con.cursor(), os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL'),
+                                  int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000')))
+
+CLIENTE = main.Cliente.__table__
+ALIAS = main.ClienteAlias.__table__
+OUTBOX = main.EmailOutbox.__table__
+RESUMO = main.ClienteResumo.__table__
+SIMULACAO = main.ClienteSimulacao.__table__
+FLASK = WSGIMiddleware(main.app, workers=WSGI_THREADS)
+
+
+def _contexto(scope):
+    # contexto de requisição do Flask (session, request.args, url_for) sem passar pelo WSGI
+    headers = [(k.decode('latin-1'), v.decode('latin-1')) for k, v in scope['headers']]
+    return main.app.test_request_context(scope['path'], method=scope['method'],
+                                         query_string=scope['query_string'].decode('latin-1'), headers=headers)
+
+
+async def _corpo(receive):
+    partes, tamanho = [], 0
+    while True:
+        msg = await receive()
+        partes.append(msg.get('body', b''))
+        tamanho += len(partes[-1])
+        if tamanho > CORPO_MAX:
+            raise ValueError('corpo grande demais')
+        if not msg.get('more_body'):
+            return b''.join(partes)
+
+
+def _resolver(futuro, resultado=None, erro=None):
+    # a requisição pode ter sido cancelada (cliente desconectou) enquanto o grupo gravava
+    if futuro.done():
+        return
+    if erro is not None:
+        futuro.set_exception(erro)
+    else:
+        futuro.set_result(resultado)
+
+
+class EscritaAgrupada:
+    # group commit do /simular dentro do event loop (como o commit_agrupado.py faz entre
+    # threads): uma única tarefa grava, numa transação só, todos os clientes que chegaram
+    # enquanto ela gravava o grupo anterior, um upsert por lead (leads.py; o mesmo telefone
+    # pode aparecer duas vezes no grupo, então não vai num INSERT em lote). Não há
+    # janela de espera: sem concorrência cada grupo tem um cliente. As requisições não
+    # disputam a trava de escrita do SQLite (que espera com recuo e estoura o p95) e, no
+    # Postgres, várias gravações custam as idas e voltas de uma. Se o grupo falhar, os
+    # clientes são gravados um a um para que só o culpado receba o erro.
+    def __init__(self, max_grupo=200):
+        self.max_grupo = max_grupo
+        self._fila = None
+        self.grupos = 0
+        self.escritas = 0
+
+    async def gravar(self, valores):
+        if self._fila is None:
+            self._fila = asyncio.Queue()
+            asyncio.get_running_loop().create_task(self._loop())
+        futuro = asyncio.get_running_loop().create_future()
+        await self._fila.put((valores, futuro))
+        return await futuro
+
+    async def _loop(self):
+        while True:
+            grupo = [await self._fila.get()]
+            while len(grupo) < self.max_grupo and not self._fila.empty():
+                grupo.append(self._fila.get_nowait())
+            try:
+                ids = await self._inserir([v for v, _ in grupo])
+            except Exception as e:
+                if len(grupo) == 1:
+                    _resolver(grupo[0][1], erro=e)
+                    continue
+                # refaz um a um para isolar o culpado
+                for valores, futuro in grupo:
+                    try:
+                        _resolver(futuro, (await self._inserir([valores]))[0])
+                    except Exception as e:
+                        _resolver(futuro, erro=e)
+                continue
+            for (_, futuro), cid in zip(grupo, ids):
+                _resolver(futuro, cid)
+
+    async def _inserir(self, lista):
+        # lead, resumo, histórico e e-mail da outbox na mesma transação, como no main.py
+        dialeto, gravados = ENGINE.dialect.name, []
+        async with ENGINE.begin() as con:
+            for valores in lista:
+                lead = (await con.execute(leads.upsert(CLIENTE, dialeto), valores)).one()
+                anterior = None
+                if lead.simulacoes > 1:
+                    anterior = (await con.execute(leads.anterior(SIMULACAO), {'cliente_id': lead.id})).first()
+                for stmt, params in leads.instrucoes(RESUMO, SIMULACAO, dialeto, lead.id, valores, anterior):
+                    await con.execute(stmt, params)
+                gravados.append(lead)
+            # e-mail só para lead novo
+            novos = [v for v, lead in zip(lista, gravados) if lead.simulacoes == 1]
+            if main.OUTBOX is not None and novos:
+                await con.execute(insert(OUTBOX), [main.OUTBOX.linha(
+                    'Nova simulação', main.corpo_email(*main.dados_email(v))) for v in novos])
+        self.grupos += 1
+        self.escritas += len(lista)
+        for lead in gravados:
+            metricas.observar_simulacao(lead.simulacoes == 1)
+        repetidos = [lead.id for lead in gravados if lead.simulacoes > 1]
+        if repetidos:
+            main.RESULTADOS.invalidar(*repetidos)
+        if main.OUTBOX is not None and novos:
+            metricas.EMAILS_ENFILEIRADOS.inc(len(novos))
+            main.OUTBOX.acordar()
+        return [lead.id for lead in gravados]
+
+
+ESCRITA = EscritaAgrupada()
+
+
+# ---------- rotas ----------
+# cada rota devolve (status, headers, corpo); corpo é str, bytes ou um gerador assíncrono de str
+async def simular(scope, receive, args):
+    try:
+        form = {k: v[0] for k, v in parse_qs((await _corpo(receive)).decode()).items()}
+    except (ValueError, UnicodeDecodeError):
+        return 400, [], 'Dados inválidos'
+    nome, tel = form.get('nome'), form.get('telefone')
+    renda, imovel = form.get('renda'), form.get('valor_imovel')
+    if not all([nome, tel, renda, imovel]):
+        return 400, [], 'Dados incompletos'
+    with main.app.app_context():
+        valores = main.dados_cliente(nome, tel, renda, imovel)
+    if valores is None:
+        return 400, [], 'Simulação não encontrada para a combinação selecionada.'
+
+    cid = await ESCRITA.gravar(valores)
+    return 302, [(b'location', f'/resultado/{cid}'.encode())], ''
+
+
+async def resultado(scope, receive, args):
+    # mesmo cache de páginas do main.py (só vai ao banco numa falta)
+    cid = int(args[0])
+    p = main.RESULTADOS.buscar(cid)
+    if p is None:
+        async with ENGINE.connect() as con:
+            c = (await con.execute(select(CLIENTE).where(CLIENTE.c.id == cid))).first()
+            if c is None:
+                # id de um cliente juntado a outro lead (leads.py juntar)
+                lead = (await con.execute(select(ALIAS.c.cliente_id).where(ALIAS.c.id == cid))).scalar()
+        if c is None:
+            if lead is not None:
+                return 301, [(b'location', f'/resultado/{lead}'.encode())], ''
+            return 404, [], 'Simulação não encontrada'
+        p = main.RESULTADOS.guardar(cid, main.render_resultado(c))
+    # ETag, gzip e 304 como no Flask
+    with _contexto(scope):
+        r = paginas.responder(p, main.RESULTADOS.cache_control)
+    return r.status_code, [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in r.headers.items()], r.get_data()
+
+
+async def admin(scope, receive, args):
+    with _contexto(scope):
+        if 'admin' not in session:
+            return 302, [(b'location', b'/login')], ''
+        pagina = main.pagina_admin()
+        cabecalho = main.admin_cabecalho(pagina)
+
+    async def gerar():
+        yield cabecalho
+        ultimo, n = None, 0
+        async with ENGINE.connect() as con:
+            resultado = await con.stream(pagina['consulta'])
+            async for linhas in resultado.partitions(50):
+                yield main.admin_linhas(linhas)
+                ultimo, n = linhas[-1].id, n + len(linhas)
+        with _contexto(scope):
+            yield main.admin_rodape(pagina, n, ultimo)
+
+    return 200, [], gerar()
+
+
+# (método, caminho, função, nome da rota nas métricas)
+ROTAS = [
+    ('POST', re.compile(r'/simular'), simular, '/simular'),
+    ('GET', re.compile(r'/resultado/(\d+)'), resultado, '/resultado/<int:id>'),
+    ('GET', re.compile(r'/admin'), admin, '/admin'),
+]
+
+
+def _rota(scope):
+    for metodo, padrao, funcao, nome in ROTAS:
+        if scope['method'] == metodo:
+            m = padrao.fullmatch(scope['path'])
+            if m:
+                return funcao, m.groups(), nome
+    return None
+
+
+async def _enviar(send, status, headers, corpo):
+    if not any(k == b'content-type' for k, _ in headers):
+        headers = [(b'content-type', HTML.encode())] + headers
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+    if isinstance(corpo, (str, bytes)):
+        await send({'type': 'http.response.body', 'body': corpo if isinstance(corpo, bytes) else corpo.encode()})
+        return
+    async for parte in corpo:
+        await send({'type': 'http.response.body', 'body': parte.encode(), 'more_body': True})
+    await send({'type': 'http.response.body', 'body': b''})
+
+
+async def _ciclo_de_vida(receive, send):
+    while True:
+        msg = await receive()
+        if msg['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif msg['type'] == 'lifespan.shutdown':
+            await ENGINE.dispose()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await _ciclo_de_vida(receive, send)
+    rota = _rota(scope) if scope['type'] == 'http' else None
+    if rota is None:
+        return await FLASK(scope, receive, send)
+
+    funcao, args, nome = rota
+    inicio, status = time.perf_counter(), 500
+    try:
+        status, headers, corpo = await funcao(scope, receive, args)
+        await _enviar(send, status, headers, corpo)
+    except Exception:
+        logging.exception('Erro em %s %s', scope['method'], scope['path'])
+        if status == 500:
+            await _enviar(send, 500, [], 'Erro interno')
+    finally:
+        metricas.LATENCIA.labels(nome, scope['method']).observe(time.perf_counter() - inicio)
+        metricas.REQUISICOES.labels(nome, scope['method'], str(status)).inc()
@@ -0,0 +1,105 @@
+# assets.py
+# Pipeline de assets estáticos: copia os arquivos de static/ para dist/assets com o hash
+# do conteúdo no nome (app.3f2a1b9c0d.css), gera variantes .gz e .br dos arquivos de
+# texto e grava um manifest.json com o mapeamento nome lógico -> nome com hash.
+# Como o nome muda sempre que o conteúdo muda, essas URLs são servidas como imutáveis.
+#
+# Uso (build): python assets.py
+# Em runtime, Manifesto.carregar() usa o manifest existente ou constrói na hora.
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+
+from flask import request, send_from_directory
+
+try:
+    import brotli
+except ImportError:  # opcional: sem o pacote, só as variantes gzip são geradas
+    brotli = None
+
+BASE = os.path.dirname(os.path.abspath(__file__))
+ORIGEM = os.path.join(BASE, 'static')
+DESTINO = os.path.join(BASE, 'dist', 'assets')
+ARQUIVOS = ('app.css', 'app.js', 'logo.jpg')
+COMPRIMIVEIS = ('.css', '.js', '.svg', '.html', '.json')
+CACHE_IMUTAVEL = 'public, max-age=31536000, immutable'
+
+
+def _gravar(caminho, dados):
+    tmp = f'{caminho}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(dados)
+    os.replace(tmp, caminho)
+
+
+def construir(origem=ORIGEM, destino=DESTINO, arquivos=ARQUIVOS):
+    os.makedirs(destino, exist_ok=True)
+    manifesto = {}
+    for nome in arquivos:
+        with open(os.path.join(origem, nome), 'rb') as f:
+            dados = f.read()
+        raiz, ext = os.path.splitext(nome)
+        final = f'{raiz}.{hashlib.sha256(dados).hexdigest()[:10]}{ext}'
+        caminho = os.path.join(destino, final)
+        if not os.path.exists(caminho):
+            _gravar(caminho, dados)
+            if ext in COMPRIMIVEIS:
+                variantes = {'.gz': gzip.compress(dados, compresslevel=9, mtime=0)}
+                if brotli is not None:
+                    variantes['.br'] = brotli.compress(dados, quality=11)
+                for sufixo, comprimido in variantes.items():
+                    # arquivos minúsculos podem crescer ao comprimir; aí serve-se o original
+                    if len(comprimido) < len(dados):
+                        _gravar(caminho + sufixo, comprimido)
+        manifesto[nome] = final
+    _gravar(os.path.join(destino, 'manifest.json'), json.dumps(manifesto, indent=2).encode('utf-8'))
+    return manifesto
+
+
+class Manifesto:
+    def __init__(self, mapa, destino=DESTINO, prefixo='/assets/'):
+        self.mapa, self.destino, self.prefixo = mapa, destino, prefixo
+
+    @classmethod
+    def carregar(cls, destino=DESTINO, prefixo='/assets/'):
+        try:
+            with open(os.path.join(destino, 'manifest.json'), encoding='utf-8') as f:
+                mapa = json.load(f)
+        except (OSError, ValueError):
+            try:
+                mapa = construir(destino=destino)
+            except OSError:
+                logging.exception('Não foi possível gerar os assets; usando /static sem hash')
+                return cls({}, destino, prefixo)
+        return cls(mapa, destino, prefixo)
+
+    def url(self, nome):
+        final = self.mapa.get(nome)
+        return self.prefixo + final if final else '/static/' + nome
+
+    def servir(self, nome):
+        # escolhe a variante pré-comprimida aceita pelo cliente (br > gzip > original)
+        if nome not in self.mapa.values():
+            return 'Não encontrado', 404
+        codificacao = None
+        for enc, ext in (('br', '.br'), ('gzip', '.gz')):
+            if request.accept_encodings[enc] > 0 and os.path.exists(os.path.join(self.destino, nome + ext)):
+                codificacao = enc
+                break
+        arquivo = nome + ('.br' if codificacao == 'br' else '.gz' if codificacao else '')
+        r = send_from_directory(self.destino, arquivo, max_age=31536000)
+        if codificacao:
+            r.headers['Content-Encoding'] = codificacao
+            r.mimetype = mimetypes.guess_type(nome)[0] or 'application/octet-stream'
+        r.headers['Cache-Control'] = CACHE_IMUTAVEL
+        r.headers['Vary'] = 'Accept-Encoding'
+        return r
+
+
+if __name__ == '__main__':
+    mapa = construir()
+    for nome, final in mapa.items():
+        print(f'{nome} -> {final}')
@@ -0,0 +1,73 @@
+# bench/amortizacao_centavos.py
+# Tabelas/s: motor float x motor de ponto fixo em centavos (amortizacao.*_centavos).
+#
+#   python bench/amortizacao_centavos.py --cenarios 1 100 1000 5000 --prazo 420
+#
+# Cada cenário é uma tabela SAC + PRICE completa (ou só o resumo, com --resumo) de um
+# financiamento aleatório. Antes de medir confere que, no modo centavos, as amortizações
+# somam exatamente o valor financiado e o saldo final é zero.
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import amortizacao  # noqa: E402
+
+ENCARGOS = (25.0, 0.000252)
+
+
+def cenarios(n, seed=42):
+    rng = np.random.default_rng(seed)
+    return rng.uniform(20000, 400000, n).round(2), rng.uniform(0, 12, n).round(2)
+
+
+def conferir(valor, juros, prazo):
+    centavos = np.rint(valor * 100).astype(np.int64)
+    for nome, f in (('SAC', amortizacao.tabela_sac_centavos), ('PRICE', amortizacao.tabela_price_centavos)):
+        t = f(valor, juros, prazo, *ENCARGOS)
+        assert (t['amortizacao'].sum(axis=-1) == centavos).all(), f'{nome}: amortizações != valor'
+        assert (t['saldo'][..., -1] == 0).all(), f'{nome}: saldo final != 0'
+        assert (t['parcela'] == t['amortizacao'] + t['juros'] + t['encargos']).all(), f'{nome}: parcela != soma'
+
+
+def medir(f, valor, juros, prazo, repeticoes):
+    f(valor, juros, prazo)
+    melhor = float('inf')
+    for _ in range(repeticoes):
+        t = time.perf_counter()
+        f(valor, juros, prazo)
+        melhor = min(melhor, time.perf_counter() - t)
+    return len(valor) / melhor
+
+
+def main_bench():
+    p = argparse.ArgumentParser()
+    p.add_argument('--cenarios', type=int, nargs='+', default=[1, 100, 1000, 5000])
+    p.add_argument('--prazo', type=int, default=420)
+    p.add_argument('--repeticoes', type=int, default=5)
+    p.add_argument('--resumo', action='store_true', help='mede só 1ª/última parcela, sem a tabela')
+    args = p.parse_args()
+
+    conferir(*cenarios(500), args.prazo)
+    if args.resumo:
+        motores = (('float', lambda v, j, n: amortizacao.resumo(v, j, n, *ENCARGOS)),
+                   ('centavos', lambda v, j, n: amortizacao.resumo_centavos(v, j, n, *ENCARGOS)))
+    else:
+        motores = (('float', lambda v, j, n: amortizacao.tabelas(v, j, n, *ENCARGOS)),
+                   ('centavos', lambda v, j, n: (amortizacao.tabela_sac_centavos(v, j, n, *ENCARGOS),
+                                                 amortizacao.tabela_price_centavos(v, j, n, *ENCARGOS))))
+
+    print(f"prazo: {args.prazo}  {'resumos' if args.resumo else 'tabelas SAC+PRICE'}/s (melhor de {args.repeticoes})")
+    print(f"{'cenários':>9} {'float':>12} {'centavos':>12} {'razão':>7}")
+    for n in args.cenarios:
+        valor, juros = cenarios(n)
+        taxas = [medir(f, valor, juros, args.prazo, args.repeticoes) for _, f in motores]
+        print(f'{n:>9} {taxas[0]:>12,.0f} {taxas[1]:>12,.0f} {taxas[0] / taxas[1]:>6.1f}x')
+
+
+if __name__ == '__main__':
+    main_bench()
@@ -0,0 +1,405 @@
+# bench/carga.py
+# Teste de carga HTTP ponta a ponta: sobe o app com gunicorn (SQLite e/ou Postgres), dispara
+# um mix realista de requisições e grava vazão, latência (p50/p95/p99) e taxa de erro em JSON.
+#
+#   python bench/carga.py                                  # só SQLite
+#   python bench/carga.py --postgres postgresql://...      # SQLite e Postgres
+#   python bench/carga.py --duracao 30 --clientes 32 --workers 4
+#   python bench/carga.py --servidor ambos --postgres postgresql://... --atraso-db-ms 5 --clientes 64
+#
+# --servidor escolhe o gunicorn síncrono do Procfile, a variante ASGI (uvicorn asgi:app) ou
+# as duas, lado a lado; os alvos ASGI aparecem como <banco>-asgi. --atraso-db-ms põe um
+# proxy TCP na frente do Postgres que atrasa cada resposta, como um banco em outra máquina.
+#
+# Cada execução grava bench/resultados/carga-<data>.json e compara com a execução anterior
+# (ou com --comparar arquivo.json); com --falhar-regressao sai com código 1 se a vazão cair
+# ou o p95 subir mais que --tolerancia. O SMTP é um servidor falso local, então o outbox
+# envia de verdade sem sair da máquina.
+import argparse
+import glob
+import queue
+import http.client
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import socket
+import socketserver
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+from datetime import datetime
+
+import numpy as np
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTADOS = os.path.join(RAIZ, 'bench', 'resultados')
+SENHA_ADMIN = 'carga'
+
+# rota -> peso no mix
+MIX = {'/': 40, '/simular': 25, '/resultado/<id>': 30, '/admin': 5}
+
+RENDAS = ['até 2.160 reais', 'até 2.850 reais', 'até 3.500 reais', 'até 4.000 reais',
+          'até 4.700 reais', 'até 8.600 reais', 'acima de 10.000 reais']
+IMOVEIS = ['imovel ate 210k', 'imovel ate 350k']
+
+
+# ---------- SMTP falso ----------
+class _SMTPFalso(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            self._conversar()
+        except ConnectionError:
+            pass  # worker encerrado no meio da sessão
+
+    def _conversar(self):
+        self.wfile.write(b'220 carga\r\n')
+        dados = False
+        for linha in self.rfile:
+            if dados:
+                if linha.rstrip(b'\r\n') == b'.':
+                    dados = False
+                    self.server.mensagens += 1
+                    self.wfile.write(b'250 OK\r\n')
+                continue
+            cmd = linha[:4].upper()
+            if cmd in (b'EHLO', b'HELO'):
+                self.wfile.write(b'250 carga\r\n')
+            elif cmd == b'DATA':
+                dados = True
+                self.wfile.write(b'354 fim com .\r\n')
+            elif cmd == b'QUIT':
+                self.wfile.write(b'221 OK\r\n')
+                return
+            else:
+                self.wfile.write(b'250 OK\r\n')
+
+
+def iniciar_smtp():
+    srv = socketserver.ThreadingTCPServer(('127.0.0.1', 0), _SMTPFalso)
+    srv.daemon_threads = True
+    srv.mensagens = 0
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv
+
+
+# ---------- proxy com atraso na frente do Postgres ----------
+def _encaminhar(origem, destino, atraso):
+    # cada bloco recebido é entregue `atraso` segundos depois, sem limitar a vazão
+    fila = queue.Queue()
+
+    def ler():
+        try:
+            while True:
+                dados = origem.recv(65536)
+                fila.put((time.monotonic() + atraso, dados))
+                if not dados:
+                    return
+        except OSError:
+            fila.put((0, b''))
+
+    threading.Thread(target=ler, daemon=True).start()
+    try:
+        while True:
+            quando, dados = fila.get()
+            espera = quando - time.monotonic()
+            if espera > 0:
+                time.sleep(espera)
+            if not dados:
+                break
+            destino.sendall(dados)
+    except OSError:
+        pass
+    finally:
+        for s in (origem, destino):
+            try:
+                s.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+def iniciar_proxy(database_url, atraso_ms):
+    # devolve o DATABASE_URL apontando para o proxy
+    u = urllib.parse.urlsplit(database_url)
+    destino = (u.hostname or '127.0.0.1', u.port or 5432)
+    srv = socket.create_server(('127.0.0.1', 0))
+
+    def aceitar():
+        while True:
+            cliente, _ = srv.accept()
+            banco = socket.create_connection(destino)
+            threading.Thread(target=_encaminhar, args=(cliente, banco, 0), daemon=True).start()
+            threading.Thread(target=_encaminhar, args=(banco, cliente, atraso_ms / 1000), daemon=True).start()
+
+    threading.Thread(target=aceitar, daemon=True).start()
+    local = u.netloc.rsplit('@', 1)[0] + '@' if '@' in u.netloc else ''
+    return urllib.parse.urlunsplit(u._replace(netloc=f'{local}127.0.0.1:{srv.getsockname()[1]}'))
+
+
+# ---------- app sob gunicorn (ou uvicorn, variante ASGI) ----------
+def _porta_livre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def subir_app(nome, database_url, workers, threads, smtp_porta, tmp, servidor='gunicorn'):
+    porta = _porta_livre()
+    env = dict(os.environ)
+    env.pop('DATABASE_URL', None)
+    env.update({
+        'DB_PATH': os.path.join(tmp, f'{nome}.db'),
+        'INDICE_VERSAO_PATH': os.path.join(tmp, f'{nome}.versao'),
+        'PROMETHEUS_MULTIPROC_DIR': os.path.join(tmp, f'{nome}.metricas'),
+        'OUTBOX_LOCK_PATH': os.path.join(tmp, f'{nome}.outbox.lock'),
+        'ADMIN_PASS': SENHA_ADMIN,
+        'SEND_EMAIL': '1', 'EMAIL_USER': 'carga@localhost', 'EMAIL_PASS': '',
+        'SMTP_HOST': '127.0.0.1', 'SMTP_PORT': str(smtp_porta), 'SMTP_STARTTLS': '0',
+    })
+    if database_url:
+        env['DATABASE_URL'] = database_url
+    if servidor == 'asgi':
+        cmd = [sys.executable, '-m', 'uvicorn', 'asgi:app', '--app-dir', RAIZ, '--host', '127.0.0.1',
+               '--port', str(porta), '--workers', str(workers), '--log-level', 'warning']
+    else:
+        cmd = [sys.executable, '-m', 'gunicorn', 'main:app', '--chdir', RAIZ, '--bind', f'127.0.0.1:{porta}',
+               '--workers', str(workers), '--threads', str(threads), '--log-level', 'warning']
+    log = open(os.path.join(tmp, f'{nome}.gunicorn.log'), 'w')
+    # cwd na raiz para o gunicorn carregar o gunicorn.conf.py do projeto
+    proc = subprocess.Popen(cmd, env=env, cwd=RAIZ, stdout=log, stderr=subprocess.STDOUT)
+    limite = time.time() + 60
+    while time.time() < limite:
+        if proc.poll() is not None:
+            raise SystemExit(f'{nome}: {servidor} saiu com código {proc.returncode} (veja {log.name})')
+        try:
+            con = http.client.HTTPConnection('127.0.0.1', porta, timeout=2)
+            con.request('GET', '/')
+            if con.getresponse().status == 200:
+                return proc, porta
+        except OSError:
+            time.sleep(0.2)
+    proc.terminate()
+    raise SystemExit(f'{nome}: app não respondeu em 60s (veja {log.name})')
+
+
+# ---------- cliente de carga ----------
+def _requisitar(porta, metodo, caminho, corpo=None, headers=None):
+    con = http.client.HTTPConnection('127.0.0.1', porta, timeout=30)
+    try:
+        con.request(metodo, caminho, corpo, headers or {})
+        r = con.getresponse()
+        r.read()
+        return r
+    finally:
+        con.close()
+
+
+def _formulario():
+    return urllib.parse.urlencode({
+        'nome': f'Carga {random.randrange(10 ** 6)}', 'telefone': f'(38) 9{random.randrange(10 ** 8):08d}',
+        'renda': random.choice(RENDAS), 'valor_imovel': random.choice(IMOVEIS)})
+
+
+def cliente_carga(args):
+    porta, duracao, aquecimento, semente = args
+    random.seed(semente)
+    form = {'Content-Type': 'application/x-www-form-urlencoded'}
+    r = _requisitar(porta, 'POST', '/login', urllib.parse.urlencode({'senha': SENHA_ADMIN}), form)
+    cookie = {'Cookie': r.getheader('Set-Cookie', '').split(';')[0]}
+    ids = []
+    rotas, pesos = list(MIX), list(MIX.values())
+    amostras = []  # (rota, ms, ok)
+    inicio = time.perf_counter()
+    fim = inicio + aquecimento + duracao
+    while True:
+        agora = time.perf_counter()
+        if agora >= fim:
+            break
+        rota = random.choices(rotas, pesos)[0]
+        if rota == '/resultado/<id>' and not ids:
+            rota = '/simular'
+        t = time.perf_counter()
+        try:
+            if rota == '/simular':
+                r = _requisitar(porta, 'POST', '/simular', _formulario(), form)
+                ok = r.status == 302
+                if ok:
+                    ids.append(int(r.getheader('Location').rsplit('/', 1)[1]))
+            elif rota == '/resultado/<id>':
+                ok = _requisitar(porta, 'GET', f'/resultado/{random.choice(ids)}').status == 200
+            elif rota == '/admin':
+                ok = _requisitar(porta, 'GET', '/admin', headers=cookie).status == 200
+            else:
+                ok = _requisitar(porta, 'GET', '/').status == 200
+        except (OSError, http.client.HTTPException, ValueError):
+            ok = False
+        if t - inicio >= aquecimento:
+            amostras.append((rota, (time.perf_counter() - t) * 1000, ok))
+    return amostras
+
+
+def _estatisticas(latencias, erros, duracao):
+    n = len(latencias)
+    if not n:
+        return {'requisicoes': 0, 'rps': 0.0, 'erros': 0, 'taxa_erro': 0.0,
+                'p50_ms': None, 'p95_ms': None, 'p99_ms': None, 'max_ms': None}
+    p50, p95, p99 = np.percentile(latencias, [50, 95, 99])
+    return {'requisicoes': n, 'rps': round(n / duracao, 1), 'erros': erros, 'taxa_erro': round(erros / n, 4),
+            'p50_ms': round(float(p50), 2), 'p95_ms': round(float(p95), 2), 'p99_ms': round(float(p99), 2),
+            'max_ms': round(float(np.max(latencias)), 2)}
+
+
+def rodar_alvo(nome, database_url, args, smtp, tmp, servidor='gunicorn'):
+    workers = args.workers_asgi if servidor == 'asgi' else args.workers
+    proc, porta = subir_app(nome, database_url, workers, args.threads, smtp.server_address[1], tmp, servidor)
+    enviados_antes = smtp.mensagens
+    try:
+        tarefas = [(porta, args.duracao, args.aquecimento, args.semente + i) for i in range(args.clientes)]
+        with multiprocessing.Pool(args.clientes) as pool:
+            amostras = [a for parte in pool.map(cliente_carga, tarefas) for a in parte]
+    finally:
+        caiu = proc.poll() is not None
+        proc.terminate()
+        proc.wait(30)
+    if caiu:
+        print(f'{nome}: o {servidor} saiu durante o teste (veja {tmp}/{nome}.gunicorn.log)')
+    por_rota = {}
+    for rota, ms, ok in amostras:
+        lat, erros = por_rota.setdefault(rota, ([], [0]))
+        lat.append(ms)
+        erros[0] += not ok
+    return {
+        'database': 'postgres' if database_url else 'sqlite',
+        'servidor': servidor,
+        'total': _estatisticas([a[1] for a in amostras], sum(not a[2] for a in amostras), args.duracao),
+        'rotas': {rota: _estatisticas(lat, erros[0], args.duracao) for rota, (lat, erros) in sorted(por_rota.items())},
+        'emails_recebidos': smtp.mensagens - enviados_antes,
+        'gunicorn_caiu': caiu,
+    }
+
+
+# ---------- comparação entre execuções ----------
+def comparar(atual, anterior, tolerancia):
+    regressoes = []
+    for alvo, res in atual['alvos'].items():
+        antes = anterior.get('alvos', {}).get(alvo)
+        if not antes:
+            continue
+        for rota, r in [('total', res['total'])] + list(res['rotas'].items()):
+            a = antes['total'] if rota == 'total' else antes['rotas'].get(rota)
+            if not a or not a['rps'] or not r['rps']:
+                continue
+            d_rps = r['rps'] / a['rps'] - 1
+            d_p95 = r['p95_ms'] / a['p95_ms'] - 1 if a['p95_ms'] else 0.0
+            marca = ''
+            if d_rps < -tolerancia or d_p95 > tolerancia:
+                marca = '  <-- regressão'
+                regressoes.append((alvo, rota))
+            print(f'  {alvo:>8} {rota:<16} rps {a["rps"]:>8} -> {r["rps"]:<8} ({d_rps:+.0%})  '
+                  f'p95 {a["p95_ms"]:>7} -> {r["p95_ms"]:<7} ({d_p95:+.0%}){marca}')
+    return regressoes
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=RAIZ, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def lado_a_lado(alvos, bancos):
+    print(f'\n{"":<10} {"rota":<16} {"rps sync":>9} {"rps asgi":>9} {"p95 sync":>9} {"p95 asgi":>9}')
+    for banco in bancos:
+        sync, asgi = alvos[banco], alvos[f'{banco}-asgi']
+        for rota in list(sync['rotas']) + ['total']:
+            a = sync['total'] if rota == 'total' else sync['rotas'][rota]
+            b = asgi['total'] if rota == 'total' else asgi['rotas'].get(rota)
+            if b:
+                print(f'{banco:<10} {rota:<16} {a["rps"]:>9} {b["rps"]:>9} {a["p95_ms"]:>9} {b["p95_ms"]:>9}')
+
+
+def _imprimir(alvo, res):
+    print(f'\n[{alvo}] e-mails recebidos pelo SMTP falso: {res["emails_recebidos"]}')
+    print(f'  {"rota":<16} {"req":>7} {"rps":>8} {"p50":>8} {"p95":>8} {"p99":>8} {"erros":>7}')
+    for rota, r in list(res['rotas'].items()) + [('total', res['total'])]:
+        print(f'  {rota:<16} {r["requisicoes"]:>7} {r["rps"]:>8} {r["p50_ms"]:>8} {r["p95_ms"]:>8} '
+              f'{r["p99_ms"]:>8} {r["taxa_erro"]:>7.2%}')
+
+
+def main():
+    p = argparse.ArgumentParser(description='Teste de carga HTTP do simulador')
+    p.add_argument('--postgres', default=os.getenv('CARGA_DATABASE_URL'),
+                   help='DATABASE_URL de um Postgres local para rodar também contra ele')
+    p.add_argument('--sem-sqlite', action='store_true', help='roda só contra o Postgres')
+    p.add_argument('--duracao', type=float, default=20, help='segundos medidos por alvo')
+    p.add_argument('--aquecimento', type=float, default=3, help='segundos iniciais descartados')
+    p.add_argument('--clientes', type=int, default=16, help='clientes simultâneos (processos)')
+    p.add_argument('--workers', type=int, default=4)
+    p.add_argument('--threads', type=int, default=1, help='threads por worker gthread (o gunicorn.conf.py usa 8)')
+    p.add_argument('--servidor', choices=('gunicorn', 'asgi', 'ambos'), default='gunicorn',
+                   help='gunicorn síncrono (Procfile), uvicorn asgi:app ou os dois')
+    p.add_argument('--workers-asgi', type=int, default=1, help='processos do uvicorn')
+    p.add_argument('--atraso-db-ms', type=float, default=0,
+                   help='atraso por resposta do Postgres (proxy local), simulando banco remoto')
+    p.add_argument('--semente', type=int, default=1)
+    p.add_argument('--saida', help='arquivo JSON de resultado (padrão: bench/resultados/carga-<data>.json)')
+    p.add_argument('--comparar', help='resultado anterior para comparar (padrão: o mais recente)')
+    p.add_argument('--tolerancia', type=float, default=0.10, help='variação aceita antes de apontar regressão')
+    p.add_argument('--falhar-regressao', action='store_true')
+    args = p.parse_args()
+
+    bancos = [] if args.sem_sqlite else [('sqlite', None)]
+    if args.postgres:
+        url = iniciar_proxy(args.postgres, args.atraso_db_ms) if args.atraso_db_ms > 0 else args.postgres
+        bancos.append(('postgres', url))
+    if not bancos:
+        raise SystemExit('nada a rodar: informe --postgres ou remova --sem-sqlite')
+    servidores = ('gunicorn', 'asgi') if args.servidor == 'ambos' else (args.servidor,)
+    alvos = [(nome if servidor == 'gunicorn' else f'{nome}-asgi', url, servidor)
+             for nome, url in bancos for servidor in servidores]
+
+    os.makedirs(RESULTADOS, exist_ok=True)
+    anterior = args.comparar
+    if anterior is None:
+        existentes = sorted(glob.glob(os.path.join(RESULTADOS, 'carga-*.json')))
+        anterior = existentes[-1] if existentes else None
+
+    smtp = iniciar_smtp()
+    tmp = tempfile.mkdtemp(prefix='carga-')
+    resultado = {
+        'data': datetime.now().isoformat(timespec='seconds'), 'commit': _git_commit(),
+        'config': {k: getattr(args, k) for k in ('duracao', 'aquecimento', 'clientes', 'workers', 'threads', 'semente',
+                                                  'servidor', 'workers_asgi', 'atraso_db_ms')},
+        'mix': MIX, 'alvos': {},
+    }
+    try:
+        for nome, url, servidor in alvos:
+            print(f'{nome}: {args.clientes} clientes por {args.duracao:.0f}s ...', flush=True)
+            resultado['alvos'][nome] = rodar_alvo(nome, url, args, smtp, tmp, servidor)
+            _imprimir(nome, resultado['alvos'][nome])
+        if len(servidores) > 1:
+            lado_a_lado(resultado['alvos'], [nome for nome, _ in bancos])
+    finally:
+        smtp.shutdown()
+        if not any(r['gunicorn_caiu'] for r in resultado['alvos'].values()):
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    saida = args.saida or os.path.join(RESULTADOS, f'carga-{datetime.now():%Y%m%d-%H%M%S}.json')
+    with open(saida, 'w') as f:
+        json.dump(resultado, f, indent=2, ensure_ascii=False)
+    print(f'\nresultado gravado em {saida}')
+
+    if anterior and os.path.abspath(anterior) != os.path.abspath(saida):
+        print(f'comparando com {anterior}:')
+        with open(anterior) as f:
+            regressoes = comparar(resultado, json.load(f), args.tolerancia)
+        if regressoes and args.falhar_regressao:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+# bench/commit_agrupado.py
+# Gravações do /simular por segundo: commit por requisição x group commit (commit_agrupado.py).
+#
+#   python bench/commit_agrupado.py --threads 32 --por-thread 200 --repetidos 0.2
+#   DATABASE_URL=postgresql://... python bench/commit_agrupado.py
+#
+# Cada gravação é a mesma do /simular (main.gravar_simulacao): upsert do lead pelo telefone,
+# cliente_resumo e histórico em cliente_simulacao, com os valores de main.dados_cliente.
+# `--repetidos` é a fração de gravações com um telefone que já simulou (caminho de update).
+# Sem DATABASE_URL usa um SQLite temporário (SQLITE_SYNCHRONOUS=FULL para medir com fsync
+# a cada commit). As threads simulam requisições simultâneas dentro de um worker gthread.
+import argparse
+import itertools
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def preparar():
+    if not os.getenv('DATABASE_URL'):
+        os.environ.setdefault('DB_PATH', os.path.join(tempfile.mkdtemp(), 'bench.db'))
+    os.environ['SEND_EMAIL'] = '0'
+    os.environ['GRUPO_COMMIT_MS'] = '0'
+    import main
+    return main
+
+
+def escrita(main, repetidos):
+    # uma gravação do /simular por chamada; telefones novos em sequência, ou um já usado
+    numeros = itertools.count(1)
+    usados = [0]
+
+    def gravar():
+        n = next(numeros)
+        if n > 1 and random.random() < repetidos:
+            n = random.randint(1, max(usados[0], 1))
+        else:
+            usados[0] = max(usados[0], n)
+        renda = main.RENDA_OPTS[n % len(main.RENDA_OPTS)]
+        valores = main.dados_cliente('Bench', f'(38) 9{n:08d}', renda, main.IMOVEL_OPTS[0])
+        return main.gravar_simulacao(valores).id
+    return gravar
+
+
+def medir(n_threads, por_thread, inserir):
+    ids, erros = [], []
+
+    def rodar():
+        for _ in range(por_thread):
+            try:
+                ids.append(inserir())
+            except Exception as e:
+                erros.append(e)
+
+    threads = [threading.Thread(target=rodar) for _ in range(n_threads)]
+    t = time.perf_counter()
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+    dt = time.perf_counter() - t
+    assert len(ids) + len(erros) == n_threads * por_thread
+    return len(ids), len(erros), dt
+
+
+def main_bench():
+    p = argparse.ArgumentParser()
+    p.add_argument('--threads', type=int, default=32)
+    p.add_argument('--por-thread', type=int, default=200)
+    p.add_argument('--janela-ms', type=float, default=2)
+    p.add_argument('--repetidos', type=float, default=0.2)
+    args = p.parse_args()
+
+    main = preparar()
+    import commit_agrupado
+    gravar = escrita(main, args.repetidos)
+
+    def individual():
+        with main.app.app_context():
+            cid = gravar()
+            main.db.session.commit()
+            return cid
+
+    grupo = commit_agrupado.CommitAgrupado(main.app, main.db, args.janela_ms)
+
+    print(f"banco: {main.DATABASE_URL.split('@')[-1]}  threads: {args.threads}  por thread: {args.por_thread}"
+          f"  repetidos: {args.repetidos:.0%}")
+    for nome, inserir in (('commit por requisição', individual), ('group commit', lambda: grupo.executar(gravar))):
+        n, erros, dt = medir(args.threads, args.por_thread, inserir)
+        extra = f'  ({grupo.escritas / grupo.grupos:.1f} gravações/commit)' if inserir is not individual else ''
+        print(f'{nome:>22}: {n / dt:8.0f} gravações/s  erros={erros}{extra}')
+
+
+if __name__ == '__main__':
+    main_bench()
@@ -0,0 +1,131 @@
+# busca.py
+# Busca de leads por nome e telefone no /admin, com índice.
+#
+# - nome: prefixos de palavras, sem diferença de acento e maiúsculas ("joa sil" acha
+#   "João da Silva"); cada palavra precisa de 2 letras ou mais
+# - telefone: qualquer trecho de 3 dígitos ou mais, em qualquer formato ("(11) 9999-0000",
+#   "11999990000" e "9990000" acham o mesmo lead)
+#
+# SQLite: duas tabelas FTS5 com rowid = cliente.id, mantidas por triggers em cliente (valem
+# para qualquer escrita, inclusive do simulacao.py): cliente_busca_nome (tokenizer unicode61
+# sem diacríticos, com índice de prefixos) e cliente_busca_telefone (só os dígitos, tokenizer
+# trigram, que acha qualquer trecho).
+# Postgres: índices GIN pg_trgm sobre expressões de cliente (nome sem acento com um espaço na
+# frente, para o LIKE '% joa%' casar início de palavra; telefone só com dígitos). Não há
+# tabela a manter. Sem a extensão pg_trgm a busca funciona, mas varre a tabela.
+import logging
+import re
+
+from sqlalchemy import String, column, false, func, literal_column, select, table
+
+# maiúsculas também: com locale C o lower() do Postgres só converte ASCII
+ACENTOS = 'áàâãäåéèêëíìîïóòôõöúùûüçñýÁÀÂÃÄÅÉÈÊËÍÌÎÏÓÒÔÕÖÚÙÛÜÇÑÝ'
+SEM_ACENTOS = 'aaaaaaeeeeiiiiooooouuuucnyaaaaaaeeeeiiiiooooouuuucny'
+_SEM_ACENTOS = str.maketrans(ACENTOS, SEM_ACENTOS)
+SEPARADORES_TELEFONE = ' ()-+./'
+
+NOME = table('cliente_busca_nome', column('rowid'))
+TELEFONE = table('cliente_busca_telefone', column('rowid'))
+
+
+def termos(q):
+    # (palavras sem acento, dígitos); palavras curtas demais e dígitos < 3 são descartados
+    q = (q or '').lower().translate(_SEM_ACENTOS)
+    palavras = [p for p in re.findall(r'[^\W\d_]+', q) if len(p) >= 2]
+    digitos = ''.join(re.findall(r'\d', q))
+    return palavras, digitos if len(digitos) >= 3 else ''
+
+
+def _digitos_sqlite(coluna):
+    # remove os separadores comuns de telefone (o SQLite não tem regexp_replace)
+    for s in SEPARADORES_TELEFONE:
+        coluna = f"replace({coluna}, '{s}', '')"
+    return coluna
+
+
+def nome_pg(cliente):
+    # a mesma expressão do índice: as constantes vão literais no SQL para o planner casar
+    # a consulta com o índice também com parâmetros do lado do servidor (asyncpg)
+    return literal_column("' '", String) + func.translate(
+        func.lower(cliente.c.nome), literal_column(f"'{ACENTOS}'"), literal_column(f"'{SEM_ACENTOS}'"), type_=String)
+
+
+def telefone_pg(cliente):
+    return func.regexp_replace(cliente.c.telefone, literal_column("'[^0-9]'"), literal_column("''"),
+                               literal_column("'g'"), type_=String)
+
+
+def filtrar(consulta, cliente, dialeto, q):
+    # aplica a busca `q` a um select de cliente; devolve (select, coluna que ordena e pagina).
+    # No SQLite a consulta parte da tabela FTS5, na ordem do rowid (= cliente.id), e para no
+    # LIMIT: um prefixo comum ("ma") não obriga a ler todos os que casam.
+    palavras, digitos = termos(q)
+    if not palavras and not digitos:
+        return consulta.where(false()), cliente.c.id
+    if dialeto == 'postgresql':
+        conds = [nome_pg(cliente).like(f'% {p}%') for p in palavras]
+        if digitos:
+            conds.append(telefone_pg(cliente).like(f'%{digitos}%'))
+        return consulta.where(*conds), cliente.c.id
+    # cada termo entre aspas (nada da entrada vira sintaxe do FTS5); palavras com * de prefixo
+    if digitos:
+        telefone = literal_column(TELEFONE.name).op('MATCH')(f'"{digitos}"')
+        if not palavras:
+            return (consulta.select_from(cliente.join(TELEFONE, TELEFONE.c.rowid == cliente.c.id)).where(telefone),
+                    TELEFONE.c.rowid)
+        # nome e telefone: percorre o nome e confere o telefone numa lista (um trecho de
+        # telefone casa bem menos linhas que um prefixo de nome)
+        consulta = consulta.where(cliente.c.id.in_(select(TELEFONE.c.rowid).where(telefone)))
+    nome = literal_column(NOME.name).op('MATCH')(' '.join(f'"{p}"*' for p in palavras))
+    return consulta.select_from(cliente.join(NOME, NOME.c.rowid == cliente.c.id)).where(nome), NOME.c.rowid
+
+
+def criar_indices(con, cliente):
+    # idempotente; roda no inicializar_db (con dentro de uma transação)
+    if con.dialect.name == 'postgresql':
+        _criar_pg(con, cliente)
+    else:
+        _criar_sqlite(con)
+
+
+def _criar_pg(con, cliente):
+    try:
+        with con.begin_nested():
+            con.exec_driver_sql('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    except Exception as e:
+        logging.warning('Extensão pg_trgm indisponível, busca do /admin sem índice: %s', e)
+        return
+    for nome, expr in (('ix_cliente_busca_nome', nome_pg(cliente)), ('ix_cliente_busca_telefone', telefone_pg(cliente))):
+        sql = expr.compile(dialect=con.dialect, compile_kwargs={'literal_binds': True})
+        con.exec_driver_sql(f'CREATE INDEX IF NOT EXISTS {nome} ON {cliente.name} USING gin (({sql}) gin_trgm_ops)')
+
+
+def _criar_sqlite(con):
+    existe = con.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE name = 'cliente_busca_nome'").first() is not None
+    digitos = {v: _digitos_sqlite(f'{v}.telefone') for v in ('new', 'cliente')}
+    for ddl in (
+        "CREATE VIRTUAL TABLE IF NOT EXISTS cliente_busca_nome USING fts5("
+        "nome, tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+        "CREATE VIRTUAL TABLE IF NOT EXISTS cliente_busca_telefone USING fts5(digitos, tokenize='trigram')",
+        f"""CREATE TRIGGER IF NOT EXISTS cliente_busca_ai AFTER INSERT ON cliente BEGIN
+            INSERT INTO cliente_busca_nome (rowid, nome) VALUES (new.id, new.nome);
+            INSERT INTO cliente_busca_telefone (rowid, digitos) VALUES (new.id, {digitos['new']});
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS cliente_busca_ad AFTER DELETE ON cliente BEGIN
+            DELETE FROM cliente_busca_nome WHERE rowid = old.id;
+            DELETE FROM cliente_busca_telefone WHERE rowid = old.id;
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS cliente_busca_au AFTER UPDATE OF id, nome, telefone ON cliente BEGIN
+            DELETE FROM cliente_busca_nome WHERE rowid = old.id;
+            DELETE FROM cliente_busca_telefone WHERE rowid = old.id;
+            INSERT INTO cliente_busca_nome (rowid, nome) VALUES (new.id, new.nome);
+            INSERT INTO cliente_busca_telefone (rowid, digitos) VALUES (new.id, {digitos['new']});
+        END""",
+    ):
+        con.exec_driver_sql(ddl)
+    if not existe:
+        # base que já tinha clientes antes da busca existir
+        con.exec_driver_sql('INSERT INTO cliente_busca_nome (rowid, nome) SELECT id, nome FROM cliente')
+        con.exec_driver_sql(f"INSERT INTO cliente_busca_telefone (rowid, digitos) "
+                            f"SELECT id, {digitos['cliente']} FROM cliente")
@@ -0,0 +1,95 @@
+# commit_agrupado.py
+# Group commit das escritas do /simular.
+#
+# Em vez de cada requisição fazer o seu commit (um fsync por lead), as requisições
+# entregam a sua escrita a uma thread gravadora do processo, que junta o que chegar em
+# até `janela_ms` (ou `max_lote` escritas) e grava tudo numa única transação.
+#
+# Durabilidade: a requisição só recebe o id depois que o COMMIT do grupo em que ela entrou
+# retornou, então nada é confirmado ao usuário antes de estar no banco, com a mesma garantia
+# do commit individual (synchronous do SQLite / synchronous_commit do Postgres). Se o
+# commit do grupo falhar, todas as requisições do grupo recebem o erro; se uma escrita
+# falhar antes do commit, o grupo é desfeito e as escritas são refeitas uma a uma, para que
+# só a culpada falhe. Os ids vêm do próprio INSERT (flush) dentro da transação do grupo,
+# sem reserva de faixas de ids.
+#
+# O agrupamento acontece entre threads do mesmo processo: rode o gunicorn com
+# `--threads N` (worker gthread) para que cada worker tenha várias requisições em voo.
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class CommitAgrupado:
+    def __init__(self, app, db, janela_ms=2, max_lote=200, timeout=30):
+        self.app, self.db = app, db
+        self.janela = janela_ms / 1000
+        self.max_lote = max_lote
+        self.timeout = timeout
+        self._fila = queue.Queue()
+        self._pid = None
+        self._iniciando = threading.Lock()
+        self.grupos = 0
+        self.escritas = 0
+
+    def iniciar(self):
+        # uma thread gravadora por processo, criada depois do fork
+        if self._pid == os.getpid():
+            return
+        with self._iniciando:
+            if self._pid == os.getpid():
+                return
+            self._fila = queue.Queue()
+            threading.Thread(target=self._loop, name='commit-agrupado', daemon=True).start()
+            self._pid = os.getpid()
+
+    def executar(self, escrita):
+        # `escrita` roda na thread gravadora, dentro da transação do grupo, usando db.session;
+        # o valor que ela devolver (ex.: o id do cliente) é devolvido aqui após o commit
+        self.iniciar()
+        futuro = Future()
+        self._fila.put((escrita, futuro))
+        return futuro.result(self.timeout)
+
+    def _loop(self):
+        while True:
+            lote = [self._fila.get()]
+            limite = time.monotonic() + self.janela
+            while len(lote) < self.max_lote:
+                resto = limite - time.monotonic()
+                try:
+                    lote.append(self._fila.get(timeout=resto) if resto > 0 else self._fila.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with self.app.app_context():
+                    self._gravar(lote)
+            except Exception as e:
+                logging.exception('Erro no commit agrupado')
+                for _, futuro in lote:
+                    if not futuro.done():
+                        futuro.set_exception(e)
+
+    def _gravar(self, lote):
+        sessao = self.db.session
+        try:
+            resultados = [escrita() for escrita, _ in lote]
+            sessao.commit()
+        except Exception:
+            sessao.rollback()
+            if len(lote) == 1:
+                raise
+            # alguma escrita falhou: refaz uma a uma para isolar a culpada
+            for item in lote:
+                try:
+                    self._gravar([item])
+                except Exception as e:
+                    item[1].set_exception(e)
+            return
+        self.grupos += 1
+        self.escritas += len(lote)
+        for (_, futuro), r in zip(lote, resultados):
+            futuro.set_result(r)
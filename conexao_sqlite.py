@@ -0,0 +1,79 @@
+# conexao_sqlite.py
+# Conexões SQLite persistentes, uma por processo/thread, em modo WAL.
+#
+# Abrir uma conexão nova por requisição, no journal padrão (rollback), faz cada escrita
+# travar o arquivo inteiro: com 4 workers do gunicorn os /simular concorrentes falham com
+# "database is locked". Aqui cada worker mantém a sua conexão aberta com:
+# - journal_mode=WAL: leitores não bloqueiam o escritor e o escritor não bloqueia leitores
+# - synchronous=NORMAL (padrão): em WAL o banco nunca corrompe; numa queda de energia (não
+#   de processo) só as últimas transações podem se perder. Use FULL para fsync a cada commit
+# - busy_timeout: um escritor espera a vez em vez de falhar na hora
+# - escritas com BEGIN IMMEDIATE, que pega a trava de escrita no início da transação (e
+#   portanto passa pelo busy_timeout) em vez de falhar ao promover uma leitura
+# - cache de statements preparados do próprio sqlite3 (cached_statements), que rende
+#   porque a conexão vive tanto quanto o worker
+# Depois de um fork o processo filho abre a sua própria conexão na primeira consulta.
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+SYNCHRONOUS = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
+
+
+def configurar(con, synchronous='NORMAL', busy_timeout_ms=5000):
+    # também usado pelo main.py nas conexões do SQLAlchemy
+    synchronous = synchronous.upper()
+    if synchronous not in SYNCHRONOUS:
+        raise ValueError(f'synchronous inválido: {synchronous}')
+    con.execute('PRAGMA journal_mode=WAL')
+    con.execute(f'PRAGMA synchronous={synchronous}')
+    con.execute(f'PRAGMA busy_timeout={int(busy_timeout_ms)}')
+    con.execute('PRAGMA temp_store=MEMORY')
+
+
+class ConexaoSQLite:
+    def __init__(self, caminho, synchronous='NORMAL', busy_timeout_ms=5000, cached_statements=256):
+        self.caminho = caminho
+        self.synchronous = synchronous
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cached_statements = cached_statements
+        self._local = threading.local()
+        # conexões herdadas do processo pai: não são fechadas no filho (o close mexeria nos
+        # arquivos -wal/-shm que o pai ainda usa), só deixam de ser usadas
+        self._herdadas = []
+        self.aberturas = 0
+
+    def conexao(self):
+        atual = getattr(self._local, 'con', None)
+        if atual is not None and atual[0] == os.getpid():
+            return atual[1]
+        if atual is not None:
+            self._herdadas.append(atual[1])
+        # isolation_level=None: autocommit; as transações são abertas explicitamente
+        con = sqlite3.connect(self.caminho, timeout=self.busy_timeout_ms / 1000,
+                              isolation_level=None, cached_statements=self.cached_statements)
+        configurar(con, self.synchronous, self.busy_timeout_ms)
+        self._local.con = (os.getpid(), con)
+        self.aberturas += 1
+        return con
+
+    def consultar(self, sql, params=()):
+        return self.conexao().execute(sql, params)
+
+    @contextmanager
+    def transacao(self):
+        con = self.conexao()
+        con.execute('BEGIN IMMEDIATE')
+        try:
+            yield con
+        except BaseException:
+            con.execute('ROLLBACK')
+            raise
+        con.execute('COMMIT')
+
+    def fechar(self):
+        atual = getattr(self._local, 'con', None)
+        self._local.con = None
+        if atual is not None and atual[0] == os.getpid():
+            atual[1].close()
@@ -0,0 +1,115 @@
+# exportacao.py
+# Geradores de exportação (CSV e XLSX) que consomem um iterável de linhas e produzem
+# bytes aos poucos, para respostas em streaming com memória constante.
+#
+# O XLSX é montado direto num zip escrito em modo streaming (sem seek, com data
+# descriptors), com strings inline na planilha; não depende de openpyxl e não guarda
+# a planilha inteira nem em memória nem em disco.
+import csv
+import io
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+TAMANHO_BLOCO = 1000
+
+_CONTROLE = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+_CONTENT_TYPES = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+<Default Extension="xml" ContentType="application/xml"/>
+<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>
+<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>
+</Types>"""
+
+_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>
+</Relationships>"""
+
+_WORKBOOK = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">
+<sheets><sheet name="{nome}" sheetId="1" r:id="rId1"/></sheets>
+</workbook>"""
+
+_WORKBOOK_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>
+</Relationships>"""
+
+
+def _blocos(linhas, tamanho=TAMANHO_BLOCO):
+    bloco = []
+    for linha in linhas:
+        bloco.append(linha)
+        if len(bloco) == tamanho:
+            yield bloco
+            bloco = []
+    if bloco:
+        yield bloco
+
+
+def gerar_csv(colunas, linhas):
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    w.writerow(colunas)
+    for bloco in _blocos(linhas):
+        w.writerows(bloco)
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue()
+
+
+class _Saida:
+    # destino sem seek para o zipfile; acumula só o que ainda não foi enviado
+    def __init__(self):
+        self.partes = []
+
+    def write(self, b):
+        self.partes.append(bytes(b))
+        return len(b)
+
+    def flush(self):
+        pass
+
+    def retirar(self):
+        dados, self.partes = b''.join(self.partes), []
+        return dados
+
+
+def _celula(v):
+    if v is None:
+        return '<c/>'
+    if isinstance(v, bool):
+        v = int(v)
+    if isinstance(v, (int, float)):
+        return f'<c><v>{v}</v></c>'
+    return f'<c t="inlineStr"><is><t>{escape(_CONTROLE.sub("", str(v)))}</t></is></c>'
+
+
+def _linha_xml(valores):
+    return '<row>' + ''.join(_celula(v) for v in valores) + '</row>'
+
+
+def gerar_xlsx(colunas, linhas, nome_planilha='Planilha1'):
+    saida = _Saida()
+    zf = zipfile.ZipFile(saida, 'w', zipfile.ZIP_DEFLATED, compresslevel=1)
+    zf.writestr('[Content_Types].xml', _CONTENT_TYPES)
+    zf.writestr('_rels/.rels', _RELS)
+    zf.writestr('xl/workbook.xml', _WORKBOOK.format(nome=escape(nome_planilha)))
+    zf.writestr('xl/_rels/workbook.xml.rels', _WORKBOOK_RELS)
+    with zf.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+        sheet.write(('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                     '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                     '<sheetData>' + _linha_xml(colunas)).encode('utf-8'))
+        for bloco in _blocos(linhas):
+            sheet.write(''.join(_linha_xml(l) for l in bloco).encode('utf-8'))
+            dados = saida.retirar()
+            if dados:
+                yield dados
+        sheet.write(b'</sheetData></worksheet>')
+    zf.close()
+    yield saida.retirar()
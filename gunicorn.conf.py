@@ -0,0 +1,42 @@
+# gunicorn.conf.py
+# Lido automaticamente pelo gunicorn, que o Procfile e o Dockerfile rodam na raiz do projeto.
+import os
+import time
+
+import metricas
+
+_INICIO = time.perf_counter()
+
+# métricas multiprocesso (ver metricas.py): o diretório é limpo aqui, no master, antes de o
+# app ser carregado, e os arquivos de cada worker que sai são marcados como mortos
+metricas.limpar_diretorio()
+
+# o app (e com ele a criação das tabelas e o seed) é carregado uma vez no master, antes do
+# fork; os workers já nascem prontos e não disputam a inicialização do banco
+# (GUNICORN_PRELOAD=0 volta a carregar o app em cada worker, para comparar)
+preload_app = os.getenv('GUNICORN_PRELOAD', '1') != '0'
+
+# workers gthread: cada worker atende várias requisições ao mesmo tempo, e é entre essas
+# threads que o group commit do /simular (GRUPO_COMMIT_MS) junta as gravações; com o worker
+# sync cada commit ficaria sozinho no grupo. --worker-class/--threads na linha de comando
+# têm precedência
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.getenv('GUNICORN_THREADS', '8'))
+
+
+def when_ready(server):
+    server.log.info('Master pronto em %.0f ms (app carregado)', (time.perf_counter() - _INICIO) * 1000)
+
+
+def post_fork(server, worker):
+    worker.inicio_boot = time.perf_counter()
+
+
+def post_worker_init(worker):
+    segundos = time.perf_counter() - worker.inicio_boot
+    metricas.BOOT_WORKER.observe(segundos)
+    worker.log.info('Worker %s pronto em %.1f ms', worker.pid, segundos * 1000)
+
+
+def child_exit(server, worker):
+    metricas.processo_encerrado(worker.pid)
@@ -0,0 +1,74 @@
+# indice_simulacoes.py
+# Índice em memória da tabela simulacao, chaveado por (renda, imovel).
+#
+# A tabela tem poucas linhas e só muda quando o seed muda, então cada worker carrega
+# tudo uma vez num dict imutável e responde às consultas sem ir ao banco.
+# `versao` é um hash do conteúdo carregado. Quando algum processo altera a tabela ele
+# chama invalidar(), que regrava um pequeno arquivo de carimbo; os demais workers
+# comparam o carimbo (um stat, sem consulta ao banco) e recarregam na próxima consulta.
+import hashlib
+import os
+import tempfile
+from collections import namedtuple
+from types import MappingProxyType
+
+LinhaSimulacao = namedtuple('LinhaSimulacao', [
+    'renda', 'imovel', 'juros', 'entrada', 'subsidio', 'valor_liberado',
+    'sac_primeira', 'sac_ultima', 'price_primeira', 'price_ultima'])
+
+
+def caminho_padrao():
+    base = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return os.path.join(base, 'simulador_simulacao.versao')
+
+
+def versao_de(linhas):
+    return hashlib.sha1(repr(sorted(linhas)).encode('utf-8')).hexdigest()[:12]
+
+
+class IndiceSimulacoes:
+    def __init__(self, carregar, caminho_versao=None):
+        # `carregar` devolve as linhas (tuplas na ordem de LinhaSimulacao); chamado só na (re)carga
+        self._carregar = carregar
+        self.caminho_versao = caminho_versao or caminho_padrao()
+        self._dados = None
+        self._carimbo = None
+        self.versao = None
+        self.cargas = 0
+
+    def _ler_carimbo(self):
+        try:
+            st = os.stat(self.caminho_versao)
+        except OSError:
+            return None
+        return st.st_ino, st.st_mtime_ns
+
+    def _recarregar(self):
+        carimbo = self._ler_carimbo()
+        linhas = [LinhaSimulacao(*row) for row in self._carregar()]
+        self._dados = MappingProxyType({(l.renda, l.imovel): l for l in linhas})
+        self.versao = versao_de(linhas)
+        self._carimbo = carimbo
+        self.cargas += 1
+
+    def _atual(self):
+        if self._dados is None or self._ler_carimbo() != self._carimbo:
+            self._recarregar()
+        return self._dados
+
+    def obter(self, renda, imovel):
+        return self._atual().get((renda, imovel))
+
+    def linhas(self):
+        return tuple(self._atual().values())
+
+    def invalidar(self):
+        # descarta o índice local e avisa os outros workers trocando o arquivo de carimbo
+        self._dados = None
+        tmp = f'{self.caminho_versao}.{os.getpid()}'
+        try:
+            with open(tmp, 'w') as f:
+                f.write(f'{os.getpid()} {os.times().elapsed}\n')
+            os.replace(tmp, self.caminho_versao)
+        except OSError:
+            pass
@@ -0,0 +1,187 @@
+# leads.py
+# Um lead por telefone: o /simular grava com um upsert em cliente e guarda o histórico das
+# simulações em cliente_simulacao.
+#
+# O telefone é normalizado para E.164 (+55 DDD número) em cliente.telefone_e164, com índice
+# único: "(11) 99999-0000", "+55 11 99999 0000" e "011 9999-0000" (antes do nono dígito) são o
+# mesmo lead. Quem simula de novo (outra renda/imóvel) não ganha outra linha:
+# INSERT ... ON CONFLICT (telefone_e164) DO UPDATE grava a última simulação na linha do lead e
+# soma 1 em cliente.simulacoes, numa instrução só e sem ler antes (atômico no SQLite e no
+# Postgres, também com requisições simultâneas do mesmo telefone). Cada simulação vira uma
+# linha enxuta em cliente_simulacao (sem nome, telefone e os campos que vêm do seed).
+#
+# O lead aparece no /admin, no /resultado/<id> e no resumo com a última simulação (o resumo
+# tira o lead do balde da simulação anterior e põe no da nova); o e-mail só sai para lead
+# novo. Telefone que não dá para normalizar fica com telefone_e164 NULL (NULL não conflita) e
+# cada simulação vira um lead, como antes. O simulacao.py não preenche telefone_e164.
+#
+# Bases antigas não são juntadas na inicialização (migrar): os clientes repetidos continuam
+# com seus ids até um
+#
+#   python leads.py juntar
+#
+# que junta cada telefone num lead só e guarda os ids antigos em cliente_alias; o
+# /resultado/<id> antigo redireciona (301) para o lead.
+import argparse
+import functools
+import logging
+import os
+import re
+import sys
+import time
+
+from sqlalchemy import bindparam, func, insert, inspect, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+import resumo
+
+DDI = '55'
+# colunas de cliente que vão para o histórico (as que mudam de uma simulação para outra)
+CAMPOS_SIMULACAO = ('criado_em', 'renda', 'valor_imovel', 'faixa', 'valor_financiado', 'parcela_price',
+                    'parcela_sac_ini', 'parcela_sac_fim', 'prazo', 'juros')
+
+
+def e164(telefone):
+    # '+55DDDNÚMERO' (ou '+DDI...' de outro país, se vier com + ou 00); None se não der
+    bruto = (telefone or '').strip()
+    d = re.sub(r'\D', '', bruto)
+    if bruto.startswith('+') or d.startswith('00'):
+        d = d[2:] if d.startswith('00') else d
+        if not d.startswith(DDI):
+            # outro país: sem regra de numeração, só o limite do E.164
+            return '+' + d if 8 <= len(d) <= 15 else None
+        d = d[len(DDI):]
+    elif d.startswith('0'):
+        # 0 de longa distância, com ou sem o código da operadora (0 21 11 99999-0000)
+        d = d[1:]
+        if len(d) in (12, 13):
+            d = d[2:]
+    elif len(d) in (12, 13) and d.startswith(DDI):
+        d = d[len(DDI):]
+    if len(d) == 10 and d[2] in '6789':
+        # celular gravado sem o nono dígito
+        d = d[:2] + '9' + d[2:]
+    # DDD sem zero; celular 9 + 8 dígitos, fixo começando em 2 a 5
+    if '0' in d[:2] or not ((len(d) == 11 and d[2] == '9') or (len(d) == 10 and d[2] in '2345')):
+        return None
+    return '+' + DDI + d
+
+
+@functools.lru_cache(maxsize=None)
+def upsert(cliente, dialeto):
+    # executado com as colunas de main.dados_cliente; devolve (id, simulacoes) do lead
+    ins = (postgresql.insert if dialeto == 'postgresql' else sqlite.insert)(cliente)
+    atualizar = {c.name: ins.excluded[c.name] for c in cliente.columns
+                 if c.name not in ('id', 'telefone_e164', 'simulacoes')}
+    atualizar['simulacoes'] = cliente.c.simulacoes + 1
+    return (ins.on_conflict_do_update(index_elements=['telefone_e164'], set_=atualizar)
+            .returning(cliente.c.id, cliente.c.simulacoes))
+
+
+@functools.lru_cache(maxsize=None)
+def anterior(simulacao):
+    # a última simulação gravada do lead (a que ele tinha antes do upsert), com resumo.CAMPOS
+    return (select(*(simulacao.c[k] for k in resumo.CAMPOS))
+            .where(simulacao.c.cliente_id == bindparam('cliente_id'))
+            .order_by(simulacao.c.id.desc()).limit(1))
+
+
+def instrucoes(tabela_resumo, simulacao, dialeto, cliente_id, valores, anterior=None):
+    # [(instrução, parâmetros)] a executar depois do upsert, na mesma transação: move o lead
+    # no resumo (sai do balde de `anterior`, a linha de anterior(), se era repetido) e grava o
+    # histórico; serve para conexão síncrona (main.py) e assíncrona (asgi.py)
+    passos = []
+    if anterior is not None:
+        passos += resumo.instrucoes(tabela_resumo, dialeto, [anterior._mapping], -1)
+    passos += resumo.instrucoes(tabela_resumo, dialeto, [valores])
+    passos.append((insert(simulacao), dict({k: valores[k] for k in CAMPOS_SIMULACAO}, cliente_id=cliente_id)))
+    return passos
+
+
+def migrar(con, cliente, simulacao):
+    # bases de antes dos leads por telefone (con dentro de uma transação, antes de criar o
+    # índice único). Não junta nem apaga nada: cria as colunas, põe cada cliente antigo no
+    # histórico e marca telefone_e164 só no cliente mais recente de cada telefone, que passa a
+    # receber as novas simulações. Os mais antigos continuam com seus ids e páginas até um
+    # `python leads.py juntar`. Também completa bases que já têm as colunas mas vieram sem
+    # histórico (migrate_sqlite_to_postgres.py de um SQLite antigo).
+    if 'telefone_e164' not in {c['name'] for c in inspect(con).get_columns(cliente.name)}:
+        con.exec_driver_sql(f'ALTER TABLE {cliente.name} ADD COLUMN telefone_e164 VARCHAR(16)')
+        con.exec_driver_sql(f'ALTER TABLE {cliente.name} ADD COLUMN simulacoes INTEGER NOT NULL DEFAULT 1')
+    elif con.execute(select(simulacao.c.id).limit(1)).first() is not None:
+        return
+    t0 = time.perf_counter()
+    colunas = [cliente.c[k] for k in CAMPOS_SIMULACAO]
+    con.execute(insert(simulacao).from_select(['cliente_id', *CAMPOS_SIMULACAO],
+                                              select(cliente.c.id, *colunas).order_by(cliente.c.id)))
+    grupos, usados = {}, set()
+    for cid, telefone, atual in con.execute(select(cliente.c.id, cliente.c.telefone, cliente.c.telefone_e164)
+                                            .order_by(cliente.c.id)):
+        if atual is not None:
+            usados.add(atual)
+        numero = e164(telefone)
+        if numero is not None:
+            grupos[numero] = cid
+    marcar = [{'b_id': cid, 'b_e164': numero} for numero, cid in grupos.items() if numero not in usados]
+    if marcar:
+        con.execute(update(cliente).where(cliente.c.id == bindparam('b_id')).values(telefone_e164=bindparam('b_e164')),
+                    marcar)
+    logging.info('Leads por telefone: histórico criado e %d telefones marcados em %.1f s',
+                 len(marcar), time.perf_counter() - t0)
+
+
+def juntar(con, cliente, simulacao, alias):
+    # junta os clientes do mesmo telefone no lead que fica (o que já tem telefone_e164, senão o
+    # mais recente): o histórico passa para ele, o id antigo vira um alias em cliente_alias (o
+    # /resultado/<id> antigo redireciona) e a linha antiga sai de cliente. Devolve
+    # [(id antigo, lead)]; o resumo precisa ser reconstruído depois.
+    grupos, donos = {}, {}
+    for cid, telefone, atual in con.execute(select(cliente.c.id, cliente.c.telefone, cliente.c.telefone_e164)
+                                            .order_by(cliente.c.id)):
+        numero = atual or e164(telefone)
+        if numero is not None:
+            grupos.setdefault(numero, []).append(cid)
+            if atual is not None:
+                donos[numero] = cid
+    pares, leads = [], []
+    for numero, ids in grupos.items():
+        lead = donos.get(numero, ids[-1])
+        if len(ids) > 1 or numero not in donos:
+            leads.append({'b_id': lead, 'b_e164': numero})
+        pares += [{'b_id': i, 'b_lead': lead} for i in ids if i != lead]
+    if pares:
+        con.execute(update(simulacao).where(simulacao.c.cliente_id == bindparam('b_id'))
+                    .values(cliente_id=bindparam('b_lead')), pares)
+        # aliases de juntadas anteriores seguem o lead
+        con.execute(update(alias).where(alias.c.cliente_id == bindparam('b_id'))
+                    .values(cliente_id=bindparam('b_lead')), pares)
+        con.execute(insert(alias).values(id=bindparam('b_id'), cliente_id=bindparam('b_lead')), pares)
+        con.execute(cliente.delete().where(cliente.c.id == bindparam('b_id')), [{'b_id': p['b_id']} for p in pares])
+    if leads:
+        n = select(func.count()).where(simulacao.c.cliente_id == cliente.c.id).scalar_subquery()
+        con.execute(update(cliente).where(cliente.c.id == bindparam('b_id'))
+                    .values(telefone_e164=bindparam('b_e164'), simulacoes=n), leads)
+    return [(p['b_id'], p['b_lead']) for p in pares]
+
+
+def main_cli():
+    p = argparse.ArgumentParser(description='Junta num lead só os clientes do mesmo telefone')
+    p.add_argument('acao', choices=('juntar',))
+    p.parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import main
+    inicio = time.perf_counter()
+    with main.app.app_context():
+        with main.db.engine.begin() as con:
+            pares = juntar(con, main.Cliente.__table__, main.ClienteSimulacao.__table__, main.ClienteAlias.__table__)
+            if pares:
+                resumo.reconstruir(con, main.ClienteResumo.__table__, main.Cliente.__table__)
+    # as páginas dos ids antigos e dos leads que ficaram saem do cache de todos os workers
+    main.RESULTADOS.invalidar(*{i for par in pares for i in par})
+    print(f'{len(pares)} clientes juntados em {len({lead for _, lead in pares})} leads, '
+          f'{time.perf_counter() - inicio:.1f}s')
+
+
+if __name__ == '__main__':
+    main_cli()
@@ -0,0 +1,166 @@
+# lote.py
+# Precificação em lote para o endpoint /simular/lote: lê linhas CSV ou NDJSON
+# (renda, valor_imovel, prazo, juros) de um arquivo/stream, precifica em blocos
+# vetorizados com o motor de amortização e devolve o resultado bloco a bloco.
+# Nada é acumulado além de um bloco, então a memória não depende do tamanho do lote.
+import codecs
+import csv
+import io
+import json
+import re
+from itertools import chain, islice
+
+import numpy as np
+
+import amortizacao
+
+TAMANHO_BLOCO = 4096
+COTA_FINANCIAMENTO = 0.80      # parte do valor do imóvel que pode ser financiada
+COMPROMETIMENTO_RENDA = 0.30   # primeira parcela limitada a 30% da renda
+PRAZO_MAXIMO = 600             # meses (o mesmo limite do /capacidade)
+
+CAMPOS_ENTRADA = ('renda', 'valor_imovel', 'prazo', 'juros')
+CAMPOS_SAIDA = ('linha', 'renda', 'valor_imovel', 'prazo', 'juros', 'entrada', 'valor_financiado',
+                'sac_primeira', 'sac_ultima', 'price_primeira', 'price_ultima', 'erro')
+
+
+# ponto como separador de milhar quando não há vírgula: "200.000", "R$ 1.250.000"
+_MILHAR = re.compile(r'[+-]?\d{1,3}(\.\d{3})+')
+
+
+def _numero(v):
+    # aceita 3500, 3500.5, "3.500,50", "R$ 3.500,50" e "R$ 200.000"; devolve nan se inválido
+    if v is None:
+        return np.nan
+    if isinstance(v, (int, float)):
+        return float(v)
+    s = str(v).replace('R$', '').strip()
+    if ',' in s:
+        s = s.replace('.', '').replace(',', '.')
+    elif _MILHAR.fullmatch(s):
+        s = s.replace('.', '')
+    try:
+        return float(s)
+    except ValueError:
+        return np.nan
+
+
+def linhas_texto(fp):
+    # linhas de um stream binário como texto, sem falhar no meio da resposta: UTF-8 (com ou sem
+    # BOM) e, linha a linha, cp1252 quando a linha não é UTF-8 (CSV salvo pelo Excel no Windows)
+    for n, linha in enumerate(fp):
+        if n == 0 and linha.startswith(codecs.BOM_UTF8):
+            linha = linha[len(codecs.BOM_UTF8):]
+        try:
+            yield linha.decode('utf-8')
+        except UnicodeDecodeError:
+            yield linha.decode('cp1252', errors='replace')
+
+
+def ler_csv(fp):
+    # separador pelo cabeçalho: ';' (Excel em pt-BR, com vírgula decimal) ou ','
+    fp = iter(fp)
+    cabecalho = next(fp, '')
+    separador = ';' if cabecalho.count(';') > cabecalho.count(',') else ','
+    for row in csv.DictReader(chain([cabecalho], fp), delimiter=separador):
+        yield tuple(_numero(row.get(c)) for c in CAMPOS_ENTRADA)
+
+
+def ler_ndjson(fp):
+    for linha in fp:
+        linha = linha.strip()
+        if not linha:
+            continue
+        try:
+            row = json.loads(linha)
+        except ValueError:
+            row = None
+        if not isinstance(row, dict):
+            yield (np.nan,) * len(CAMPOS_ENTRADA)
+            continue
+        yield tuple(_numero(row.get(c)) for c in CAMPOS_ENTRADA)
+
+
+def precificar(renda, valor_imovel, prazo, juros, taxa_adm, taxa_seguro, centavos=False):
+    # um bloco inteiro de uma vez: valor financiado limitado pela cota e pela renda (SAC);
+    # com `centavos`, o financiado é arredondado ao centavo e as parcelas vêm do motor de ponto fixo
+    maximo = amortizacao.valor_maximo_financiado(renda, juros, prazo, 'SAC', COMPROMETIMENTO_RENDA,
+                                                 taxa_adm, taxa_seguro)
+    financiado = np.minimum(valor_imovel * COTA_FINANCIAMENTO, maximo)
+    if centavos:
+        financiado = np.floor(financiado * 100) / 100
+        r = {k: v / 100 for k, v in amortizacao.resumo_centavos(financiado, juros, prazo, taxa_adm, taxa_seguro).items()}
+    else:
+        r = amortizacao.resumo(financiado, juros, prazo, taxa_adm, taxa_seguro)
+    r['entrada'] = valor_imovel - financiado
+    r['valor_financiado'] = financiado
+    return r
+
+
+def capacidade(renda, juros, prazo, taxa_adm, taxa_seguro):
+    # maior financiamento e maior imóvel por sistema para arrays de rendas, numa conta só:
+    # a 1ª parcela cabe em COMPROMETIMENTO_RENDA da renda e o financiamento cobre no máximo
+    # COTA_FINANCIAMENTO do imóvel
+    r = {}
+    for sistema in ('SAC', 'PRICE'):
+        financiado = amortizacao.valor_maximo_financiado(renda, juros, prazo, sistema, COMPROMETIMENTO_RENDA,
+                                                         taxa_adm, taxa_seguro)
+        r[f'financiado_{sistema.lower()}'] = financiado
+        r[f'imovel_{sistema.lower()}'] = financiado / COTA_FINANCIAMENTO
+    return r
+
+
+def blocos(linhas, prazo_padrao, taxa_adm, taxa_seguro, tamanho=TAMANHO_BLOCO, centavos=False):
+    # gera (primeira_linha, entradas, resultado, invalidas) para cada bloco de `tamanho` linhas
+    linhas = iter(linhas)
+    inicio = 1
+    while True:
+        bloco = list(islice(linhas, tamanho))
+        if not bloco:
+            return
+        a = np.array(bloco, dtype=float).reshape(-1, len(CAMPOS_ENTRADA))
+        renda, valor_imovel, prazo, juros = a.T
+        prazo = np.where(np.isnan(prazo), prazo_padrao, np.round(prazo))
+        # inf e prazos enormes também são inválidos: a PRICE em centavos percorre `prazo` meses
+        invalidas = (~np.isfinite(renda) | ~np.isfinite(valor_imovel) | ~np.isfinite(juros) | ~np.isfinite(prazo)
+                     | (renda < 0) | (valor_imovel < 0) | (juros < 0) | (prazo < 1) | (prazo > PRAZO_MAXIMO))
+        # linhas inválidas são precificadas com valores neutros e marcadas com erro na saída
+        renda = np.where(invalidas, 0.0, renda)
+        valor_imovel = np.where(invalidas, 0.0, valor_imovel)
+        juros = np.where(invalidas, 0.0, juros)
+        prazo = np.where(invalidas, prazo_padrao, prazo)
+        r = precificar(renda, valor_imovel, prazo, juros, taxa_adm, taxa_seguro, centavos)
+        yield inicio, (renda, valor_imovel, prazo, juros), r, invalidas
+        inicio += len(bloco)
+
+
+def _linhas_saida(inicio, entradas, r, invalidas):
+    renda, valor_imovel, prazo, juros = entradas
+    colunas = [np.round(c, 2).tolist() for c in (
+        renda, valor_imovel, prazo, juros, r['entrada'], r['valor_financiado'],
+        r['sac_primeira'], r['sac_ultima'], r['price_primeira'], r['price_ultima'])]
+    for n, valores in enumerate(zip(*colunas)):
+        if invalidas[n]:
+            yield (inicio + n,) + (None,) * len(valores) + ('linha inválida',)
+        else:
+            valores = list(valores)
+            valores[2] = int(valores[2])
+            yield (inicio + n,) + tuple(valores) + (None,)
+
+
+def gerar_csv(resultados):
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    w.writerow(CAMPOS_SAIDA)
+    yield buf.getvalue()
+    for bloco in resultados:
+        buf.seek(0)
+        buf.truncate()
+        w.writerows(('' if v is None else v for v in linha) for linha in _linhas_saida(*bloco))
+        yield buf.getvalue()
+
+
+def gerar_ndjson(resultados):
+    for bloco in resultados:
+        yield ''.join(json.dumps(dict(zip(CAMPOS_SAIDA, linha)), ensure_ascii=False) + '\n'
+                      for linha in _linhas_saida(*bloco))
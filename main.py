@@ -1,15 +1,32 @@
 # main.py
 import os
+import fcntl
 import logging
 import html
-from datetime import datetime
+import itertools
+import tempfile
+import time
+from datetime import datetime, timedelta
 
-from flask import Flask, request, session, redirect, url_for
-from flask_sqlalchemy import SQLAlchemy
+from flask import Flask, Response, request, session, redirect, url_for, stream_with_context
+import numpy as np
+from sqlalchemy.dialects import postgresql, sqlite
 
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+import amortizacao
+import busca
+import commit_agrupado
+import conexao_sqlite
+import leads
+import lote
+import metricas
+from modelos import db, Cliente, ClienteAlias, ClienteResumo, ClienteSimulacao, EmailOutbox, SeedVersao, Simulacao
+import outbox
+import exportacao
+import paginas
+import resumo
+from paginas import PaginasLRU, PaginasPrecompiladas
+from assets import Manifesto
+from indice_simulacoes import IndiceSimulacoes, versao_de
 
 logging.basicConfig(level=logging.INFO)
 app = Flask(__name__)
@@ -28,55 +45,69 @@ app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.secret_key = os.getenv('FLASK_SECRET', 'segredo123')
 ADMIN_PASS = os.getenv('ADMIN_PASS', 'jm.eng2025')
 PRAZO = int(os.getenv('PRAZO', '420'))
+# encargos mensais usados pelo motor de amortização quando a linha do seed não os define
+TAXA_ADM = float(os.getenv('TAXA_ADM', amortizacao.TAXA_ADM_PADRAO))
+TAXA_SEGURO = float(os.getenv('TAXA_SEGURO', amortizacao.TAXA_SEGURO_PADRAO))
+# motor de amortização em centavos inteiros, com arredondamento mês a mês como no banco
+AMORTIZACAO_CENTAVOS = os.getenv('AMORTIZACAO_CENTAVOS', '0') == '1'
+
+# group commit das gravações do /simular: janela em ms ('0' desativa; ver commit_agrupado.py)
+GRUPO_COMMIT_MS = float(os.getenv('GRUPO_COMMIT_MS', '0'))
 
 EMAIL_USER = os.getenv('EMAIL_USER', '')
 EMAIL_PASS = os.getenv('EMAIL_PASS', '')
 SEND_EMAIL = os.getenv('SEND_EMAIL', '0')  # '0' desativa
+EMAIL_TO = os.getenv('EMAIL_TO', EMAIL_USER)
+SMTP_HOST = os.getenv('SMTP_HOST', 'smtp.gmail.com')
+SMTP_PORT = int(os.getenv('SMTP_PORT', '587'))
+SMTP_STARTTLS = os.getenv('SMTP_STARTTLS', '1') != '0'
+EMAIL_DIGEST_MIN = float(os.getenv('EMAIL_DIGEST_MIN', '0'))  # >0 agrupa num resumo a cada N minutos
 
 # ---------- DB ----------
-db = SQLAlchemy(app)
-
-# ---------- Models ----------
-class Simulacao(db.Model):
-    __tablename__ = 'simulacao'
-    id = db.Column(db.Integer, primary_key=True)
-    renda = db.Column(db.String(128), nullable=False)
-    imovel = db.Column(db.String(128), nullable=False)
-    juros = db.Column(db.Float, nullable=False, default=0.0)
-    entrada = db.Column(db.Float, nullable=False, default=0.0)
-    subsidio = db.Column(db.Float, nullable=False, default=0.0)
-    valor_liberado = db.Column(db.Float, nullable=False, default=0.0)
-    sac_primeira = db.Column(db.Float, nullable=False, default=0.0)
-    sac_ultima = db.Column(db.Float, nullable=False, default=0.0)
-    price_primeira = db.Column(db.Float, nullable=False, default=0.0)
-    price_ultima = db.Column(db.Float, nullable=False, default=0.0)
-
-    # convenience
-    def to_tuple(self):
-        return (self.renda, self.imovel, self.juros, self.entrada, self.subsidio,
-                self.valor_liberado, self.sac_primeira, self.sac_ultima,
-                self.price_primeira, self.price_ultima)
-
-class Cliente(db.Model):
-    __tablename__ = 'cliente'
-    id = db.Column(db.Integer, primary_key=True)
-    nome = db.Column(db.String(256))
-    telefone = db.Column(db.String(64))
-    renda = db.Column(db.String(128))
-    valor_imovel = db.Column(db.String(128))
-    entrada = db.Column(db.Float)
-    entrada_calculada = db.Column(db.Float)
-    valor_financiado = db.Column(db.Float)
-    parcela_price = db.Column(db.Float)
-    parcela_sac_ini = db.Column(db.Float)
-    parcela_sac_fim = db.Column(db.Float)
-    prazo = db.Column(db.Integer)
-    faixa = db.Column(db.String(64))
-    juros = db.Column(db.Float)
-    subsidio = db.Column(db.Float)
-    fgts = db.Column(db.Float)
-    aprovado = db.Column(db.Integer)
-    criado_em = db.Column(db.String(64))
+# os models ficam no modelos.py (sem efeitos na importação); aqui o db é ligado ao app
+db.init_app(app)
+
+# SQLite local: WAL, synchronous e busy_timeout em cada conexão do pool (ver conexao_sqlite.py)
+if DATABASE_URL.startswith('sqlite'):
+    with app.app_context():
+        @db.event.listens_for(db.engine, 'connect')
+        def _configurar_sqlite(dbapi_con, registro):
+            conexao_sqlite.configurar(dbapi_con, os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL'),
+                                      int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000')))
+
+def atualizar_resumo(clientes, sinal=1):
+    # na transação da sessão atual, junto com o INSERT/DELETE dos clientes
+    for stmt, params in resumo.instrucoes(ClienteResumo.__table__, db.engine.dialect.name, clientes, sinal):
+        db.session.execute(stmt, params)
+
+def gravar_simulacao(valores):
+    # upsert do lead pelo telefone + resumo + histórico, na transação da sessão atual;
+    # devolve (id, simulacoes) do lead
+    dialeto, simulacao = db.engine.dialect.name, ClienteSimulacao.__table__
+    lead = db.session.execute(leads.upsert(Cliente.__table__, dialeto), valores).one()
+    anterior = None
+    if lead.simulacoes > 1:
+        anterior = db.session.execute(leads.anterior(simulacao), {'cliente_id': lead.id}).first()
+    for stmt, params in leads.instrucoes(ClienteResumo.__table__, simulacao, dialeto, lead.id, valores, anterior):
+        db.session.execute(stmt, params)
+    return lead
+
+# ---------- índice (renda, imovel) -> simulação ----------
+# carregado uma vez por worker; qualquer alteração commitada em simulacao invalida
+# o índice de todos os workers (ver indice_simulacoes.py)
+INDICE_SIMULACOES = IndiceSimulacoes(lambda: [s.to_tuple() for s in Simulacao.query.all()],
+                                     os.getenv('INDICE_VERSAO_PATH') or None)
+
+@db.event.listens_for(Simulacao, 'after_insert')
+@db.event.listens_for(Simulacao, 'after_update')
+@db.event.listens_for(Simulacao, 'after_delete')
+def _simulacao_alterada(mapper, connection, target):
+    db.session.info['simulacao_alterada'] = True
+
+@db.event.listens_for(db.session, 'after_commit')
+def _invalidar_indice(session):
+    if session.info.pop('simulacao_alterada', False):
+        INDICE_SIMULACOES.invalidar()
 
 # ---------- utilidades ----------
 def fmt(v):
@@ -85,6 +116,16 @@ def fmt(v):
     except Exception:
         return v
 
+RENDA_OPTS = [
+    'até 1.500 reais','até 2.160 reais','até 2.850 reais','até 3.500 reais',
+    'até 4.000 reais','até 4.700 reais','até 8.600 reais','acima de 10.000 reais'
+]
+IMOVEL_OPTS = ['imovel ate 210k','imovel ate 350k','imovel ate 500k']
+FAIXA_OPTS = ['Faixa 1','Faixa 2','Faixa 3','Faixa 4']
+# teto numérico de cada opção (mesma ordem), usado nos cálculos de capacidade
+RENDA_TETO = [1500, 2160, 2850, 3500, 4000, 4700, 8600, 10000]
+IMOVEL_TETO = [210000, 350000, 500000]
+
 def faixa_por_renda(r):
     m = {
         'até 1.500 reais':'Faixa 1','até 2.160 reais':'Faixa 1','até 2.850 reais':'Faixa 1',
@@ -94,22 +135,23 @@ def faixa_por_renda(r):
     return m.get(r,'Faixa desconhecida')
 
 # ---------- CSS/JS (mantive idêntico ao seu) ----------
-STYLE = """<link rel='stylesheet' href='https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css'>
+# o CSS e o JS próprios ficam em static/app.css e static/app.js; `python assets.py` gera as
+# cópias com hash em dist/assets (servidas em /assets com cache imutável)
+ASSETS = Manifesto.carregar(os.getenv('ASSETS_DIR') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dist', 'assets'))
+LOGO_URL = ASSETS.url('logo.jpg')
+
+STYLE = f"""<link rel='stylesheet' href='https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css'>
 <link rel='stylesheet' href='https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.4.0/css/all.min.css'>
 <script src='https://cdnjs.cloudflare.com/ajax/libs/jquery/3.7.1/jquery.min.js'></script>
 <script src='https://cdnjs.cloudflare.com/ajax/libs/jquery.mask/1.14.16/jquery.mask.min.js'></script>
-<style>
-/* (use o mesmo CSS que você tinha - por brevidade aqui assume-se que seja idêntico) */
-body { background: linear-gradient(135deg, #0d1117, #161b22); font-family: 'Segoe UI', sans-serif; color: #e6e6e6; }
-.logo { display:block; margin:0 auto 20px; max-height:90px; filter: drop-shadow(0 0 4px rgba(0,191,255,0.4)); }
-/* ... restantes do CSS ... */
-.box { max-width:850px; margin:40px auto; padding:25px; border-radius:20px; background:#1e242c; }
-.table { color:#e6e6e6; background-color:#1c2128; }
-</style>
-<script>$(function(){ $('#telefone').mask('(00) 00000-0000'); });</script>
+<link rel='stylesheet' href='{ASSETS.url('app.css')}'>
+<script src='{ASSETS.url('app.js')}'></script>
 """
 
 # ---------- seed: contém todas as simulações (os "valores de simulações" solicitados) ----------
+CAMPOS_SEED = ('renda', 'imovel', 'juros', 'entrada', 'subsidio', 'valor_liberado',
+               'sac_primeira', 'sac_ultima', 'price_primeira', 'price_ultima')
+
 def seed_simulacoes():
     expected = [
         # Imóvel até 210k
@@ -143,35 +185,120 @@ def seed_simulacoes():
         ('acima de 10.000 reais','imovel ate 500k',10.47,100000.00,0.00,400000.00,3600.00,804.98,3563.97,3463.69),
     ]
 
-    for row in expected:
-        renda, imovel = row[0], row[1]
-        exists = Simulacao.query.filter_by(renda=renda, imovel=imovel).first()
-        if not exists:
-            s = Simulacao(
-                renda = renda, imovel = imovel,
-                juros = row[2], entrada = row[3], subsidio = row[4], valor_liberado = row[5],
-                sac_primeira = row[6], sac_ultima = row[7],
-                price_primeira = row[8], price_ultima = row[9]
-            )
-            db.session.add(s)
+    # seed igual ao último aplicado: uma consulta e pronto
+    versao = versao_de(expected)
+    aplicada = db.session.get(SeedVersao, 'simulacao')
+    if aplicada is not None and aplicada.hash == versao:
+        db.session.rollback()
+        return False
+
+    # seed novo ou alterado: um único upsert por (renda, imovel)
+    insert = postgresql.insert if db.engine.dialect.name == 'postgresql' else sqlite.insert
+    stmt = insert(Simulacao).values([dict(zip(CAMPOS_SEED, row)) for row in expected])
+    stmt = stmt.on_conflict_do_update(index_elements=['renda', 'imovel'],
+                                      set_={c: stmt.excluded[c] for c in CAMPOS_SEED[2:]})
+    db.session.execute(stmt)
+    db.session.merge(SeedVersao(nome='simulacao', hash=versao, aplicado_em=time.time()))
     db.session.commit()
-    logging.info("Seed de simulações finalizada.")
+    # o upsert não passa pelos eventos do ORM
+    INDICE_SIMULACOES.invalidar()
+    logging.info("Seed de simulações aplicada (versão %s).", versao)
+    return True
+
+def conferencia_seed():
+    # cada combinação do seed contra o motor (um modelo de encargos só, TAXA_ADM/TAXA_SEGURO)
+    linhas = []
+    for renda in RENDA_OPTS:
+        for imovel in IMOVEL_OPTS:
+            s = INDICE_SIMULACOES.obter(renda, imovel)
+            if s is None:
+                continue
+            reproduz, calculado, diferencas = amortizacao.conferir_seed(s, PRAZO, TAXA_ADM, TAXA_SEGURO,
+                                                                        AMORTIZACAO_CENTAVOS)
+            linhas.append({'renda': renda, 'imovel': imovel, 'fonte': 'motor' if reproduz else 'seed',
+                           'elegivel': s.valor_liberado > 0, 'seed': {k: getattr(s, k) for k in diferencas},
+                           'motor': calculado, 'diferenca': diferencas})
+    return linhas
 
 # ---------- inicialização DB (cria tabelas e seeds) ----------
-with app.app_context():
-    db.create_all()
-    seed_simulacoes()
+# Roda uma vez por deploy: com preload_app (gunicorn.conf.py) acontece no master, antes do fork.
+# Sem preload, cada worker passa por aqui, um de cada vez (flock), e os seguintes só conferem
+# o hash do seed.
+def inicializar_db():
+    t0 = time.perf_counter()
+    caminho_trava = os.getenv('INIT_LOCK_PATH') or os.path.join(tempfile.gettempdir(), 'simulador_init.lock')
+    with open(caminho_trava, 'a') as trava, app.app_context():
+        fcntl.flock(trava, fcntl.LOCK_EX)
+        resumo_novo = not db.inspect(db.engine).has_table(ClienteResumo.__tablename__)
+        db.create_all()
+        # base de antes dos leads por telefone: colunas novas e histórico, antes de criar o
+        # índice único; nada é juntado nem apagado aqui (ver leads.py)
+        with db.engine.begin() as con:
+            leads.migrar(con, Cliente.__table__, ClienteSimulacao.__table__)
+        if resumo_novo:
+            # base que já tinha clientes antes da tabela de resumo existir
+            with db.engine.begin() as con:
+                resumo.reconstruir(con, ClienteResumo.__table__, Cliente.__table__)
+        # create_all não cria índices novos em tabelas que já existem
+        inspetor = db.inspect(db.engine)
+        for tabela in db.metadata.sorted_tables:
+            existentes = {i['name'] for i in inspetor.get_indexes(tabela.name)}
+            for indice in tabela.indexes:
+                if indice.name in existentes:
+                    continue
+                if indice.name == 'uq_simulacao_renda_imovel':
+                    # bases antigas podem ter linhas repetidas (workers semeando ao mesmo tempo)
+                    with db.engine.begin() as con:
+                        con.execute(db.text('DELETE FROM simulacao WHERE id NOT IN '
+                                            '(SELECT MIN(id) FROM simulacao GROUP BY renda, imovel)'))
+                indice.create(db.engine)
+        # FTS5 + triggers no SQLite, índices pg_trgm no Postgres (ver busca.py)
+        with db.engine.begin() as con:
+            busca.criar_indices(con, Cliente.__table__)
+        seed_simulacoes()
+        fora = [f"{r['renda']} / {r['imovel']}" for r in conferencia_seed() if r['elegivel'] and r['fonte'] == 'seed']
+        if fora:
+            logging.warning('Motor fora da tolerância do seed em %d combinações (cotadas pelo seed; ver /admin/seed): %s',
+                            len(fora), '; '.join(fora))
+        # nenhuma conexão aberta aqui deve passar para os workers depois do fork
+        db.engine.dispose()
+    logging.info('Banco inicializado em %.1f ms', (time.perf_counter() - t0) * 1000)
+
+inicializar_db()
+
+# ---------- métricas (/metrics, ver metricas.py) ----------
+metricas.instrumentar(app, db, lambda: db.session.query(db.func.count(Cliente.id)).scalar())
 
 # ---------- email ----------
+# o envio sai da requisição: send_email() só grava na outbox, e a thread do outbox
+# (um remetente por máquina, conexão SMTP reaproveitada) faz o envio
+OUTBOX = None
+if SEND_EMAIL != '0' and EMAIL_USER:
+    OUTBOX = outbox.Outbox(
+        app, db, EmailOutbox,
+        outbox.ConexaoSMTP(SMTP_HOST, SMTP_PORT, EMAIL_USER, EMAIL_PASS, starttls=SMTP_STARTTLS),
+        EMAIL_USER, EMAIL_TO, digest_min=EMAIL_DIGEST_MIN,
+        caminho_trava=os.getenv('OUTBOX_LOCK_PATH') or None,
+        observar_envio=metricas.observar_smtp)
+
+GRUPO_COMMIT = commit_agrupado.CommitAgrupado(app, db, GRUPO_COMMIT_MS) if GRUPO_COMMIT_MS > 0 else None
+
+@app.before_request
+def _iniciar_outbox():
+    if OUTBOX is not None:
+        OUTBOX.iniciar()
+
 def send_email(nome, tel, renda, imovel, price, sac_ini, sac_fim, faixa):
-    if SEND_EMAIL == '0' or not EMAIL_USER or not EMAIL_PASS:
+    # adiciona o e-mail à sessão atual; vai para a fila no commit de quem chamou
+    if OUTBOX is None:
         logging.info('Envio de email desativado ou credenciais ausentes')
-        return
-    msg = MIMEMultipart()
-    msg['From'] = EMAIL_USER
-    msg['To'] = EMAIL_USER
-    msg['Subject'] = 'Nova simulação'
-    body = f"""Nova simulação realizada:
+        return False
+    OUTBOX.enfileirar('Nova simulação', corpo_email(nome, tel, renda, imovel, price, sac_ini, sac_fim, faixa))
+    metricas.EMAILS_ENFILEIRADOS.inc()
+    return True
+
+def corpo_email(nome, tel, renda, imovel, price, sac_ini, sac_fim, faixa):
+    return f"""Nova simulação realizada:
 Nome: {nome}
 Telefone: {tel}
 Renda: {renda}
@@ -181,27 +308,14 @@ Faixa: {faixa}
 1ª Parcela SAC: R$ {fmt(sac_ini)}
 Última Parcela SAC: R$ {fmt(sac_fim)}
 """
-    msg.attach(MIMEText(body, 'plain'))
-    try:
-        with smtplib.SMTP('smtp.gmail.com', 587) as smtp:
-            smtp.starttls()
-            smtp.login(EMAIL_USER, EMAIL_PASS)
-            smtp.send_message(msg)
-            logging.info('Email enviado para %s', EMAIL_USER)
-    except Exception:
-        logging.exception('Falha ao enviar email (verifique credenciais/SMTP)')
 
 # ---------- rotas (mantive a UX do seu app) ----------
-@app.route('/')
-def home():
-    renda_opts = [
-          'até 1.500 reais','até 2.160 reais','até 2.850 reais','até 3.500 reais',
-        'até 4.000 reais','até 4.700 reais','até 8.600 reais','acima de 10.000 reais'
-    ]
-    imovel_opts = ['imovel ate 210k','imovel ate 350k','imovel ate 500k']
-    renda_html = ''.join(f"<option value='{r}'>{r}</option>" for r in renda_opts)
-    imovel_html = ''.join(f"<option value='{i}'>{i}</option>" for i in imovel_opts)
-    logo_url = url_for('static', filename='logo.jpg')
+# home e login não dependem da requisição: são renderizadas uma vez e servidas com ETag/gzip
+PAGINAS = PaginasPrecompiladas()
+
+def _render_home(logo_url):
+    renda_html = ''.join(f"<option value='{r}'>{r}</option>" for r in RENDA_OPTS)
+    imovel_html = ''.join(f"<option value='{i}'>{i}</option>" for i in IMOVEL_OPTS)
     return STYLE + f"""
         <img src="{logo_url}" class="logo">
         <div class="box">
@@ -215,24 +329,23 @@ def home():
       </form>
     </div>"""
 
-@app.route('/simular', methods=['POST'])
-def simular():
-    nome = request.form.get('nome')
-    tel = request.form.get('telefone')
-    renda = request.form.get('renda')
-    imovel = request.form.get('valor_imovel')
-    if not all([nome, tel, renda, imovel]):
-        return 'Dados incompletos', 400
+@app.route('/assets/<path:nome>')
+def asset(nome):
+    return ASSETS.servir(nome)
 
-    s = Simulacao.query.filter_by(renda=renda, imovel=imovel).first()
-    if s is None:
-        return "Simulação não encontrada para a combinação selecionada.", 400
-
-    price, sac_ini, sac_fim = s.price_primeira, s.sac_primeira, s.sac_ultima
-    faixa = faixa_por_renda(renda)
-    criado = datetime.now().strftime('%d/%m/%Y %H:%M')
+@app.route('/')
+def home():
+    logo_url = LOGO_URL
+    chave = (STYLE, tuple(RENDA_OPTS), tuple(IMOVEL_OPTS), logo_url)
+    return PAGINAS.responder('home', chave, lambda: _render_home(logo_url))
 
-    cliente = Cliente(
+def dados_cliente(nome, tel, renda, imovel):
+    # colunas do cliente simulado (também usado pelo asgi.py); None se a combinação não existe
+    s = INDICE_SIMULACOES.obter(renda, imovel)
+    if s is None:
+        return None
+    price, sac_ini, sac_fim = amortizacao.parcelas(s, PRAZO, TAXA_ADM, TAXA_SEGURO, centavos=AMORTIZACAO_CENTAVOS)
+    return dict(
         nome = nome,
         telefone = tel,
         renda = renda,
@@ -244,36 +357,100 @@ def simular():
         parcela_sac_ini = sac_ini,
         parcela_sac_fim = sac_fim,
         prazo = PRAZO,
-        faixa = faixa,
+        faixa = faixa_por_renda(renda),
         juros = s.juros,
         subsidio = s.subsidio,
         fgts = 0,
         aprovado = 1,
-        criado_em = criado
+        criado_em = datetime.now().strftime('%d/%m/%Y %H:%M'),
+        telefone_e164 = leads.e164(tel)
     )
-    db.session.add(cliente)
-    db.session.commit()
-    cid = cliente.id
 
-    try:
-        send_email(nome, tel, renda, imovel, price, sac_ini, sac_fim, faixa)
-    except Exception:
-        logging.exception('Erro no envio de email (ignorado)')
+def dados_email(v):
+    return (v['nome'], v['telefone'], v['renda'], v['valor_imovel'], v['parcela_price'],
+            v['parcela_sac_ini'], v['parcela_sac_fim'], v['faixa'])
+
+@app.route('/simular', methods=['POST'])
+def simular():
+    nome = request.form.get('nome')
+    tel = request.form.get('telefone')
+    renda = request.form.get('renda')
+    imovel = request.form.get('valor_imovel')
+    if not all([nome, tel, renda, imovel]):
+        return 'Dados incompletos', 400
+
+    valores = dados_cliente(nome, tel, renda, imovel)
+    if valores is None:
+        return "Simulação não encontrada para a combinação selecionada.", 400
+
+    def gravar():
+        # só instruções na sessão: com group commit pode rodar de novo após um rollback
+        cid, simulacoes = gravar_simulacao(valores)
+        # e-mail só para lead novo; quem simula de novo já foi avisado
+        return cid, simulacoes, simulacoes == 1 and send_email(*dados_email(valores))
+
+    if GRUPO_COMMIT is not None:
+        cid, simulacoes, email = GRUPO_COMMIT.executar(gravar)
+    else:
+        cid, simulacoes, email = gravar()
+        db.session.commit()
+    metricas.observar_simulacao(simulacoes == 1)
+    if simulacoes > 1:
+        # a página do lead mudou para a nova simulação
+        RESULTADOS.invalidar(cid)
+    if email:
+        OUTBOX.acordar()
 
     return redirect(url_for('resultado', id=cid))
 
+# Lote: precifica CSV/NDJSON (renda, valor_imovel, prazo, juros) sem gravar clientes
+@app.route('/simular/lote', methods=['POST'])
+def simular_lote():
+    ndjson = (request.args.get('formato') == 'ndjson'
+              or request.mimetype in ('application/x-ndjson', 'application/jsonl', 'application/json'))
+
+    # o corpo é lido dentro do gerador, bloco a bloco, enquanto a resposta é enviada
+    @stream_with_context
+    def gerar():
+        fp = lote.linhas_texto(request.stream)
+        linhas = lote.ler_ndjson(fp) if ndjson else lote.ler_csv(fp)
+        resultados = lote.blocos(linhas, PRAZO, TAXA_ADM, TAXA_SEGURO, centavos=AMORTIZACAO_CENTAVOS)
+        yield from (lote.gerar_ndjson(resultados) if ndjson else lote.gerar_csv(resultados))
+
+    if ndjson:
+        return Response(gerar(), mimetype='application/x-ndjson')
+    return Response(gerar(), mimetype='text/csv',
+                    headers={'Content-Disposition': 'attachment; filename=simulacoes.csv'})
+
+# o cliente só muda quando o mesmo telefone simula de novo: a página é renderizada uma vez por
+# worker e servida do cache (com ETag; o navegador revalida com If-None-Match); simular() e
+# excluir() invalidam
+RESULTADOS = PaginasLRU(int(os.getenv('RESULTADO_CACHE_MAX', '2000')),
+                        os.getenv('RESULTADO_CACHE_PATH') or None,
+                        observar=metricas.observar_cache_resultado)
+
 @app.route('/resultado/<int:id>')
 def resultado(id):
-    c = Cliente.query.get(id)
-    if not c:
+    def renderizar():
+        c = db.session.get(Cliente, id)
+        return render_resultado(c) if c else None
+    p = RESULTADOS.obter(id, renderizar)
+    if p is None:
+        # id de um cliente juntado a outro lead (leads.py juntar)
+        alias = db.session.get(ClienteAlias, id)
+        if alias is not None:
+            return redirect(url_for('resultado', id=alias.cliente_id), 301)
         return 'Simulação não encontrada', 404
+    return paginas.responder(p, RESULTADOS.cache_control)
 
+def render_resultado(c):
+    # `c` é um Cliente ou uma linha da tabela cliente (asgi.py)
     nome = html.escape(c.nome)
     telefone = html.escape(c.telefone)
     renda_txt = html.escape(c.renda)
     imovel_txt = html.escape(c.valor_imovel)
     faixa_txt = html.escape(c.faixa)
-    logo_url = url_for('static', filename='logo.jpg')
+    logo_url = LOGO_URL
 
     return STYLE + f"""
         <img src="{logo_url}" class="logo">
@@ -292,15 +469,204 @@ def resultado(id):
         <tr><th>Data/Hora</th><td>{html.escape(c.criado_em)}</td></tr>
       </table>
       <a href="https://api.whatsapp.com/send?phone=5538998721022&text=Ol%C3%A1,%20podemos%20conversar%20sobre%20minha%20futura%20casa?%20nome:%20{nome},%20Renda:%20{renda_txt},%20Im%C3%B3vel:%20{imovel_txt},%20Faixa:%20{faixa_txt},%201%C2%AA%20Parcela%20PRICE:%20R$%20{fmt(c.parcela_price)},%201%C2%AA%20Parcela%20SAC:%20R$%20{fmt(c.parcela_sac_ini)},%20%C3%9Altima%20SAC:%20{fmt(c.parcela_sac_fim)}" target="_blank" class="btn-custom btn-whatsapp w-100 mb-2"><i class="fab fa-whatsapp"></i>Começar Consultoria</a>
+      {link_tabela(c)}
       <a href='/' class='btn-custom btn-primary w-100 mb-2 d-flex align-items-center justify-content-center'>Nova Simulação</a>
     </div>"""
 
+def cotacao_do_motor(c):
+    # a parcela gravada do cliente é a do motor? Mesma decisão do /simular
+    # (amortizacao.conferir_seed na linha do seed do cliente); senão ela veio do seed e a tabela
+    # e a grade, calculadas pelo motor com TAXA_ADM/TAXA_SEGURO, não batem com ela
+    s = INDICE_SIMULACOES.obter(c.renda, c.valor_imovel)
+    return s is not None and amortizacao.conferir_seed(s, c.prazo or PRAZO, TAXA_ADM, TAXA_SEGURO,
+                                                       AMORTIZACAO_CENTAVOS)[0]
+
+# Tabela completa de amortização de um cliente, gerada mês a mês (amortizacao.linhas_tabela)
+# e enviada em streaming como HTML ou CSV; não é montada em memória nem gravada no banco.
+# Quando a parcela cotada veio do seed (cotacao_do_motor falso) a tabela é do motor e não bate
+# com ela: sai marcada como estimativa (aviso no HTML, cabeçalho X-Cotacao-Fonte e sufixo no CSV);
+# sistema sem parcela cotada (fora da faixa no seed) não tem tabela
+CAMPOS_TABELA = ('mes', 'parcela', 'juros', 'amortizacao', 'encargos', 'saldo')
+
+def parcela_cotada(c, sistema):
+    return c.parcela_sac_ini if sistema == 'SAC' else c.parcela_price
+
+def link_tabela(c):
+    # link da página de resultado: só para sistema com parcela cotada, marcado se for estimativa
+    sistemas = [s for s in ('SAC', 'PRICE') if parcela_cotada(c, s)]
+    if not sistemas or not c.valor_financiado or c.valor_financiado <= 0:
+        return ''
+    rotulo = 'Tabela de amortização' if cotacao_do_motor(c) else 'Tabela de amortização (estimativa)'
+    return (f"<a href='/resultado/{c.id}/tabela?sistema={sistemas[0].lower()}' class='btn-custom btn-secondary "
+            f"w-100 mb-2 d-flex align-items-center justify-content-center'>{rotulo}</a>")
+
+@app.route('/resultado/<int:id>/tabela')
+def resultado_tabela(id):
+    c = db.session.get(Cliente, id)
+    if not c:
+        return 'Simulação não encontrada', 404
+    sistema = request.args.get('sistema', 'sac').upper()
+    formato = request.args.get('formato', 'html')
+    if sistema not in ('SAC', 'PRICE') or formato not in ('html', 'csv'):
+        return 'Use sistema=sac|price e formato=html|csv', 400
+    if not c.valor_financiado or c.valor_financiado <= 0:
+        return 'Cliente sem valor financiado', 422
+    cotada = parcela_cotada(c, sistema)
+    if not cotada:
+        return f'Combinação fora da faixa do {sistema}: sem parcela cotada', 422
+    fonte = 'motor' if cotacao_do_motor(c) else 'seed'
+    linhas = amortizacao.linhas_tabela(c.valor_financiado, c.juros, c.prazo or PRAZO, sistema, TAXA_ADM, TAXA_SEGURO,
+                                       centavos=AMORTIZACAO_CENTAVOS)
+    cabecalhos = {'X-Cotacao-Fonte': fonte, 'X-Parcela-Cotada': f'{cotada:.2f}'}
+
+    if formato == 'csv':
+        def gerar_csv():
+            yield from exportacao.gerar_csv(CAMPOS_TABELA, ((m, *(f'{v:.2f}' for v in r)) for m, *r in linhas))
+        sufixo = '' if fonte == 'motor' else '_estimativa'
+        nome = f'tabela_{sistema.lower()}_{c.id}{sufixo}.csv'
+        cabecalhos['Content-Disposition'] = f'attachment; filename={nome}'
+        return Response(gerar_csv(), mimetype='text/csv', headers=cabecalhos)
+
+    logo_url = LOGO_URL
+    outro = 'price' if sistema == 'SAC' else 'sac'
+    ver_outro = (f"<a href='{url_for('resultado_tabela', id=c.id, sistema=outro)}'>ver {outro.upper()}</a> ·"
+                 if parcela_cotada(c, outro.upper()) else '')
+    aviso = ''
+    if fonte == 'seed':
+        primeira = next(linhas)
+        linhas = itertools.chain([primeira], linhas)
+        aviso = f"""
+      <p class='alert alert-warning'>Estimativa: a 1ª parcela {sistema} cotada para esta faixa é R$ {fmt(cotada)}
+        (tabela do banco); esta tabela é do nosso cálculo, com encargos padrão, e começa em
+        R$ {fmt(primeira[1])}. Os valores mês a mês são ilustrativos.</p>"""
+
+    @stream_with_context
+    def gerar():
+        yield STYLE + f"""
+    <img src='{logo_url}' class='logo'>
+    <div class='box'>
+      <h3>Tabela {sistema} — {c.prazo or PRAZO} meses</h3>
+      <p>Financiado R$ {fmt(c.valor_financiado)} a {c.juros}% a.a.
+        {ver_outro}
+        <a href='{url_for('resultado_tabela', id=c.id, sistema=sistema.lower(), formato='csv')}'>baixar CSV</a></p>{aviso}
+      <table class='table table-sm'>
+        <thead><tr><th>Mês</th><th>Parcela</th><th>Juros</th><th>Amortização</th><th>Encargos</th><th>Saldo</th></tr></thead>
+        <tbody>"""
+        trs = []
+        for m, *r in linhas:
+            trs.append(f"<tr><td>{m}</td>{''.join(f'<td>R$ {fmt(v)}</td>' for v in r)}</tr>")
+            if len(trs) == 60:
+                yield ''.join(trs)
+                trs = []
+        yield ''.join(trs) + f"""</tbody>
+      </table>
+      <a href='{url_for('resultado', id=c.id)}' class='btn-custom btn-secondary'>Voltar</a>
+    </div>"""
+
+    return Response(gerar(), mimetype='text/html', headers=cabecalhos)
+
+# Cenários (what-if) de um cliente: 1ª parcela PRICE/SAC em toda a grade juros × prazo × entrada,
+# calculada de uma vez (amortizacao.grade_primeiras) e devolvida em JSON compacto para heatmap.
+# As parcelas vêm em centavos, numa lista plana na ordem juros, prazo, entrada (row-major).
+GRADE_MAX = {'juros': 100, 'prazo': 60, 'entrada': 50}
+
+def _eixo(nome, minimo, maximo, n, atual, inteiro=False, piso=0.0, teto=np.inf):
+    # eixo de `n` pontos entre os limites pedidos, sempre com o valor atual do cliente quando ele
+    # está no intervalo (o ponto da parcela gravada faz parte da grade)
+    a = request.args
+    minimo = a.get(f'{nome}_min', minimo, type=float)
+    maximo = a.get(f'{nome}_max', maximo, type=float)
+    n = a.get(f'n_{nome}', n, type=int)
+    if inteiro:
+        minimo, maximo, atual = np.rint(minimo), np.rint(maximo), np.rint(atual)
+    if (not 1 <= n <= GRADE_MAX[nome] or not np.isfinite([minimo, maximo]).all()
+            or minimo < piso or maximo < minimo or maximo > teto):
+        limites = f'{piso:g} <= {nome}_min <= {nome}_max' + (f' <= {teto:g}' if np.isfinite(teto) else '')
+        raise ValueError(f'{nome}: use {limites} e 1 <= n_{nome} <= {GRADE_MAX[nome]}')
+    eixo = np.linspace(minimo, maximo, n)
+    eixo = np.rint(eixo) if inteiro else np.round(eixo, 4)
+    if minimo <= atual <= maximo:
+        eixo = np.append(eixo, atual if inteiro else round(atual, 4))
+    return np.unique(eixo)
+
+@app.route('/resultado/<int:id>/cenarios')
+def resultado_cenarios(id):
+    c = db.session.get(Cliente, id)
+    if not c:
+        return {'erro': 'Simulação não encontrada'}, 404
+    entrada, financiado = c.entrada or 0.0, c.valor_financiado or 0.0
+    if financiado <= 0:
+        return {'erro': 'Cliente sem valor financiado'}, 422
+    try:
+        juros = _eixo('juros', max(c.juros - 2.0, 0.0), c.juros + 2.0, 50, c.juros)
+        prazos = _eixo('prazo', 120, 420, 30, c.prazo or PRAZO, inteiro=True, piso=1, teto=lote.PRAZO_MAXIMO)
+        entradas = _eixo('entrada', entrada, entrada + financiado * 0.5, 20, entrada)
+    except ValueError as e:
+        return {'erro': str(e)}, 400
+
+    price, sac = amortizacao.grade_primeiras(entrada + financiado, juros, prazos, entradas, TAXA_ADM, TAXA_SEGURO)
+    return {
+        'id': c.id,
+        'atual': {'juros': c.juros, 'prazo': c.prazo, 'entrada': entrada},
+        # 'seed': a parcela gravada veio do seed e o ponto atual da grade (motor) difere dela
+        'cotacao': {'fonte': 'motor' if cotacao_do_motor(c) else 'seed', 'price': c.parcela_price,
+                    'sac': c.parcela_sac_ini, 'elegivel_sac': bool(c.parcela_sac_ini),
+                    'elegivel_price': bool(c.parcela_price)},
+        'eixos': {'juros': juros.tolist(), 'prazo': prazos.astype(int).tolist(), 'entrada': entradas.tolist()},
+        'shape': list(price.shape),
+        'price_centavos': np.rint(price * 100).astype(np.int64).ravel().tolist(),
+        'sac_centavos': np.rint(sac * 100).astype(np.int64).ravel().tolist(),
+    }
+
+# Capacidade: maior imóvel que cabe na renda (30% na 1ª parcela, 80% financiado), por sistema,
+# resolvida em forma fechada para um array inteiro de rendas (lote.capacidade)
+CAPACIDADE_MAX_RENDAS = 100000
+CAPACIDADE_RENDA_MAX = 10_000_000.0   # R$/mês; acima disso a resposta deixa de ser um número útil
+
+def _juros_da_renda(renda):
+    # sem juros informado, usa a taxa da faixa de renda (linha do seed do menor imóvel)
+    taxas = np.array([(INDICE_SIMULACOES.obter(r, IMOVEL_OPTS[0]) or (0.0,) * 3)[2] for r in RENDA_OPTS])
+    return taxas[np.minimum(np.searchsorted(RENDA_TETO, renda), len(RENDA_OPTS) - 1)]
+
+@app.route('/capacidade', methods=['GET', 'POST'])
+def capacidade():
+    # GET ?renda=3500&renda=5200 (ou renda=3500,5200) | POST {"renda": [...], "juros": ..., "prazo": ...}
+    dados = request.get_json(silent=True) if request.method == 'POST' else None
+    if dados is None:
+        dados = {'renda': [v for r in request.args.getlist('renda') for v in r.split(',') if v.strip()],
+                 'juros': request.args.get('juros'), 'prazo': request.args.get('prazo')}
+    try:
+        renda = np.atleast_1d(np.asarray(dados.get('renda') or [], dtype=float))
+        prazo = float(dados.get('prazo') or PRAZO)
+        juros = dados.get('juros')
+        juros = _juros_da_renda(renda) if juros in (None, '') else np.broadcast_to(np.asarray(juros, dtype=float), renda.shape)
+    except (TypeError, ValueError, AttributeError):
+        return {'erro': 'renda, juros e prazo devem ser numéricos (juros: escalar ou um por renda)'}, 400
+    if not 1 <= len(renda) <= CAPACIDADE_MAX_RENDAS or renda.ndim != 1:
+        return {'erro': f'informe de 1 a {CAPACIDADE_MAX_RENDAS} rendas'}, 400
+    if (not np.isfinite(renda).all() or not np.isfinite(juros).all() or (renda < 0).any()
+            or (renda > CAPACIDADE_RENDA_MAX).any() or (juros < 0).any() or not 1 <= prazo <= lote.PRAZO_MAXIMO):
+        return {'erro': f'valores fora do intervalo (renda de 0 a {CAPACIDADE_RENDA_MAX:.0f}, juros finito >= 0, '
+                        f'prazo de 1 a {lote.PRAZO_MAXIMO})'}, 400
+
+    r = lote.capacidade(renda, juros, prazo, TAXA_ADM, TAXA_SEGURO)
+    resposta = {'prazo': int(prazo), 'comprometimento': lote.COMPROMETIMENTO_RENDA,
+                'cota_financiamento': lote.COTA_FINANCIAMENTO,
+                'renda': renda.tolist(), 'juros': np.round(juros, 4).tolist()}
+    resposta.update({k: np.round(v, 2).tolist() for k, v in r.items()})
+    return resposta
+
 @app.route('/login', methods=['GET','POST'])
 def login():
     if request.method == 'POST' and request.form.get('senha') == ADMIN_PASS:
         session['admin'] = True
         return redirect(url_for('admin'))
-    logo_url = url_for('static', filename='logo.jpg')
+    logo_url = LOGO_URL
+    if request.method == 'GET':
+        return PAGINAS.responder('login', (STYLE, logo_url), lambda: _render_login(logo_url))
+    return _render_login(logo_url)
+
+def _render_login(logo_url):
     return STYLE + f"""
     <div class='box'>
       <img src='{logo_url}' class='logo'>
@@ -311,31 +677,335 @@ def login():
       </form>
     </div>"""
 
+ADMIN_POR_PAGINA = int(os.getenv('ADMIN_POR_PAGINA', '100'))
+
+def _opcoes(opts, atual):
+    vazia = "<option value=''>Todas</option>"
+    return vazia + ''.join(
+        f"<option value='{html.escape(o)}'{' selected' if o == atual else ''}>{html.escape(o)}</option>" for o in opts)
+
 @app.route('/admin')
 def admin():
     if 'admin' not in session:
         return redirect(url_for('login'))
-    rows = Cliente.query.order_by(Cliente.criado_em.desc()).all()
-    trs = ''
-    for r in rows:
-        trs += f"""
+
+    pagina = pagina_admin()
+
+    @stream_with_context
+    def gerar():
+        yield admin_cabecalho(pagina)
+        ultimo, n = None, 0
+        for linhas in db.session.execute(pagina['consulta']).partitions(50):
+            yield admin_linhas(linhas)
+            ultimo, n = linhas[-1].id, n + len(linhas)
+        yield admin_rodape(pagina, n, ultimo)
+
+    return Response(gerar(), mimetype='text/html')
+
+# partes da página do /admin, compartilhadas com o asgi.py; pagina_admin() e admin_rodape()
+# leem request.args / url_for e precisam de um contexto de requisição do Flask
+def pagina_admin():
+    # paginação por chave: `antes` é o menor id da página anterior, então cada página
+    # é um range scan no índice, sem OFFSET, não importa o tamanho da tabela
+    filtros = {k: request.args.get(k, '') for k in ('q', 'faixa', 'renda', 'imovel')}
+    antes = request.args.get('antes', type=int)
+    limite = min(max(request.args.get('limite', ADMIN_POR_PAGINA, type=int), 1), 500)
+
+    q, chave = filtrar_clientes(db.select(*Cliente.__table__.columns).limit(limite), filtros)
+    q = q.order_by(chave.desc())
+    if antes is not None:
+        q = q.where(chave < antes)
+    return {'filtros': filtros, 'limite': limite, 'consulta': q}
+
+def filtrar_clientes(q, filtros):
+    # filtros do /admin (também usados na exclusão em lote); devolve (select, coluna do id
+    # que ordena e pagina)
+    chave = Cliente.id
+    if filtros['q'].strip():
+        # busca por nome/telefone pelo índice (busca.py); pagina pela mesma chave (o id)
+        q, chave = busca.filtrar(q, Cliente.__table__, db.engine.dialect.name, filtros['q'])
+    if filtros['faixa']:
+        q = q.where(Cliente.faixa == filtros['faixa'])
+    if filtros['renda']:
+        q = q.where(Cliente.renda == filtros['renda'])
+    if filtros['imovel']:
+        q = q.where(Cliente.valor_imovel == filtros['imovel'])
+    return q, chave
+
+def admin_cabecalho(pagina):
+    filtros = pagina['filtros']
+    aviso = ''
+    if filtros['q'].strip() and busca.termos(filtros['q']) == ([], ''):
+        aviso = "<p class='text-muted'>Busque por ao menos 2 letras do nome ou 3 dígitos do telefone.</p>"
+    return STYLE + f"""
+    <img src='{LOGO_URL}' class='logo'>
+    <div class='box'>
+      <h3>Área Administrativa</h3>
+      <form method='get' class='d-flex gap-2 mb-2'>
+        <input type='search' name='q' value='{html.escape(filtros['q'])}' placeholder='Nome ou telefone' class='form-control'>
+        <select name='faixa' class='form-select'>{_opcoes(FAIXA_OPTS, filtros['faixa'])}</select>
+        <select name='renda' class='form-select'>{_opcoes(RENDA_OPTS, filtros['renda'])}</select>
+        <select name='imovel' class='form-select'>{_opcoes(IMOVEL_OPTS, filtros['imovel'])}</select>
+        <button class='btn-custom btn-primary'>Filtrar</button>
+      </form>
+      {aviso}
+      <table class='table table-hover'>
+        <thead><tr><th></th><th>ID</th><th>Nome</th><th>Telefone</th><th>Renda</th><th>Imóvel</th>
+        <th>PRICE</th><th>SAC ini</th><th>SAC fim</th><th>Faixa</th><th>Prazo</th><th>Data/Hora</th><th>Simulações</th></tr></thead>
+        <tbody>"""
+
+def admin_linhas(linhas):
+    return ''.join(f"""
         <tr>
+          <td><input type='checkbox' name='id' value='{r.id}' form='exclusao'></td>
           <td>{r.id}</td><td>{html.escape(str(r.nome))}</td><td>{html.escape(str(r.telefone))}</td><td>{html.escape(str(r.renda))}</td><td>{html.escape(str(r.valor_imovel))}</td>
           <td>R$ {fmt(r.parcela_price)}</td><td>R$ {fmt(r.parcela_sac_ini)}</td><td>R$ {fmt(r.parcela_sac_fim)}</td>
-          <td>{html.escape(str(r.faixa))}</td><td>{r.prazo}</td><td>{html.escape(str(r.criado_em))}</td>
-        </tr>"""
-    logo_url = url_for('static', filename='logo.jpg')
+          <td>{html.escape(str(r.faixa))}</td><td>{r.prazo}</td><td>{html.escape(str(r.criado_em))}</td><td>{r.simulacoes}</td>
+        </tr>""" for r in linhas)
+
+def admin_rodape(pagina, n, ultimo):
+    filtros, limite = pagina['filtros'], pagina['limite']
+    ativos = {k: v for k, v in filtros.items() if v}
+    links = ''.join(
+        f"<a href='{html.escape(url_for('admin_exportar', formato=f, faixa=filtros['faixa'] or None))}' "
+        f"class='btn-custom btn-secondary me-2'>Exportar {f.upper()}</a>" for f in ('csv', 'xlsx'))
+    links += f"<a href='{url_for('admin_capacidade')}' class='btn-custom btn-secondary me-2'>Elegibilidade</a>"
+    links += f"<a href='{url_for('admin_resumo')}' class='btn-custom btn-secondary me-2'>Painel</a>"
+    if n == limite:
+        links += (f"<a href='{html.escape(url_for('admin', antes=ultimo, limite=limite, **ativos))}' "
+                  "class='btn-custom btn-secondary'>Próxima página</a>")
+    # os checkboxes das linhas apontam para este form (atributo form=)
+    ocultos = ''.join(f"<input type='hidden' name='{k}' value='{html.escape(v)}'>" for k, v in ativos.items())
+    exclusao = f"""<form id='exclusao' method='post' action='{url_for('admin_excluir')}' class='d-inline'>
+        {ocultos}
+        <button name='acao' value='selecionados' class='btn-custom btn-secondary me-2'
+                onclick="return confirm('Excluir os leads selecionados?')">Excluir selecionados</button>"""
+    if ativos:
+        exclusao += """
+        <button name='acao' value='filtro' class='btn-custom btn-secondary me-2'
+                onclick="return confirm('Excluir TODOS os leads deste filtro?')">Excluir todos do filtro</button>"""
+    return f"""</tbody>
+      </table>
+      {links}
+      {exclusao}
+      </form>
+    </div>"""
+
+def _criado_em_iso():
+    # criado_em é gravado como 'dd/mm/aaaa HH:MM'; reordena para 'aaaa-mm-dd' para comparar datas
+    c = Cliente.criado_em
+    return (db.func.substr(c, 7, 4, type_=db.String) + '-' + db.func.substr(c, 4, 2, type_=db.String)
+            + '-' + db.func.substr(c, 1, 2, type_=db.String))
+
+# Exportação: CSV/XLSX em streaming a partir de um cursor do lado do servidor
+@app.route('/admin/exportar')
+def admin_exportar():
+    if 'admin' not in session:
+        return redirect(url_for('login'))
+    formato = request.args.get('formato', 'csv')
+    if formato not in ('csv', 'xlsx'):
+        return 'Formato inválido', 400
+
+    colunas = Cliente.__table__.columns
+    q = db.select(*colunas).order_by(Cliente.id)
+    if request.args.get('faixa'):
+        q = q.where(Cliente.faixa == request.args['faixa'])
+    for arg, op in (('de', '__ge__'), ('ate', '__le__')):
+        valor = request.args.get(arg)
+        if valor:
+            try:
+                datetime.strptime(valor, '%Y-%m-%d')
+            except ValueError:
+                return f'Data inválida em {arg} (use aaaa-mm-dd)', 400
+            q = q.where(getattr(_criado_em_iso(), op)(valor))
+    # stream_results usa cursor nomeado no Postgres; yield_per limita as linhas em memória
+    q = q.execution_options(stream_results=True, yield_per=2000)
+
+    @stream_with_context
+    def gerar():
+        linhas = db.session.execute(q)
+        nomes = [c.name for c in colunas]
+        if formato == 'xlsx':
+            yield from exportacao.gerar_xlsx(nomes, linhas, 'clientes')
+        else:
+            yield from exportacao.gerar_csv(nomes, linhas)
+
+    nome = f"clientes_{datetime.now().strftime('%Y%m%d_%H%M')}.{formato}"
+    mimetype = ('text/csv' if formato == 'csv'
+                else 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+    return Response(gerar(), mimetype=mimetype, headers={'Content-Disposition': f'attachment; filename={nome}'})
+
+# Elegibilidade de todos os leads: lidos em partições com cursor do servidor, convertidos
+# para arrays (teto numérico da renda e do imóvel, juros e prazo gravados) e recalculados
+# com lote.capacidade. Duas regras, lado a lado:
+# - elegivel_*: a do /simular — o sistema tem parcela cotada para a renda × imóvel do lead
+#   (o seed financia valor_liberado com a 1ª parcela em até 30% do teto da renda);
+# - cabe_*: a do motor — o imóvel máximo (30% da renda, até COTA_FINANCIAMENTO financiado)
+#   cobre o teto do imóvel pedido. Mais estrita: exige financiar 80% do teto do imóvel, e os
+#   encargos do motor não são os do seed (ver "Parcelas cotadas: seed × motor")
+ELEGIBILIDADE_PARTICAO = 20000
+CAMPOS_ELEGIBILIDADE = ('id', 'renda', 'valor_imovel', 'juros', 'prazo', 'valor_financiado', 'imovel_max_sac',
+                        'imovel_max_price', 'elegivel_sac', 'elegivel_price', 'cabe_sac', 'cabe_price')
+
+def _elegibilidade():
+    # gera um dict de arrays por partição
+    i_renda = {r: i for i, r in enumerate(RENDA_OPTS)}
+    i_imovel = {v: i for i, v in enumerate(IMOVEL_OPTS)}
+    q = (db.select(Cliente.id, Cliente.renda, Cliente.valor_imovel, Cliente.juros, Cliente.prazo,
+                   Cliente.valor_financiado, Cliente.parcela_sac_ini, Cliente.parcela_price)
+         .order_by(Cliente.id).execution_options(stream_results=True, yield_per=ELEGIBILIDADE_PARTICAO))
+    for parte in db.session.execute(q).partitions():
+        ids, rendas, imoveis, juros, prazos, financiados, sacs, prices = zip(*parte)
+        ir = np.array([i_renda.get(r, -1) for r in rendas])
+        ii = np.array([i_imovel.get(v, -1) for v in imoveis])
+        ok = (ir >= 0) & (ii >= 0)
+        if not ok.any():
+            continue
+        ir, ii = ir[ok], ii[ok]
+        renda = np.take(RENDA_TETO, ir).astype(float)
+        j = np.array([j if j is not None else np.nan for j in juros], dtype=float)[ok]
+        sem_juros = ~(j > 0)
+        j[sem_juros] = _juros_da_renda(renda)[sem_juros]
+        p = np.array([p or PRAZO for p in prazos], dtype=float)[ok]
+        cap = lote.capacidade(renda, j, p, TAXA_ADM, TAXA_SEGURO)
+        imovel = np.take(IMOVEL_TETO, ii).astype(float)
+        financiado = np.array([v or 0.0 for v in financiados], dtype=float)[ok]
+        cotado_sac = np.array([v or 0.0 for v in sacs], dtype=float)[ok] > 0
+        cotado_price = np.array([v or 0.0 for v in prices], dtype=float)[ok] > 0
+        yield {'id': np.array(ids)[ok], 'i_renda': ir, 'i_imovel': ii, 'renda': renda, 'valor_imovel': imovel,
+               'juros': j, 'prazo': p, 'valor_financiado': financiado,
+               'imovel_max_sac': cap['imovel_sac'], 'imovel_max_price': cap['imovel_price'],
+               'elegivel_sac': (financiado > 0) & cotado_sac, 'elegivel_price': (financiado > 0) & cotado_price,
+               'cabe_sac': cap['imovel_sac'] >= imovel, 'cabe_price': cap['imovel_price'] >= imovel}
+
+@app.route('/admin/capacidade')
+def admin_capacidade():
+    if 'admin' not in session:
+        return redirect(url_for('login'))
+
+    if request.args.get('formato') == 'csv':
+        @stream_with_context
+        def gerar():
+            def linhas():
+                for b in _elegibilidade():
+                    yield from zip(b['id'].tolist(), b['renda'].tolist(), b['valor_imovel'].tolist(),
+                                   np.round(b['juros'], 4).tolist(), b['prazo'].astype(int).tolist(),
+                                   np.round(b['valor_financiado'], 2).tolist(),
+                                   np.round(b['imovel_max_sac'], 2).tolist(), np.round(b['imovel_max_price'], 2).tolist(),
+                                   b['elegivel_sac'].astype(int).tolist(), b['elegivel_price'].astype(int).tolist(),
+                                   b['cabe_sac'].astype(int).tolist(), b['cabe_price'].astype(int).tolist())
+            yield from exportacao.gerar_csv(CAMPOS_ELEGIBILIDADE, linhas())
+        nome = f"elegibilidade_{datetime.now().strftime('%Y%m%d_%H%M')}.csv"
+        return Response(gerar(), mimetype='text/csv', headers={'Content-Disposition': f'attachment; filename={nome}'})
+
+    # leads e, por sistema, elegíveis (regra do /simular) e que cabem pelo motor, por renda × imóvel
+    inicio = time.perf_counter()
+    forma = (len(RENDA_OPTS), len(IMOVEL_OPTS))
+    colunas = ('elegivel_sac', 'elegivel_price', 'cabe_sac', 'cabe_price')
+    leads = np.zeros(forma, int)
+    contas = {k: np.zeros(forma, int) for k in colunas}
+    for b in _elegibilidade():
+        celula = (b['i_renda'], b['i_imovel'])
+        np.add.at(leads, celula, 1)
+        for k in colunas:
+            np.add.at(contas[k], celula, b[k])
+    dt = time.perf_counter() - inicio
+
+    def pct(a, n):
+        return f'{a} ({100 * a / n:.0f}%)' if n else '-'
+    trs = ''.join(f"<tr><td>{html.escape(RENDA_OPTS[i])}</td><td>{html.escape(IMOVEL_OPTS[k])}</td><td>{leads[i, k]}</td>"
+                  + ''.join(f"<td>{pct(contas[c][i, k], leads[i, k])}</td>" for c in colunas) + "</tr>"
+                  for i in range(forma[0]) for k in range(forma[1]) if leads[i, k])
+    total = leads.sum()
+    sac, price = contas['elegivel_sac'], contas['elegivel_price']
     return STYLE + f"""
-    <img src='{logo_url}' class='logo'>
+    <img src='{LOGO_URL}' class='logo'>
     <div class='box'>
-      <h3>Área Administrativa</h3>
+      <h3>Elegibilidade dos leads</h3>
+      <p>{total} leads recalculados em {dt * 1000:.0f} ms. Elegíveis (parcela cotada pelo /simular):
+      SAC {pct(sac.sum(), total)}, PRICE {pct(price.sum(), total)}.</p>
+      <p>"Cabe pelo motor" é mais estrito: 1ª parcela em até {lote.COMPROMETIMENTO_RENDA:.0%} do teto da renda
+      financiando {lote.COTA_FINANCIAMENTO:.0%} do teto do imóvel, com os encargos padrão; o /simular cota o
+      valor liberado do seed, que pode ser menor.</p>
       <table class='table table-hover'>
-        <thead><tr><th>ID</th><th>Nome</th><th>Telefone</th><th>Renda</th><th>Imóvel</th>
-        <th>PRICE</th><th>SAC ini</th><th>SAC fim</th><th>Faixa</th><th>Prazo</th><th>Data/Hora</th></tr></thead>
+        <thead><tr><th>Renda</th><th>Imóvel</th><th>Leads</th><th>Elegíveis SAC</th><th>Elegíveis PRICE</th>
+          <th>Cabem SAC (motor)</th><th>Cabem PRICE (motor)</th></tr></thead>
         <tbody>{trs}</tbody>
       </table>
+      <a href='{url_for('admin_capacidade', formato='csv')}' class='btn-custom btn-secondary me-2'>Exportar CSV</a>
+      <a href='{url_for('admin')}' class='btn-custom btn-secondary'>Voltar</a>
     </div>"""
 
+# Painel: leads e valor médio financiado por dia, faixa, renda e imóvel, lidos só da tabela
+# de resumo (um GROUP BY sobre os baldes do período, nunca sobre cliente)
+RESUMO_DIAS = 30
+
+@app.route('/admin/resumo')
+def admin_resumo():
+    if 'admin' not in session:
+        return redirect(url_for('login'))
+    hoje = datetime.now().date()
+    desde = request.args.get('desde', (hoje - timedelta(days=RESUMO_DIAS - 1)).isoformat())
+    ate = request.args.get('ate', hoje.isoformat())
+    try:
+        for d in (desde, ate):
+            if d:
+                datetime.strptime(d, '%Y-%m-%d')
+    except ValueError:
+        return 'Datas no formato aaaa-mm-dd', 400
+
+    r = ClienteResumo
+    periodo = [r.dia >= desde] if desde else []
+    if ate:
+        periodo.append(r.dia <= ate)
+    inicio = time.perf_counter()
+    grupos = {nome: db.session.execute(
+                  db.select(col, db.func.sum(r.leads), db.func.sum(r.soma_financiado_centavos))
+                  .where(*periodo).group_by(col).order_by(col)).all()
+              for nome, col in (('Dia', r.dia), ('Faixa', r.faixa), ('Renda', r.renda), ('Imóvel', r.valor_imovel))}
+    dt = time.perf_counter() - inicio
+
+    def media(leads, soma):
+        return f'R$ {fmt(soma / leads / 100)}' if leads else '-'
+    leads = sum(n for _, n, _ in grupos['Faixa'])
+    soma = sum(s for _, _, s in grupos['Faixa'])
+    tabelas = ''.join(f"""
+      <h5 class='mt-3'>Por {nome.lower()}</h5>
+      <table class='table table-hover'>
+        <thead><tr><th>{nome}</th><th>Leads</th><th>Valor financiado médio</th></tr></thead>
+        <tbody>{''.join(f"<tr><td>{html.escape(k or '-')}</td><td>{n}</td><td>{media(n, s)}</td></tr>" for k, n, s in linhas)}</tbody>
+      </table>""" for nome, linhas in grupos.items())
+    return STYLE + f"""
+    <img src='{LOGO_URL}' class='logo'>
+    <div class='box'>
+      <h3>Painel de leads</h3>
+      <form method='get' class='d-flex gap-2 mb-2'>
+        <input type='date' name='desde' value='{html.escape(desde)}' class='form-control'>
+        <input type='date' name='ate' value='{html.escape(ate)}' class='form-control'>
+        <button class='btn-custom btn-primary'>Filtrar</button>
+      </form>
+      <p>{leads} leads, valor financiado médio {media(leads, soma)} ({dt * 1000:.1f} ms).</p>
+      {tabelas}
+      <a href='{url_for('admin')}' class='btn-custom btn-secondary'>Voltar</a>
+    </div>"""
+
+@app.route('/admin/cache')
+def admin_cache():
+    if 'admin' not in session:
+        return redirect(url_for('login'))
+    # estatísticas do worker que atendeu (o /metrics soma os workers)
+    return {'resultado': RESULTADOS.estatisticas()}
+
+@app.route('/admin/seed')
+def admin_seed():
+    if 'admin' not in session:
+        return redirect(url_for('login'))
+    linhas = conferencia_seed()
+    return {'encargos': {'taxa_adm': TAXA_ADM, 'taxa_seguro': TAXA_SEGURO}, 'prazo': PRAZO,
+            'centavos': AMORTIZACAO_CENTAVOS, 'tolerancia': amortizacao.TOLERANCIA_SEED,
+            'motor': sum(r['fonte'] == 'motor' for r in linhas), 'seed': sum(r['fonte'] == 'seed' for r in linhas),
+            'combinacoes': linhas}
+
 @app.route('/logout')
 def logout():
     session.pop('admin', None)
@@ -344,12 +1014,71 @@ def logout():
 @app.route('/excluir/<int:id>')
 def excluir(id):
     if 'admin' in session:
-        c = Cliente.query.get(id)
-        if c:
-            db.session.delete(c)
-            db.session.commit()
+        excluir_clientes(db.select(Cliente.id, *(Cliente.__table__.c[k] for k in resumo.CAMPOS))
+                         .where(Cliente.id == id))
     return redirect(url_for('admin'))
 
+# Exclusão em lote: `consulta` seleciona (ao menos) id e resumo.CAMPOS dos clientes a apagar,
+# sem ORDER BY; `chave` é a coluna que vale o id e percorre a consulta (Cliente.id ou a da
+# busca.filtrar). Cada lote de EXCLUSAO_LOTE linhas é uma transação (resumo, busca, histórico
+# de simulações e DELETE juntos), então apagar milhares de leads não segura a trava de escrita nem cresce uma
+# transação enorme; o lote seguinte continua do último id (não relê as linhas que o filtro
+# já descartou). `antes_de_apagar(linhas)` roda dentro da transação do lote (ex.: o
+# arquivo.py grava o arquivo morto); se levantar, o lote é desfeito.
+EXCLUSAO_LOTE = int(os.getenv('EXCLUSAO_LOTE', '1000'))
+
+def excluir_clientes(consulta, antes_de_apagar=None, lote=None, chave=Cliente.id):
+    total, lotes, ultimo = 0, 0, None
+    consulta = consulta.order_by(chave).limit(lote or EXCLUSAO_LOTE)
+    while True:
+        linhas = db.session.execute(consulta if ultimo is None else consulta.where(chave > ultimo)).all()
+        if not linhas:
+            break
+        ids = [r.id for r in linhas]
+        try:
+            if antes_de_apagar is not None:
+                antes_de_apagar(linhas)
+            atualizar_resumo([r._mapping for r in linhas], -1)
+            db.session.execute(db.delete(ClienteSimulacao).where(ClienteSimulacao.cliente_id.in_(ids)))
+            db.session.execute(db.delete(ClienteAlias).where(ClienteAlias.cliente_id.in_(ids)))
+            db.session.execute(db.delete(Cliente).where(Cliente.id.in_(ids)))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        RESULTADOS.invalidar(*ids)
+        total, lotes, ultimo = total + len(ids), lotes + 1, ids[-1]
+    return total, lotes
+
+@app.route('/admin/excluir', methods=['POST'])
+def admin_excluir():
+    if 'admin' not in session:
+        return redirect(url_for('login'))
+    campos = [Cliente.id, *(Cliente.__table__.c[k] for k in resumo.CAMPOS)]
+    if request.form.get('acao') == 'filtro':
+        # todos os leads do filtro atual do /admin; sem filtro nenhum seria a tabela inteira
+        filtros = {k: request.form.get(k, '') for k in ('q', 'faixa', 'renda', 'imovel')}
+        if not any(v.strip() for v in filtros.values()):
+            return 'Escolha ao menos um filtro para excluir em lote', 400
+        consulta, chave = filtrar_clientes(db.select(*campos), filtros)
+    else:
+        try:
+            ids = sorted({int(i) for i in request.form.getlist('id')})
+        except ValueError:
+            return 'Ids inválidos', 400
+        filtros, chave = {}, Cliente.id
+        consulta = db.select(*campos).where(Cliente.id.in_(ids))
+    inicio = time.perf_counter()
+    total, lotes = excluir_clientes(consulta, chave=chave)
+    logging.info('Exclusão em lote: %d leads em %d lotes (%.0f ms)', total, lotes, (time.perf_counter() - inicio) * 1000)
+    return STYLE + f"""
+    <img src='{LOGO_URL}' class='logo'>
+    <div class='box'>
+      <h3>Exclusão em lote</h3>
+      <p>{total} leads excluídos em {lotes} lote(s) de até {EXCLUSAO_LOTE}, em {(time.perf_counter() - inicio) * 1000:.0f} ms.</p>
+      <a href='{html.escape(url_for('admin', **{k: v for k, v in filtros.items() if v}))}' class='btn-custom btn-secondary'>Voltar</a>
+    </div>"""
+
 def get_dados():
     sims = Simulacao.query.all()
     return [(s.id, s.renda, s.imovel, s.juros, s.entrada, s.subsidio, s.valor_liberado) for s in sims]
@@ -0,0 +1,138 @@
+# metricas.py
+# Métricas Prometheus em /metrics, somadas entre os workers do gunicorn.
+#
+# Usa o modo multiprocesso do prometheus_client: cada worker grava os seus contadores e
+# histogramas em arquivos mmap no diretório PROMETHEUS_MULTIPROC_DIR, e quem atende o
+# /metrics soma os arquivos de todos. O diretório é limpo pelo gunicorn.conf.py ao subir o
+# master, e os arquivos de um worker que morreu são marcados no hook child_exit.
+# Este módulo precisa ser importado antes de qualquer outro import de prometheus_client,
+# pois o diretório é lido na importação.
+#
+# - simulador_http_requisicoes_total / simulador_http_latencia_segundos, por rota e método
+#   (a rota é a regra do Flask, ex. /resultado/<int:id>; em respostas em streaming a
+#   latência vai até o fim do envio)
+# - simulador_db_consultas_por_requisicao / simulador_db_tempo_por_requisicao_segundos
+#   (eventos do SQLAlchemy)
+# - simulador_smtp_envio_segundos / simulador_smtp_falhas_total (envios do outbox) e
+#   simulador_emails_enfileirados_total
+# - simulador_clientes: tamanho da tabela cliente, consultado a cada coleta
+# - simulador_worker_boot_segundos: do fork até o worker estar pronto (gunicorn.conf.py)
+# - simulador_cache_resultado_total: acertos e faltas do cache de páginas do /resultado
+# - simulador_simulacoes_total: simulações gravadas, de lead novo ou repetido (mesmo telefone)
+import os
+import shutil
+import tempfile
+import time
+
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'simulador_metricas'))
+DIRETORIO = os.environ['PROMETHEUS_MULTIPROC_DIR']
+os.makedirs(DIRETORIO, exist_ok=True)
+
+from flask import Response, g, has_request_context, request  # noqa: E402
+from prometheus_client import (CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram,  # noqa: E402
+                               generate_latest, multiprocess)
+from prometheus_client.core import GaugeMetricFamily  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+REQUISICOES = Counter('simulador_http_requisicoes_total', 'Requisições HTTP', ['rota', 'metodo', 'status'])
+LATENCIA = Histogram('simulador_http_latencia_segundos', 'Latência das requisições HTTP', ['rota', 'metodo'],
+                     buckets=(.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30))
+DB_CONSULTAS = Histogram('simulador_db_consultas_por_requisicao', 'Consultas SQL por requisição', ['rota'],
+                         buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 1000))
+DB_TEMPO = Histogram('simulador_db_tempo_por_requisicao_segundos', 'Tempo em SQL por requisição', ['rota'],
+                     buckets=(.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 5))
+SMTP_ENVIO = Histogram('simulador_smtp_envio_segundos', 'Duração dos envios SMTP do outbox',
+                       buckets=(.05, .1, .25, .5, 1, 2.5, 5, 10, 30))
+SMTP_FALHAS = Counter('simulador_smtp_falhas_total', 'Envios SMTP que falharam')
+EMAILS_ENFILEIRADOS = Counter('simulador_emails_enfileirados_total', 'E-mails gravados na outbox')
+CACHE_RESULTADO = Counter('simulador_cache_resultado_total', 'Consultas ao cache de páginas do /resultado',
+                          ['resultado'])
+SIMULACOES = Counter('simulador_simulacoes_total', 'Simulações gravadas no /simular', ['lead'])
+BOOT_WORKER = Histogram('simulador_worker_boot_segundos', 'Do fork até o worker estar pronto',
+                        buckets=(.001, .005, .01, .05, .1, .25, .5, 1, 2.5, 5, 10))
+
+
+def limpar_diretorio():
+    # só no master, antes de qualquer worker (e do próprio app) gravar métricas
+    shutil.rmtree(DIRETORIO, ignore_errors=True)
+    os.makedirs(DIRETORIO, exist_ok=True)
+
+
+def processo_encerrado(pid):
+    multiprocess.mark_process_dead(pid, DIRETORIO)
+
+
+def observar_smtp(segundos, ok):
+    SMTP_ENVIO.observe(segundos)
+    if not ok:
+        SMTP_FALHAS.inc()
+
+
+def observar_cache_resultado(acerto):
+    CACHE_RESULTADO.labels('hit' if acerto else 'miss').inc()
+
+
+def observar_simulacao(lead_novo):
+    SIMULACOES.labels('novo' if lead_novo else 'repetido').inc()
+
+
+class _ColetorClientes:
+    def __init__(self, contar):
+        self.contar = contar
+
+    def collect(self):
+        g = GaugeMetricFamily('simulador_clientes', 'Linhas na tabela cliente')
+        g.add_metric([], self.contar())
+        yield g
+
+
+def _rota():
+    return request.url_rule.rule if request.url_rule is not None else 'sem_rota'
+
+
+def instrumentar(app, db, contar_clientes):
+    @app.before_request
+    def _inicio():
+        # [início, consultas, segundos em SQL]
+        g.metricas = [time.perf_counter(), 0, 0.0]
+
+    @app.after_request
+    def _fim(response):
+        m = g.get('metricas')
+        if m is None:
+            return response
+        rota, metodo, status = _rota(), request.method, str(response.status_code)
+
+        def observar():
+            LATENCIA.labels(rota, metodo).observe(time.perf_counter() - m[0])
+            REQUISICOES.labels(rota, metodo, status).inc()
+            DB_CONSULTAS.labels(rota).observe(m[1])
+            DB_TEMPO.labels(rota).observe(m[2])
+        # em respostas em streaming o trabalho continua depois daqui; mede até o fim do envio
+        response.call_on_close(observar)
+        return response
+
+    with app.app_context():
+        engine = db.engine
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _antes(conn, cursor, statement, parameters, context, executemany):
+        conn.info['metricas_t0'] = time.perf_counter()
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _depois(conn, cursor, statement, parameters, context, executemany):
+        if has_request_context():
+            m = g.get('metricas')
+            if m is not None:
+                m[1] += 1
+                m[2] += time.perf_counter() - conn.info['metricas_t0']
+
+    @app.route('/metrics')
+    def metrics():
+        token = os.getenv('METRICS_TOKEN')
+        if token and request.headers.get('Authorization') != f'Bearer {token}':
+            return 'Não autorizado', 401
+        registro = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registro, DIRETORIO)
+        registro.register(_ColetorClientes(contar_clientes))
+        return Response(generate_latest(registro), mimetype=CONTENT_TYPE_LATEST)
@@ -1,83 +1,250 @@
+import argparse
+import io
 import os
 import sqlite3
+import time
+from urllib.parse import quote
+
 import psycopg2
-from psycopg2.extras import execute_values
+from psycopg2 import sql
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateIndex, CreateTable
 
-def migrate_sqlite_to_postgres(sqlite_path, postgres_url):
-    # conecta no SQLite local
-    sqlite_conn = sqlite3.connect(sqlite_path)
-    sqlite_cur = sqlite_conn.cursor()
+import modelos
+import resumo
 
-    # conecta no Postgres remoto (ou local, se docker-compose)
-    pg_conn = psycopg2.connect(postgres_url)
+# Migração SQLite -> Postgres em streaming e retomável.
+#
+# - o schema vem dos models do modelos.py (Simulacao, Cliente, ...), não de um DDL à parte;
+#   o app não é importado, então nada roda na origem
+# - a origem é aberta só para leitura (mode=ro): a migração nunca escreve nela. Colunas que
+#   a origem ainda não tem ficam com o default no destino, e a inicialização do app no
+#   Postgres completa o que faltar (ex.: leads.migrar)
+# - cada tabela é lida em ordem de id, em blocos, e gravada com COPY FROM STDIN
+# - depois de cada bloco o checkpoint (último id copiado) é gravado na mesma transação do
+#   COPY, então uma migração interrompida continua de onde parou sem duplicar linhas
+# - tabelas sem id (seed_versao) são pequenas e vão inteiras, num COPY só, com o checkpoint
+#   na mesma transação: numa nova execução são puladas
+# - cliente_resumo não é copiada: é recalculada no destino a partir de cliente (resumo.py)
+# - no fim as sequences dos ids são ajustadas para o maior id migrado
+# - antes de mexer no destino confere as tabelas com id que vão começar do zero (sem
+#   checkpoint, ou todas com --reiniciar): se alguma já tem linhas, só segue com --truncar;
+#   sem ele a migração para sem apagar checkpoint nenhum
+
+CHECKPOINT = 'migracao_checkpoint'
+DERIVADAS = {'cliente_resumo'}
+
+
+def abrir_origem(sqlite_path):
+    # só leitura; falha se o arquivo não existir (em vez de criar um banco vazio)
+    if not os.path.exists(sqlite_path):
+        raise SystemExit(f'{sqlite_path}: arquivo não encontrado')
+    return sqlite3.connect(f'file:{quote(os.path.abspath(sqlite_path))}?mode=ro', uri=True)
+
+
+def _campo(v):
+    # formato texto do COPY: \N é nulo; barra, tab e quebras de linha são escapados
+    if v is None:
+        return '\\N'
+    if isinstance(v, float):
+        return repr(v)
+    return str(v).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+def _criar_schema(pg_cur, metadata):
+    dialeto = postgresql.dialect()
+    for tabela in metadata.sorted_tables:
+        pg_cur.execute('SELECT to_regclass(%s)', (tabela.name,))
+        if pg_cur.fetchone()[0] is None:
+            pg_cur.execute(str(CreateTable(tabela).compile(dialect=dialeto)))
+            for indice in tabela.indexes:
+                pg_cur.execute(str(CreateIndex(indice).compile(dialect=dialeto)))
+    pg_cur.execute(f"""CREATE TABLE IF NOT EXISTS {CHECKPOINT} (
+        tabela TEXT PRIMARY KEY, ultimo_id BIGINT NOT NULL, linhas BIGINT NOT NULL,
+        atualizado_em TIMESTAMP NOT NULL DEFAULT now())""")
+
+
+def _conferir_destino(sqlite_conn, pg_cur, metadata, reiniciar):
+    # tabelas com id que vão começar do zero mas já têm linhas no destino
+    pg_cur.execute(f'SELECT tabela FROM {CHECKPOINT}')
+    com_checkpoint = set() if reiniciar else {r[0] for r in pg_cur.fetchall()}
+    ocupadas = []
+    for tabela in metadata.sorted_tables:
+        if tabela.name in DERIVADAS or tabela.name in com_checkpoint or 'id' not in tabela.columns:
+            continue
+        if not sqlite_conn.execute(f'PRAGMA table_info("{tabela.name}")').fetchall():
+            continue
+        pg_cur.execute(sql.SQL('SELECT EXISTS (SELECT 1 FROM {})').format(sql.Identifier(tabela.name)))
+        if pg_cur.fetchone()[0]:
+            ocupadas.append(tabela.name)
+    return ocupadas
+
+
+def _migrar_tabela(sqlite_conn, pg_conn, tabela, lote, truncar):
     pg_cur = pg_conn.cursor()
+    origem = {r[1] for r in sqlite_conn.execute(f'PRAGMA table_info("{tabela.name}")')}
+    if not origem:
+        print(f'{tabela.name}: ausente no SQLite, ignorada')
+        return 0, 0.0
+    # só as colunas que existem nos dois lados; as novas ficam com o default do destino
+    colunas = [c.name for c in tabela.columns if c.name in origem]
+
+    pg_cur.execute(f'SELECT ultimo_id, linhas FROM {CHECKPOINT} WHERE tabela = %s', (tabela.name,))
+    ck = pg_cur.fetchone()
+    if 'id' not in colunas:
+        if ck is not None:
+            print(f'{tabela.name}: já copiada ({ck[1]} linhas)')
+            return 0, 0.0
+        return _copiar_inteira(sqlite_conn, pg_conn, tabela, colunas)
+    if ck is None:
+        pg_cur.execute(sql.SQL('SELECT EXISTS (SELECT 1 FROM {})').format(sql.Identifier(tabela.name)))
+        if pg_cur.fetchone()[0]:
+            if not truncar:
+                raise SystemExit(f'{tabela.name}: destino já tem linhas e não há checkpoint; '
+                                 'use --truncar para apagar e migrar do zero')
+            pg_cur.execute(sql.SQL('TRUNCATE {} CASCADE').format(sql.Identifier(tabela.name)))
+            # o CASCADE também esvaziou as tabelas que apontam para esta: elas recomeçam do zero
+            pg_cur.execute(f'DELETE FROM {CHECKPOINT} WHERE tabela = ANY(%s)', (_dependentes(tabela),))
+        ultimo_id, total = 0, 0
+    else:
+        ultimo_id, total = ck
+        print(f'{tabela.name}: retomando após id {ultimo_id} ({total} linhas já copiadas)')
+
+    i_id = colunas.index('id')
+    cur = sqlite_conn.execute(
+        'SELECT {} FROM "{}" WHERE id > ? ORDER BY id'.format(', '.join(f'"{c}"' for c in colunas), tabela.name),
+        (ultimo_id,))
 
-    # cria tabelas no Postgres, se não existirem
-    pg_cur.execute("""
-    CREATE TABLE IF NOT EXISTS cliente (
-        id SERIAL PRIMARY KEY,
-        nome TEXT NOT NULL,
-        renda REAL NOT NULL,
-        contato TEXT NOT NULL
-    );
-    """)
-    pg_cur.execute("""
-    CREATE TABLE IF NOT EXISTS simulacao (
-        id SERIAL PRIMARY KEY,
-        cliente_id INTEGER REFERENCES cliente(id),
-        valor_imovel REAL NOT NULL,
-        prazo INTEGER NOT NULL,
-        juros REAL NOT NULL,
-        valor_parcela REAL NOT NULL,
-        tipo_amortizacao TEXT NOT NULL,
-        enquadramento TEXT,
-        primeira_parcela REAL,
-        ultima_parcela REAL,
-        subsídio REAL,
-        entrada REAL,
-        fgts_utilizado REAL
-    );
-    """)
-
-    # migra clientes
-    sqlite_cur.execute("SELECT id, nome, renda, contato FROM cliente")
-    clientes = sqlite_cur.fetchall()
-    if clientes:
-        execute_values(pg_cur,
-            "INSERT INTO cliente (id, nome, renda, contato) VALUES %s ON CONFLICT (id) DO NOTHING",
-            clientes
-        )
-
-    # migra simulações
-    sqlite_cur.execute("""
-        SELECT id, cliente_id, valor_imovel, prazo, juros, valor_parcela,
-               tipo_amortizacao, enquadramento, primeira_parcela,
-               ultima_parcela, subsídio, entrada, fgts_utilizado
-        FROM simulacao
-    """)
-    simulacoes = sqlite_cur.fetchall()
-    if simulacoes:
-        execute_values(pg_cur, """
-            INSERT INTO simulacao (
-                id, cliente_id, valor_imovel, prazo, juros, valor_parcela,
-                tipo_amortizacao, enquadramento, primeira_parcela,
-                ultima_parcela, subsídio, entrada, fgts_utilizado
-            )
-            VALUES %s
-            ON CONFLICT (id) DO NOTHING
-        """, simulacoes)
-
-    # confirma e fecha
+    inicio, copiadas = time.perf_counter(), 0
+    while True:
+        linhas = cur.fetchmany(lote)
+        if not linhas:
+            break
+        buf = io.StringIO()
+        buf.writelines('\t'.join(_campo(v) for v in linha) + '\n' for linha in linhas)
+        buf.seek(0)
+        pg_cur.copy_expert(_copy(pg_conn, tabela, colunas), buf)
+        ultimo_id = linhas[-1][i_id]
+        total += len(linhas)
+        copiadas += len(linhas)
+        _checkpoint(pg_cur, tabela, ultimo_id, total)
+        pg_conn.commit()
+        dt = time.perf_counter() - inicio
+        print(f'  {tabela.name}: {total} linhas (id {ultimo_id}) — {copiadas / dt:,.0f} linhas/s', flush=True)
     pg_conn.commit()
-    sqlite_conn.close()
-    pg_conn.close()
-    print("Migração concluída com sucesso!")
+    return copiadas, time.perf_counter() - inicio
+
+
+def _dependentes(tabela):
+    # tabelas com chave estrangeira (direta ou indireta) para `tabela`
+    nomes, novas = set(), {tabela.name}
+    while novas:
+        novas = {t.name for t in tabela.metadata.sorted_tables
+                 if t.name not in nomes and any(fk.column.table.name in novas for fk in t.foreign_keys)}
+        nomes |= novas
+    return sorted(nomes)
+
+
+def _copy(pg_conn, tabela, colunas):
+    return sql.SQL('COPY {} ({}) FROM STDIN').format(
+        sql.Identifier(tabela.name), sql.SQL(', ').join(map(sql.Identifier, colunas))).as_string(pg_conn)
+
+
+def _checkpoint(pg_cur, tabela, ultimo_id, linhas):
+    pg_cur.execute(f"""INSERT INTO {CHECKPOINT} (tabela, ultimo_id, linhas) VALUES (%s, %s, %s)
+                       ON CONFLICT (tabela) DO UPDATE SET ultimo_id = EXCLUDED.ultimo_id,
+                       linhas = EXCLUDED.linhas, atualizado_em = now()""",
+                   (tabela.name, ultimo_id, linhas))
+
+
+def _copiar_inteira(sqlite_conn, pg_conn, tabela, colunas):
+    # sem id não há como retomar no meio: apaga o destino e copia tudo numa transação, junto
+    # com o checkpoint (a próxima execução pula a tabela)
+    pg_cur = pg_conn.cursor()
+    inicio = time.perf_counter()
+    pg_cur.execute(sql.SQL('DELETE FROM {}').format(sql.Identifier(tabela.name)))
+    buf = io.StringIO()
+    n = 0
+    for linha in sqlite_conn.execute('SELECT {} FROM "{}"'.format(', '.join(f'"{c}"' for c in colunas), tabela.name)):
+        buf.write('\t'.join(_campo(v) for v in linha) + '\n')
+        n += 1
+    buf.seek(0)
+    pg_cur.copy_expert(_copy(pg_conn, tabela, colunas), buf)
+    _checkpoint(pg_cur, tabela, 0, n)
+    pg_conn.commit()
+    return n, time.perf_counter() - inicio
+
+
+def _reconstruir_resumo(pg_conn):
+    inicio = time.perf_counter()
+    with pg_conn.cursor() as pg_cur:
+        for stmt in resumo.reconstrucao(modelos.ClienteResumo.__table__, modelos.Cliente.__table__):
+            pg_cur.execute(str(stmt.compile(dialect=postgresql.dialect(), compile_kwargs={'literal_binds': True})))
+        pg_cur.execute('SELECT count(*) FROM cliente_resumo')
+        n = pg_cur.fetchone()[0]
+    pg_conn.commit()
+    print(f'cliente_resumo: {n} baldes recalculados em {time.perf_counter() - inicio:.2f}s')
+
+
+def _ajustar_sequences(pg_conn, metadata):
+    pg_cur = pg_conn.cursor()
+    for tabela in metadata.sorted_tables:
+        if 'id' not in tabela.columns:
+            continue
+        pg_cur.execute('SELECT pg_get_serial_sequence(%s, %s)', (tabela.name, 'id'))
+        seq = pg_cur.fetchone()[0]
+        if seq:
+            pg_cur.execute(sql.SQL('SELECT setval(%s, COALESCE(MAX(id), 1), MAX(id) IS NOT NULL) FROM {}')
+                           .format(sql.Identifier(tabela.name)), (seq,))
+    pg_conn.commit()
+
+
+def migrate_sqlite_to_postgres(sqlite_path, postgres_url, lote=10000, truncar=False, reiniciar=False):
+    metadata = modelos.db.metadata
+    sqlite_conn = abrir_origem(sqlite_path)
+    pg_conn = psycopg2.connect(postgres_url)
+    pg_conn.set_client_encoding('UTF8')
+    try:
+        with pg_conn.cursor() as pg_cur:
+            _criar_schema(pg_cur, metadata)
+            ocupadas = _conferir_destino(sqlite_conn, pg_cur, metadata, reiniciar)
+            if ocupadas and not truncar:
+                pg_conn.commit()
+                motivo = '--reiniciar descarta os checkpoints, mas' if reiniciar else 'sem checkpoint,'
+                raise SystemExit(f'{motivo} o destino já tem linhas em {", ".join(ocupadas)}; use --truncar '
+                                 'para apagá-las e migrar do zero (nada foi alterado)')
+            if reiniciar:
+                pg_cur.execute(f'DELETE FROM {CHECKPOINT}')
+        pg_conn.commit()
+
+        inicio, total = time.perf_counter(), 0
+        for tabela in metadata.sorted_tables:
+            if tabela.name in DERIVADAS:
+                continue
+            n, dt = _migrar_tabela(sqlite_conn, pg_conn, tabela, lote, truncar)
+            total += n
+            if n:
+                print(f'{tabela.name}: {n} linhas em {dt:.2f}s ({n / dt:,.0f} linhas/s)')
+        _reconstruir_resumo(pg_conn)
+        _ajustar_sequences(pg_conn, metadata)
+        dt = time.perf_counter() - inicio
+        print(f'Migração concluída: {total} linhas em {dt:.2f}s ({total / dt if dt else 0:,.0f} linhas/s)')
+    finally:
+        sqlite_conn.close()
+        pg_conn.close()
+
 
 if __name__ == "__main__":
-    sqlite_path = os.getenv("OLD_SQLITE_DB", "simulador.db")
-    postgres_url = os.getenv("DATABASE_URL")
+    p = argparse.ArgumentParser(description='Migra o simulador.db (SQLite) para o Postgres do DATABASE_URL')
+    p.add_argument('--sqlite', default=os.getenv('OLD_SQLITE_DB', 'simulador.db'))
+    p.add_argument('--postgres', default=os.getenv('DATABASE_URL'))
+    p.add_argument('--lote', type=int, default=10000, help='linhas por COPY/checkpoint')
+    p.add_argument('--truncar', action='store_true', help='apaga tabelas de destino que já tenham dados sem checkpoint')
+    p.add_argument('--reiniciar', action='store_true',
+                   help='descarta checkpoints e migra do zero (com destino já preenchido, junto com --truncar)')
+    args = p.parse_args()
 
-    if not postgres_url:
+    if not args.postgres:
         raise ValueError("Defina a variável de ambiente DATABASE_URL apontando para seu Postgres")
 
-    migrate_sqlite_to_postgres(sqlite_path, postgres_url)
+    migrate_sqlite_to_postgres(args.sqlite, args.postgres, args.lote, args.truncar, args.reiniciar)
@@ -0,0 +1,130 @@
+# modelos.py
+# Tabelas do banco (models do Flask-SQLAlchemy), sem app e sem conexão: importar este módulo
+# não abre banco nem inicializa nada. O main.py liga o `db` ao app (db.init_app); o
+# migrate_sqlite_to_postgres.py usa só o metadata para criar o schema no destino.
+from flask_sqlalchemy import SQLAlchemy
+
+import outbox
+
+db = SQLAlchemy()
+
+class Simulacao(db.Model):
+    __tablename__ = 'simulacao'
+    id = db.Column(db.Integer, primary_key=True)
+    renda = db.Column(db.String(128), nullable=False)
+    imovel = db.Column(db.String(128), nullable=False)
+    juros = db.Column(db.Float, nullable=False, default=0.0)
+    entrada = db.Column(db.Float, nullable=False, default=0.0)
+    subsidio = db.Column(db.Float, nullable=False, default=0.0)
+    valor_liberado = db.Column(db.Float, nullable=False, default=0.0)
+    sac_primeira = db.Column(db.Float, nullable=False, default=0.0)
+    sac_ultima = db.Column(db.Float, nullable=False, default=0.0)
+    price_primeira = db.Column(db.Float, nullable=False, default=0.0)
+    price_ultima = db.Column(db.Float, nullable=False, default=0.0)
+
+    # o seed faz upsert por (renda, imovel)
+    __table_args__ = (db.Index('uq_simulacao_renda_imovel', 'renda', 'imovel', unique=True),)
+
+    # convenience
+    def to_tuple(self):
+        return (self.renda, self.imovel, self.juros, self.entrada, self.subsidio,
+                self.valor_liberado, self.sac_primeira, self.sac_ultima,
+                self.price_primeira, self.price_ultima)
+
+class Cliente(db.Model):
+    __tablename__ = 'cliente'
+    id = db.Column(db.Integer, primary_key=True)
+    nome = db.Column(db.String(256))
+    telefone = db.Column(db.String(64))
+    renda = db.Column(db.String(128))
+    valor_imovel = db.Column(db.String(128))
+    entrada = db.Column(db.Float)
+    entrada_calculada = db.Column(db.Float)
+    valor_financiado = db.Column(db.Float)
+    parcela_price = db.Column(db.Float)
+    parcela_sac_ini = db.Column(db.Float)
+    parcela_sac_fim = db.Column(db.Float)
+    prazo = db.Column(db.Integer)
+    faixa = db.Column(db.String(64))
+    juros = db.Column(db.Float)
+    subsidio = db.Column(db.Float)
+    fgts = db.Column(db.Float)
+    aprovado = db.Column(db.Integer)
+    criado_em = db.Column(db.String(64))
+    # um lead por telefone (ver leads.py); as colunas acima são da última simulação
+    telefone_e164 = db.Column(db.String(16))
+    simulacoes = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+
+    # filtros do /admin com paginação por id
+    __table_args__ = (
+        db.Index('ix_cliente_faixa_id', 'faixa', 'id'),
+        db.Index('ix_cliente_renda_id', 'renda', 'id'),
+        db.Index('ix_cliente_imovel_id', 'valor_imovel', 'id'),
+        db.Index('uq_cliente_telefone_e164', 'telefone_e164', unique=True),
+    )
+
+# histórico enxuto das simulações de cada lead (leads.CAMPOS_SIMULACAO), uma linha por /simular
+class ClienteSimulacao(db.Model):
+    __tablename__ = 'cliente_simulacao'
+    id = db.Column(db.Integer, primary_key=True)
+    cliente_id = db.Column(db.Integer, db.ForeignKey('cliente.id', ondelete='CASCADE'), nullable=False)
+    criado_em = db.Column(db.String(64))
+    renda = db.Column(db.String(128))
+    valor_imovel = db.Column(db.String(128))
+    faixa = db.Column(db.String(64))
+    valor_financiado = db.Column(db.Float)
+    parcela_price = db.Column(db.Float)
+    parcela_sac_ini = db.Column(db.Float)
+    parcela_sac_fim = db.Column(db.Float)
+    prazo = db.Column(db.Integer)
+    juros = db.Column(db.Float)
+
+    __table_args__ = (db.Index('ix_cliente_simulacao_cliente_id', 'cliente_id', 'id'),)
+
+# ids de clientes juntados por `python leads.py juntar`: o /resultado/<id> antigo redireciona
+# para o lead que ficou
+class ClienteAlias(db.Model):
+    __tablename__ = 'cliente_alias'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    cliente_id = db.Column(db.Integer, db.ForeignKey('cliente.id', ondelete='CASCADE'), nullable=False)
+
+    __table_args__ = (db.Index('ix_cliente_alias_cliente_id', 'cliente_id'),)
+
+# leads e valor financiado por dia × faixa × renda × imóvel, mantidos junto com cliente
+# (ver resumo.py); o /admin/resumo lê só daqui
+class ClienteResumo(db.Model):
+    __tablename__ = 'cliente_resumo'
+    dia = db.Column(db.String(10), primary_key=True)
+    faixa = db.Column(db.String(64), primary_key=True)
+    renda = db.Column(db.String(128), primary_key=True)
+    valor_imovel = db.Column(db.String(128), primary_key=True)
+    leads = db.Column(db.Integer, nullable=False)
+    soma_financiado_centavos = db.Column(db.BigInteger, nullable=False)
+
+# segmentos do arquivo morto (arquivo.py): tamanho confirmado de cada arquivo mensal, gravado
+# na mesma transação que apaga os leads arquivados
+class ArquivoSegmento(db.Model):
+    __tablename__ = 'arquivo_segmento'
+    mes = db.Column(db.String(7), primary_key=True)
+    bytes = db.Column(db.BigInteger, nullable=False)
+    linhas = db.Column(db.Integer, nullable=False)
+    atualizado_em = db.Column(db.Float, nullable=False)
+
+# hash do conteúdo de cada seed já aplicado; seed igual custa uma consulta
+class SeedVersao(db.Model):
+    __tablename__ = 'seed_versao'
+    nome = db.Column(db.String(64), primary_key=True)
+    hash = db.Column(db.String(64), nullable=False)
+    aplicado_em = db.Column(db.Float, nullable=False)
+
+class EmailOutbox(db.Model):
+    __tablename__ = 'email_outbox'
+    id = db.Column(db.Integer, primary_key=True)
+    assunto = db.Column(db.String(256), nullable=False)
+    corpo = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(16), nullable=False, default=outbox.PENDENTE, index=True)
+    tentativas = db.Column(db.Integer, nullable=False, default=0)
+    proxima_tentativa = db.Column(db.Float, nullable=False, default=0.0)
+    criado_em = db.Column(db.Float, nullable=False)
+    enviado_em = db.Column(db.Float)
+    erro = db.Column(db.String(512))
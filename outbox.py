@@ -0,0 +1,195 @@
+# outbox.py
+# Fila persistente de e-mails (tabela email_outbox) e o remetente em segundo plano.
+#
+# As requisições só gravam uma linha na fila, na mesma transação do cliente; uma thread
+# drena a fila por uma única conexão SMTP reaproveitada, com retry e backoff exponencial.
+# Com `digest_min` > 0 as mensagens pendentes são agrupadas num único e-mail quando a mais
+# antiga completa esse tempo. Entre os workers do gunicorn só um processo envia: quem
+# segura o flock do arquivo de trava; os outros ficam de reserva e assumem se ele morrer.
+import fcntl
+import logging
+import os
+import smtplib
+import tempfile
+import threading
+import time
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+PENDENTE, ENVIADO, FALHOU = 'pendente', 'enviado', 'falhou'
+
+
+class ConexaoSMTP:
+    # conexão SMTP persistente; reconecta quando o servidor derruba a sessão ociosa
+    def __init__(self, host, port, usuario='', senha='', starttls=True, timeout=30, ocioso_max=240):
+        self.host, self.port = host, int(port)
+        self.usuario, self.senha = usuario, senha
+        self.starttls, self.timeout, self.ocioso_max = starttls, timeout, ocioso_max
+        self._smtp = None
+        self._ultimo_uso = 0.0
+        self.conexoes = 0
+
+    def _conectar(self):
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.starttls:
+                smtp.starttls()
+            if self.usuario and self.senha:
+                smtp.login(self.usuario, self.senha)
+        except Exception:
+            smtp.close()
+            raise
+        self._smtp = smtp
+        self.conexoes += 1
+
+    def fechar(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except Exception:
+                self._smtp.close()
+            self._smtp = None
+
+    def enviar(self, msg):
+        if self._smtp is not None and time.time() - self._ultimo_uso > self.ocioso_max:
+            self.fechar()
+        for tentativa in (1, 2):
+            if self._smtp is None:
+                self._conectar()
+            try:
+                self._smtp.send_message(msg)
+                break
+            except smtplib.SMTPServerDisconnected:
+                # sessão caiu entre envios: reconecta uma vez antes de desistir
+                self._smtp = None
+                if tentativa == 2:
+                    raise
+        self._ultimo_uso = time.time()
+
+
+class Outbox:
+    def __init__(self, app, db, modelo, conexao, remetente, destino, digest_min=0, intervalo=5,
+                 max_tentativas=8, backoff_base=30, backoff_max=3600, caminho_trava=None,
+                 observar_envio=None):
+        self.app, self.db, self.modelo = app, db, modelo
+        self.conexao = conexao
+        self.remetente, self.destino = remetente, destino
+        self.digest_min = float(digest_min)
+        self.intervalo = intervalo
+        self.max_tentativas = max_tentativas
+        self.backoff_base, self.backoff_max = backoff_base, backoff_max
+        self.caminho_trava = caminho_trava or os.path.join(tempfile.gettempdir(), 'simulador_outbox.lock')
+        # chamado após cada envio com (segundos, ok); usado pelas métricas
+        self.observar_envio = observar_envio
+        self._evento = threading.Event()
+        self._pid = None
+        self._trava = None
+
+    # ---------- lado da requisição ----------
+    def enfileirar(self, assunto, corpo):
+        # só adiciona à sessão; quem chama faz o commit junto com o restante da transação
+        item = self.modelo(**self.linha(assunto, corpo))
+        self.db.session.add(item)
+        return item
+
+    def linha(self, assunto, corpo):
+        # colunas de um e-mail novo na fila (o asgi.py grava com a sua própria conexão)
+        return dict(assunto=assunto, corpo=corpo, status=PENDENTE, tentativas=0,
+                    criado_em=time.time(), proxima_tentativa=0.0)
+
+    def acordar(self):
+        self.iniciar()
+        self._evento.set()
+
+    def iniciar(self):
+        # uma thread por processo, criada depois do fork
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._trava = None
+        self._evento = threading.Event()
+        threading.Thread(target=self._loop, name='outbox', daemon=True).start()
+
+    # ---------- remetente ----------
+    def _sou_remetente(self):
+        if self._trava is not None:
+            return True
+        fd = os.open(self.caminho_trava, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._trava = fd
+        return True
+
+    def _loop(self):
+        while True:
+            self._evento.wait(self.intervalo)
+            self._evento.clear()
+            if not self._sou_remetente():
+                continue
+            try:
+                with self.app.app_context():
+                    self.drenar()
+            except Exception:
+                logging.exception('Erro ao drenar a fila de e-mails')
+
+    def _mensagem(self, assunto, corpo):
+        msg = MIMEMultipart()
+        msg['From'] = self.remetente
+        msg['To'] = self.destino
+        msg['Subject'] = assunto
+        msg.attach(MIMEText(corpo, 'plain'))
+        return msg
+
+    def _falha(self, itens, agora, erro):
+        for item in itens:
+            item.tentativas += 1
+            item.erro = str(erro)[:500]
+            if item.tentativas >= self.max_tentativas:
+                item.status = FALHOU
+            else:
+                espera = min(self.backoff_base * 2 ** (item.tentativas - 1), self.backoff_max)
+                item.proxima_tentativa = agora + espera
+        self.conexao.fechar()
+
+    def drenar(self, lote=100):
+        # uma passada pela fila; devolve quantos itens foram enviados
+        M, sessao = self.modelo, self.db.session
+        agora = time.time()
+        pendentes = (M.query.filter(M.status == PENDENTE, M.proxima_tentativa <= agora)
+                     .order_by(M.id).limit(lote).all())
+        if not pendentes:
+            return 0
+
+        if self.digest_min > 0:
+            if agora - min(p.criado_em for p in pendentes) < self.digest_min * 60:
+                return 0
+            corpo = ('\n' + '-' * 40 + '\n').join(p.corpo for p in pendentes)
+            grupos = [(pendentes, self._mensagem(f'Resumo: {len(pendentes)} novas simulações', corpo))]
+        else:
+            grupos = [([p], self._mensagem(p.assunto, p.corpo)) for p in pendentes]
+
+        enviados = 0
+        for itens, msg in grupos:
+            t0 = time.perf_counter()
+            try:
+                self.conexao.enviar(msg)
+            except Exception as e:
+                if self.observar_envio:
+                    self.observar_envio(time.perf_counter() - t0, False)
+                logging.warning('Falha ao enviar e-mail (nova tentativa agendada): %s', e)
+                self._falha(itens, agora, e)
+                sessao.commit()
+                break
+            if self.observar_envio:
+                self.observar_envio(time.perf_counter() - t0, True)
+            for item in itens:
+                item.status = ENVIADO
+                item.enviado_em = time.time()
+            sessao.commit()
+            enviados += len(itens)
+        if enviados:
+            logging.info('E-mails enviados: %d', enviados)
+        return enviados
@@ -0,0 +1,239 @@
+# paginas.py
+# Páginas estáticas pré-compiladas: o HTML é renderizado uma vez, guardado em bytes
+# (identidade e gzip) com ETag forte, e servido com suporte a 304 Not Modified.
+# Cada página guarda a chave das entradas com que foi renderizada (template, listas de
+# opções...); só é renderizada de novo quando essa chave muda.
+#
+# PaginasLRU faz o mesmo para páginas por registro (o /resultado/<id>), com limite de
+# tamanho e invalidação por chave entre os workers.
+import fcntl
+import gzip
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+from flask import Response, request
+
+
+class Pagina:
+    def __init__(self, html):
+        self.corpo = html.encode('utf-8')
+        self.corpo_gzip = gzip.compress(self.corpo, compresslevel=9, mtime=0)
+        self.etag = hashlib.sha256(self.corpo).hexdigest()[:32]
+        self.etag_gzip = self.etag + '-gz'
+
+
+class PaginasPrecompiladas:
+    def __init__(self, cache_control='no-cache'):
+        # no-cache: o navegador guarda a página, mas revalida com If-None-Match a cada uso
+        self.cache_control = cache_control
+        self._paginas = {}
+        self.renderizacoes = 0
+
+    def obter(self, nome, chave, renderizar):
+        atual = self._paginas.get(nome)
+        if atual is None or atual[0] != chave:
+            atual = (chave, Pagina(renderizar()))
+            self._paginas[nome] = atual
+            self.renderizacoes += 1
+        return atual[1]
+
+    def responder(self, nome, chave, renderizar):
+        return responder(self.obter(nome, chave, renderizar), self.cache_control)
+
+
+def responder(p, cache_control='no-cache'):
+    usar_gzip = request.accept_encodings['gzip'] > 0
+    etag = p.etag_gzip if usar_gzip else p.etag
+    if request.if_none_match.contains(etag):
+        r = Response(status=304)
+    else:
+        r = Response(p.corpo_gzip if usar_gzip else p.corpo, mimetype='text/html')
+        if usar_gzip:
+            r.headers['Content-Encoding'] = 'gzip'
+    r.set_etag(etag)
+    r.headers['Cache-Control'] = cache_control
+    r.headers['Vary'] = 'Accept-Encoding'
+    return r
+
+
+def caminho_invalidacoes_padrao():
+    base = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return os.path.join(base, 'simulador_resultado.invalidacoes')
+
+
+class PaginasLRU:
+    # Páginas renderizadas por chave, no máximo `max_paginas` por worker (sai a usada há
+    # mais tempo). invalidar() tira a chave daqui e a acrescenta num arquivo de
+    # invalidações (uma por linha, append); a cada consulta os workers comparam inode e
+    # tamanho do arquivo (um stat) e descartam as chaves novas. Um worker novo começa do fim
+    # do arquivo, pois ainda não tem páginas.
+    #
+    # O arquivo não cresce para sempre: passando de `max_bytes`, quem escreveu troca-o por um
+    # arquivo vazio da geração seguinte (primeira linha "#<geração>"). Cada worker mantém o
+    # arquivo que está lendo aberto, então termina de ler a geração antiga pelo descritor
+    # antes de passar à nova; se pulou uma geração (ou o arquivo foi recriado), descarta tudo.
+    # Escritas e trocas são serializadas por flock num arquivo `.trava` ao lado, para nenhuma
+    # linha ir para uma geração já trocada. `observar(acerto)` é chamado a cada consulta.
+    def __init__(self, max_paginas=2000, caminho_invalidacoes=None, cache_control='no-cache', observar=None,
+                 max_bytes=1 << 20):
+        self.max_paginas = max_paginas
+        self.caminho = caminho_invalidacoes or caminho_invalidacoes_padrao()
+        self.cache_control = cache_control
+        self.observar = observar
+        self.max_bytes = max_bytes
+        self._paginas = OrderedDict()
+        self._trava = threading.Lock()
+        # sem arquivo ainda: o primeiro que escrever cria a geração 1
+        self._fd = self._ino = None
+        self._geracao = self._lido = 0
+        self.hits = self.misses = self.evictions = self.invalidacoes = self.rotacoes = 0
+        if self._abrir():
+            self._lido = os.fstat(self._fd).st_size
+
+    def _stat(self):
+        try:
+            return os.stat(self.caminho)
+        except OSError:
+            return None
+
+    def _abrir(self):
+        # abre a geração atual e lê o cabeçalho; False se o arquivo ainda não existe
+        try:
+            self._fd = os.open(self.caminho, os.O_RDONLY)
+        except OSError:
+            return False
+        self._ino = os.fstat(self._fd).st_ino
+        self._geracao, self._lido = _cabecalho(os.pread(self._fd, 32, 0))
+        return True
+
+    def _ler(self):
+        # aplica as linhas completas entre o que já foi lido e o fim do arquivo aberto
+        tamanho = os.fstat(self._fd).st_size
+        if tamanho < self._lido:
+            # truncado por fora: não dá para saber o que mudou
+            self._paginas.clear()
+            self._lido = tamanho
+            return
+        novas = os.pread(self._fd, tamanho - self._lido, self._lido)
+        # só linhas completas; uma escrita em andamento fica para a próxima
+        novas = novas[:novas.rfind(b'\n') + 1]
+        self._lido += len(novas)
+        for chave in novas.split():
+            if self._paginas.pop(chave.decode(), None) is not None:
+                self.invalidacoes += 1
+
+    def _sincronizar(self):
+        st = self._stat()
+        atual = (st.st_ino, st.st_size) if st is not None else None
+        if atual == ((self._ino, self._lido) if self._fd is not None else None):
+            return
+        with self._trava:
+            st = self._stat()
+            if self._fd is not None:
+                if st is not None and st.st_ino == self._ino:
+                    self._ler()
+                    return
+                # geração trocada (ou arquivo apagado): termina a antiga pelo descritor aberto
+                self._ler()
+                os.close(self._fd)
+                self._fd = None
+            anterior = self._geracao
+            if not self._abrir():
+                return
+            if self._geracao != anterior + 1:
+                # geração pulada ou arquivo recriado: não dá para saber o que mudou
+                self._paginas.clear()
+            self._ler()
+
+    def buscar(self, chave):
+        self._sincronizar()
+        with self._trava:
+            p = self._paginas.get(str(chave))
+            if p is not None:
+                self._paginas.move_to_end(str(chave))
+                self.hits += 1
+            else:
+                self.misses += 1
+        if self.observar is not None:
+            self.observar(p is not None)
+        return p
+
+    def guardar(self, chave, html):
+        p = Pagina(html)
+        with self._trava:
+            self._paginas[str(chave)] = p
+            self._paginas.move_to_end(str(chave))
+            while len(self._paginas) > self.max_paginas:
+                self._paginas.popitem(last=False)
+                self.evictions += 1
+        return p
+
+    def obter(self, chave, renderizar):
+        # `renderizar` devolve o HTML, ou None quando não há página (nada é guardado)
+        # se a chave for invalidada enquanto renderiza, a linha no arquivo a tira daqui na
+        # próxima busca (o próprio worker também lê o que escreveu)
+        p = self.buscar(chave)
+        if p is None:
+            html = renderizar()
+            p = self.guardar(chave, html) if html is not None else None
+        return p
+
+    def invalidar(self, *chaves):
+        with self._trava:
+            for chave in chaves:
+                if self._paginas.pop(str(chave), None) is not None:
+                    self.invalidacoes += 1
+        trava = os.open(f'{self.caminho}.trava', os.O_WRONLY | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(trava, fcntl.LOCK_EX)
+            try:
+                fd = os.open(self.caminho, os.O_RDWR | os.O_APPEND)
+            except FileNotFoundError:
+                self._trocar(1)
+                fd = os.open(self.caminho, os.O_RDWR | os.O_APPEND)
+            try:
+                os.write(fd, ''.join(f'{c}\n' for c in chaves).encode())
+                if os.fstat(fd).st_size > self.max_bytes:
+                    geracao = _cabecalho(os.pread(fd, 32, 0))[0]
+                    self._trocar(geracao + 1)
+                    self.rotacoes += 1
+            finally:
+                os.close(fd)
+        finally:
+            os.close(trava)
+
+    def _trocar(self, geracao):
+        # arquivo vazio da geração seguinte, trocado de uma vez (os.replace): quem já tem o
+        # antigo aberto ainda lê o fim dele
+        tmp = f'{self.caminho}.{os.getpid()}'
+        with open(tmp, 'wb') as f:
+            f.write(f'#{geracao}\n'.encode())
+        os.replace(tmp, self.caminho)
+
+    def estatisticas(self):
+        with self._trava:
+            paginas = list(self._paginas.values())
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits, 'misses': self.misses,
+            'hit_rate': round(self.hits / total, 4) if total else 0.0,
+            'evictions': self.evictions, 'invalidacoes': self.invalidacoes,
+            'geracao': self._geracao, 'rotacoes': self.rotacoes,
+            'paginas': len(paginas), 'max_paginas': self.max_paginas,
+            'bytes': sum(len(p.corpo) + len(p.corpo_gzip) for p in paginas),
+        }
+
+
+def _cabecalho(inicio):
+    # (geração, bytes do cabeçalho) do arquivo de invalidações; arquivo sem cabeçalho
+    # (criado por uma versão anterior) é a geração 0
+    if not inicio.startswith(b'#') or b'\n' not in inicio:
+        return 0, 0
+    linha = inicio[:inicio.index(b'\n') + 1]
+    try:
+        return int(linha[1:]), len(linha)
+    except ValueError:
+        return 0, 0
@@ -0,0 +1,156 @@
+# resumo.py
+# Tabela de resumo (rollup) dos leads por dia, faixa, renda e imóvel, para o /admin/resumo.
+#
+# Cada balde (dia, faixa, renda, valor_imovel) guarda o número de leads e a soma do valor
+# financiado em centavos (inteiro: somar e subtrair não acumula erro). A tabela é mantida
+# na mesma transação das escritas em cliente: o /simular soma 1 com um upsert
+# (INSERT ... ON CONFLICT DO UPDATE, atômico no SQLite e no Postgres) e o excluir subtrai 1
+# e apaga o balde que zerou. Lead que simula de novo (leads.py) sai do balde da simulação
+# anterior e entra no da nova. O painel lê só esta tabela, então custa O(baldes), não O(leads).
+#
+#   python resumo.py reconstruir   # recalcula a partir de cliente e confere
+#   python resumo.py verificar     # só confere; sai com código 1 se houver diferença
+#
+# Escritas em cliente fora do main.py/asgi.py (simulacao.py, SQL à mão) não passam por
+# aqui: rode `reconstruir` depois delas.
+import argparse
+import functools
+import os
+import sys
+
+from sqlalchemy import (BigInteger, String, bindparam, cast, delete, func, insert, literal_column, select,
+                        union_all, update)
+from sqlalchemy.dialects import postgresql, sqlite
+
+CHAVE = ('dia', 'faixa', 'renda', 'valor_imovel')
+# colunas de cliente usadas para montar o balde
+CAMPOS = ('criado_em', 'faixa', 'renda', 'valor_imovel', 'valor_financiado')
+
+
+def dia(criado_em):
+    # criado_em é gravado como 'dd/mm/aaaa HH:MM'; o dia fica 'aaaa-mm-dd' (ordena como data)
+    if criado_em is None:
+        return ''
+    return f'{criado_em[6:10]}-{criado_em[3:5]}-{criado_em[0:2]}'
+
+
+def dia_sql(coluna):
+    # o mesmo que dia(), em SQL (NULL vira '')
+    return func.coalesce(func.substr(coluna, 7, 4, type_=String) + '-' + func.substr(coluna, 4, 2, type_=String)
+                         + '-' + func.substr(coluna, 1, 2, type_=String), '')
+
+
+def agrupar(clientes, sinal=1):
+    # um dict de parâmetros por balde, com os totais dos clientes (mapeamentos com CAMPOS)
+    baldes = {}
+    for c in clientes:
+        chave = (dia(c['criado_em']), c['faixa'] or '', c['renda'] or '', c['valor_imovel'] or '')
+        b = baldes.setdefault(chave, [0, 0])
+        b[0] += sinal
+        b[1] += sinal * round((c['valor_financiado'] or 0) * 100)
+    return [{'b_dia': k[0], 'b_faixa': k[1], 'b_renda': k[2], 'b_valor_imovel': k[3], 'b_leads': n, 'b_soma': s}
+            for k, (n, s) in baldes.items()]
+
+
+@functools.lru_cache(maxsize=None)
+def _incremento(tabela, dialeto):
+    ins = (postgresql.insert if dialeto == 'postgresql' else sqlite.insert)(tabela)
+    stmt = ins.values(dia=bindparam('b_dia'), faixa=bindparam('b_faixa'), renda=bindparam('b_renda'),
+                      valor_imovel=bindparam('b_valor_imovel'), leads=bindparam('b_leads'),
+                      soma_financiado_centavos=bindparam('b_soma'))
+    return stmt.on_conflict_do_update(
+        index_elements=list(CHAVE),
+        set_={'leads': tabela.c.leads + stmt.excluded.leads,
+              'soma_financiado_centavos': tabela.c.soma_financiado_centavos + stmt.excluded.soma_financiado_centavos})
+
+
+@functools.lru_cache(maxsize=None)
+def _decremento(tabela):
+    mesmo_balde = [tabela.c[k] == bindparam('b_' + k) for k in CHAVE]
+    # b_leads e b_soma chegam negativos (agrupar com sinal=-1)
+    subtrair = update(tabela).where(*mesmo_balde).values(
+        leads=tabela.c.leads + bindparam('b_leads'),
+        soma_financiado_centavos=tabela.c.soma_financiado_centavos + bindparam('b_soma'))
+    return subtrair, delete(tabela).where(*mesmo_balde, tabela.c.leads <= 0)
+
+
+def instrucoes(tabela, dialeto, clientes, sinal=1):
+    # [(instrução, parâmetros)] a executar na transação que grava (sinal=1) ou apaga (sinal=-1)
+    # os clientes; serve para conexão síncrona (sessão do Flask) e assíncrona (asgi.py)
+    params = agrupar(clientes, sinal)
+    if not params:
+        return []
+    if sinal > 0:
+        return [(_incremento(tabela, dialeto), params)]
+    subtrair, apagar = _decremento(tabela)
+    return [(subtrair, params), (apagar, [{k: p[k] for k in ('b_dia', 'b_faixa', 'b_renda', 'b_valor_imovel')}
+                                          for p in params])]
+
+
+def _agregado(cliente):
+    # colunas na ordem de CHAVE + leads + soma, calculadas direto de cliente
+    return [dia_sql(cliente.c.criado_em).label('dia'), func.coalesce(cliente.c.faixa, '').label('faixa'),
+            func.coalesce(cliente.c.renda, '').label('renda'),
+            func.coalesce(cliente.c.valor_imovel, '').label('valor_imovel'), func.count().label('leads'),
+            func.sum(cast(func.round(func.coalesce(cliente.c.valor_financiado, 0) * 100), BigInteger))
+            .label('soma_financiado_centavos')]
+
+
+def reconstrucao(tabela, cliente):
+    # as instruções que recalculam a tabela inteira (também usadas pela migração p/ Postgres)
+    colunas = _agregado(cliente)
+    return [delete(tabela), insert(tabela).from_select([c.name for c in colunas],
+                                                       select(*colunas).group_by(*colunas[:4]))]
+
+
+def reconstruir(con, tabela, cliente):
+    # apaga e recalcula tudo numa transação (con já dentro de uma, ex.: engine.begin())
+    if con.dialect.name == 'postgresql':
+        # segura upserts/decrementos concorrentes até o commit: os que já tinham escrito
+        # terminam antes (e entram na contagem), os seguintes somam sobre o resultado novo.
+        # No SQLite a transação de escrita já é exclusiva.
+        con.exec_driver_sql(f'LOCK TABLE {tabela.name} IN EXCLUSIVE MODE')
+    for stmt in reconstrucao(tabela, cliente):
+        con.execute(stmt)
+
+
+def verificar(con, tabela, cliente):
+    # compara a tabela com o agregado de cliente; devolve [(balde, (leads, soma) esperados,
+    # (leads, soma) gravados)] dos que diferem. Uma consulta só (UNION ALL): os dois lados
+    # vêm do mesmo snapshot, mesmo com escritas acontecendo.
+    colunas = _agregado(cliente)
+    esperado = select(*colunas, literal_column("'c'").label('origem')).group_by(*colunas[:4])
+    gravado = select(*(tabela.c[k] for k in CHAVE), tabela.c.leads, tabela.c.soma_financiado_centavos,
+                     literal_column("'r'").label('origem'))
+    baldes = {}
+    for *chave, leads, soma, origem in con.execute(union_all(esperado, gravado)):
+        b = baldes.setdefault(tuple(chave), {'c': (0, 0), 'r': (0, 0)})
+        b[origem] = (leads, soma or 0)
+    return [(k, b['c'], b['r']) for k, b in sorted(baldes.items()) if b['c'] != b['r']]
+
+
+def main_cli():
+    p = argparse.ArgumentParser(description='Reconstrói ou confere a tabela de resumo dos leads')
+    p.add_argument('acao', choices=('reconstruir', 'verificar'))
+    args = p.parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import main
+    tabela, cliente = main.ClienteResumo.__table__, main.Cliente.__table__
+    with main.app.app_context():
+        engine = main.db.engine
+        if args.acao == 'reconstruir':
+            with engine.begin() as con:
+                reconstruir(con, tabela, cliente)
+        with engine.connect() as con:
+            diferencas = verificar(con, tabela, cliente)
+            baldes, leads = con.execute(select(func.count(), func.coalesce(func.sum(tabela.c.leads), 0))).one()
+    for chave, esperado, gravado in diferencas[:50]:
+        print(f"{' | '.join(chave)}: esperado {esperado[0]} leads / {esperado[1]} centavos, "
+              f"gravado {gravado[0]} / {gravado[1]}")
+    print(f'{baldes} baldes, {leads} leads; {len(diferencas)} divergentes')
+    sys.exit(1 if diferencas else 0)
+
+
+if __name__ == '__main__':
+    main_cli()
@@ -1,14 +1,18 @@
 # main.py
 from flask import Flask, request, session, redirect, url_for
-import sqlite3
 from datetime import datetime
 import os
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import logging
+import time
 import html
 
+import amortizacao
+from conexao_sqlite import ConexaoSQLite
+from indice_simulacoes import IndiceSimulacoes, versao_de
+
 # logging
 logging.basicConfig(level=logging.INFO)
 
@@ -21,9 +25,17 @@ _db_dir = os.path.dirname(DB)
 if _db_dir:
     os.makedirs(_db_dir, exist_ok=True)
 
+# uma conexão persistente por worker, em modo WAL (ver conexao_sqlite.py)
+DBC = ConexaoSQLite(DB, os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL'),
+                    int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000')))
+
 app.secret_key = os.getenv('FLASK_SECRET', 'segredo123')
 ADMIN_PASS = os.getenv('ADMIN_PASS', 'jm.eng2025')
 PRAZO = int(os.getenv('PRAZO', '420'))
+TAXA_ADM = float(os.getenv('TAXA_ADM', amortizacao.TAXA_ADM_PADRAO))
+TAXA_SEGURO = float(os.getenv('TAXA_SEGURO', amortizacao.TAXA_SEGURO_PADRAO))
+AMORTIZACAO_CENTAVOS = os.getenv('AMORTIZACAO_CENTAVOS', '0') == '1'
+ADMIN_POR_PAGINA = int(os.getenv('ADMIN_POR_PAGINA', '100'))
 
 # e-mail (por padrão vazio; configure no painel)
 EMAIL_USER = os.getenv('EMAIL_USER', '')
@@ -196,10 +208,18 @@ def fmt(v):
     except Exception:
         return v
 
+# Índice (renda, imovel) -> simulação, carregado uma vez por worker (ver indice_simulacoes.py)
+def carregar_simulacoes():
+    return DBC.consultar('''SELECT renda, imovel, juros, entrada, subsidio, valor_liberado,
+                            sac_primeira, sac_ultima, price_primeira, price_ultima FROM simulacao''').fetchall()
+
+INDICE_SIMULACOES = IndiceSimulacoes(carregar_simulacoes, os.getenv('INDICE_VERSAO_PATH') or None)
+
 # Inicializa banco de dados e simulações
 def init_db():
     try:
-        with sqlite3.connect(DB) as con:
+        aplicado = False
+        with DBC.transacao() as con:
             cur = con.cursor()
             cur.execute('''CREATE TABLE IF NOT EXISTS cliente (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -215,6 +235,10 @@ def init_db():
                 juros REAL, entrada REAL, subsidio REAL, valor_liberado REAL,
                 sac_primeira REAL, sac_ultima REAL, price_primeira REAL, price_ultima REAL
             )''')
+            # hash do seed já aplicado: seed igual custa uma consulta
+            cur.execute('''CREATE TABLE IF NOT EXISTS seed_versao (
+                nome TEXT PRIMARY KEY, hash TEXT NOT NULL, aplicado_em REAL NOT NULL
+            )''')
 
             expected = [
                 # Imóvel até 210k
@@ -248,18 +272,28 @@ def init_db():
                 ('acima de 10.000 reais','imovel ate 500k',10.47,100000.00,0.00,400000.00,3600.00,804.98,3563.97,3463.69),
             ]
 
-            inserted = 0
-            for row in expected:
-                cur.execute('SELECT COUNT(*) FROM simulacao WHERE renda=? AND imovel=?', (row[0], row[1]))
-                if cur.fetchone()[0] == 0:
-                    cur.execute('''INSERT INTO simulacao (renda,imovel,juros,entrada,subsidio,valor_liberado,
+            versao = versao_de(expected)
+            atual = cur.execute("SELECT hash FROM seed_versao WHERE nome='simulacao'").fetchone()
+            if atual is None or atual[0] != versao:
+                # bases antigas podem ter linhas repetidas; o upsert precisa do índice único
+                cur.execute('DELETE FROM simulacao WHERE id NOT IN (SELECT MIN(id) FROM simulacao GROUP BY renda, imovel)')
+                cur.execute('CREATE UNIQUE INDEX IF NOT EXISTS uq_simulacao_renda_imovel ON simulacao (renda, imovel)')
+                cur.executemany('''INSERT INTO simulacao (renda,imovel,juros,entrada,subsidio,valor_liberado,
                                    sac_primeira,sac_ultima,price_primeira,price_ultima)
-                                   VALUES (?,?,?,?,?,?,?,?,?,?)''', row)
-                    inserted += 1
-
-            if inserted:
-                con.commit()
-                logging.info('Inseridas %d simulações faltantes na tabela simulacao', inserted)
+                                   VALUES (?,?,?,?,?,?,?,?,?,?)
+                                   ON CONFLICT (renda, imovel) DO UPDATE SET
+                                   juros=excluded.juros, entrada=excluded.entrada, subsidio=excluded.subsidio,
+                                   valor_liberado=excluded.valor_liberado, sac_primeira=excluded.sac_primeira,
+                                   sac_ultima=excluded.sac_ultima, price_primeira=excluded.price_primeira,
+                                   price_ultima=excluded.price_ultima''', expected)
+                cur.execute('''INSERT INTO seed_versao (nome, hash, aplicado_em) VALUES ('simulacao', ?, ?)
+                               ON CONFLICT (nome) DO UPDATE SET hash=excluded.hash, aplicado_em=excluded.aplicado_em''',
+                            (versao, time.time()))
+                aplicado = True
+
+        if aplicado:
+            INDICE_SIMULACOES.invalidar()
+            logging.info('Seed de simulações aplicada (versão %s)', versao)
     except Exception as e:
         logging.exception('Erro ao inicializar DB: %s', e)
 
@@ -343,24 +377,23 @@ def simular():
     if not all([nome, tel, renda, imovel]):
         return 'Dados incompletos', 400
 
-    with sqlite3.connect(DB) as con:
-        s = con.execute('SELECT * FROM simulacao WHERE renda=? AND imovel=?', (renda, imovel)).fetchone()
-        if s is None:
-            return "Simulação não encontrada para a combinação selecionada.", 400
+    s = INDICE_SIMULACOES.obter(renda, imovel)
+    if s is None:
+        return "Simulação não encontrada para a combinação selecionada.", 400
 
-        # índices conforme CREATE TABLE simulacao: id(0), renda(1), imovel(2), juros(3), entrada(4), subsidio(5), valor_liberado(6),
-        # sac_primeira(7), sac_ultima(8), price_primeira(9), price_ultima(10)
-        price, sac_ini, sac_fim = s[9], s[7], s[8]
-        faixa = faixa_por_renda(renda)
-        criado = datetime.now().strftime('%d/%m/%Y %H:%M')
+    price, sac_ini, sac_fim = amortizacao.parcelas(s, PRAZO, TAXA_ADM, TAXA_SEGURO, centavos=AMORTIZACAO_CENTAVOS)
+    faixa = faixa_por_renda(renda)
+    criado = datetime.now().strftime('%d/%m/%Y %H:%M')
 
-        con.execute(
+    with DBC.transacao() as con:
+        cur = con.execute(
             '''INSERT INTO cliente (nome, telefone, renda, valor_imovel, entrada, entrada_calculada, valor_financiado,
                                parcela_price, parcela_sac_ini, parcela_sac_fim, prazo, faixa, juros, subsidio, fgts, aprovado, criado_em)
                VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)''',
-            (nome, tel, renda, imovel, s[4], s[4], s[6], price, sac_ini, sac_fim, PRAZO, faixa, s[3], s[5], 0, 1, criado)
+            (nome, tel, renda, imovel, s.entrada, s.entrada, s.valor_liberado, price, sac_ini, sac_fim, PRAZO, faixa,
+             s.juros, s.subsidio, 0, 1, criado)
         )
-        cid = con.execute('SELECT last_insert_rowid()').fetchone()[0]
+        cid = cur.lastrowid
 
     # tenta enviar email, mas não quebra a resposta ao usuário em caso de falha
     try:
@@ -373,8 +406,7 @@ def simular():
 # Resultado: exibe tudo em ordem
 @app.route('/resultado/<int:id>')
 def resultado(id):
-    with sqlite3.connect(DB) as con:
-        c = con.execute('SELECT * FROM cliente WHERE id=?', (id,)).fetchone()
+    c = DBC.consultar('SELECT * FROM cliente WHERE id=?', (id,)).fetchone()
 
     if not c:
         return 'Simulação não encontrada', 404
@@ -442,18 +474,30 @@ def admin():
     if 'admin' not in session:
         return redirect(url_for('login'))
 
-    with sqlite3.connect(DB) as con:
-        rows = con.execute('SELECT * FROM cliente ORDER BY criado_em DESC').fetchall()
+    # paginação por chave, como no main.py: `antes` é o menor id da página anterior, então
+    # cada página é um range scan na chave primária, sem OFFSET e sem ler a tabela inteira
+    antes = request.args.get('antes', type=int)
+    limite = min(max(request.args.get('limite', ADMIN_POR_PAGINA, type=int), 1), 500)
+    sql = ('SELECT id, nome, telefone, renda, valor_imovel, parcela_price, parcela_sac_ini, parcela_sac_fim, '
+           'faixa, prazo, criado_em FROM cliente')
+    if antes is not None:
+        rows = DBC.consultar(sql + ' WHERE id < ? ORDER BY id DESC LIMIT ?', (antes, limite)).fetchall()
+    else:
+        rows = DBC.consultar(sql + ' ORDER BY id DESC LIMIT ?', (limite,)).fetchall()
 
     trs = ''
     for r in rows:
-        # r índice conforme CREATE TABLE cliente
+        # r na ordem das colunas do SELECT
         trs += f"""
         <tr>
           <td>{r[0]}</td><td>{html.escape(str(r[1]))}</td><td>{html.escape(str(r[2]))}</td><td>{html.escape(str(r[3]))}</td><td>{html.escape(str(r[4]))}</td>
-          <td>R$ {fmt(r[8])}</td><td>R$ {fmt(r[9])}</td><td>R$ {fmt(r[10])}</td>
-          <td>{html.escape(str(r[12]))}</td><td>{r[11]}</td><td>{html.escape(str(r[17]))}</td>
+          <td>R$ {fmt(r[5])}</td><td>R$ {fmt(r[6])}</td><td>R$ {fmt(r[7])}</td>
+          <td>{html.escape(str(r[8]))}</td><td>{r[9]}</td><td>{html.escape(str(r[10]))}</td>
         </tr>"""
+    proxima = ''
+    if len(rows) == limite:
+        proxima = (f"<a href='{url_for('admin', antes=rows[-1][0], limite=limite)}' "
+                   "class='btn-custom btn-secondary'>Próxima página</a>")
 
     logo_url = url_for('static', filename='logo.jpg')
     return STYLE + f"""
@@ -465,6 +509,7 @@ def admin():
         <th>PRICE</th><th>SAC ini</th><th>SAC fim</th><th>Faixa</th><th>Prazo</th><th>Data/Hora</th></tr></thead>
         <tbody>{trs}</tbody>
       </table>
+      {proxima}
     </div>"""
 
 # Logout
@@ -477,18 +522,13 @@ def logout():
 @app.route('/excluir/<int:id>')
 def excluir(id):
     if 'admin' in session:
-        with sqlite3.connect(DB) as con:
+        with DBC.transacao() as con:
             con.execute('DELETE FROM cliente WHERE id=?', (id,))
     return redirect(url_for('admin'))
 
 # helper para consultar simulacoes
 def get_dados():
-    conn = sqlite3.connect(DB)
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, renda, imovel, juros, entrada, subsidio, valor_liberado FROM simulacao")
-    dados = cursor.fetchall()
-    conn.close()
-    return dados
+    return DBC.consultar("SELECT id, renda, imovel, juros, entrada, subsidio, valor_liberado FROM simulacao").fetchall()
 
 if __name__ == '__main__':
     host = os.getenv('HOST', '127.0.0.1')
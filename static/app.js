@@ -0,0 +1 @@
+$(function(){ $('#telefone').mask('(00) 00000-0000'); });
@@ -0,0 +1,25 @@
+# tests/conftest.py
+# Os módulos do app ficam na raiz do repositório (sem pacote): põe a raiz no sys.path.
+# Testes que importam o main usam um SQLite novo num diretório temporário (o main lê o
+# ambiente e inicializa o banco no import), sem e-mail e sem tocar no /dev/shm.
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TMP = tempfile.mkdtemp(prefix='simulador-testes-')
+os.environ.pop('DATABASE_URL', None)
+os.environ.update({
+    'DB_PATH': os.path.join(TMP, 'simulador.db'),
+    'INDICE_VERSAO_PATH': os.path.join(TMP, 'indice.versao'),
+    'RESULTADO_CACHE_PATH': os.path.join(TMP, 'resultado.invalidacoes'),
+    'INIT_LOCK_PATH': os.path.join(TMP, 'init.lock'),
+    'OUTBOX_LOCK_PATH': os.path.join(TMP, 'outbox.lock'),
+    'PROMETHEUS_MULTIPROC_DIR': os.path.join(TMP, 'metricas'),
+    'ARQUIVO_DIR': os.path.join(TMP, 'arquivo'),
+    'SEND_EMAIL': '0',
+    'ADMIN_PASS': 'teste',
+    'GRUPO_COMMIT_MS': '0',
+})
+os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
@@ -0,0 +1,48 @@
+# tests/test_amortizacao_centavos.py
+# Motor em centavos: as amortizações somam exatamente o valor financiado e o saldo final é 0,
+# com um cenário só (loop em inteiros do Python) e com vários (loop vetorizado).
+import numpy as np
+import pytest
+
+import amortizacao
+
+ENCARGOS = (25.0, 0.000252)
+
+
+def cenarios(n, seed=7):
+    rng = np.random.default_rng(seed)
+    valor = rng.uniform(20000, 400000, n).round(2)
+    juros = rng.uniform(0, 12, n).round(2)
+    juros[0] = 0.0
+    return valor, juros
+
+
+@pytest.mark.parametrize('tabela', [amortizacao.tabela_sac_centavos, amortizacao.tabela_price_centavos])
+@pytest.mark.parametrize('n', [1, 300])
+@pytest.mark.parametrize('prazo', [1, 2, 120, 420, 600])
+def test_amortizacoes_somam_o_financiado(tabela, n, prazo):
+    valor, juros = cenarios(n)
+    t = tabela(valor, juros, prazo, *ENCARGOS)
+    assert t['amortizacao'].dtype == np.int64
+    assert (t['amortizacao'].sum(axis=-1) == np.rint(valor * 100)).all()
+    assert (t['saldo'][..., -1] == 0).all()
+    assert (t['parcela'] == t['amortizacao'] + t['juros'] + t['encargos']).all()
+
+
+def test_valor_com_centavos_quebrados():
+    # 100.000,01 em 3 meses não divide: a soma continua exata
+    for tabela in (amortizacao.tabela_sac_centavos, amortizacao.tabela_price_centavos):
+        t = tabela(100000.01, 9.5, 3, *ENCARGOS)
+        assert t['amortizacao'].sum() == 10000001
+        assert t['saldo'][-1] == 0
+
+
+def test_resumo_bate_com_as_tabelas_com_prazo_por_cenario():
+    valor, juros = cenarios(50)
+    prazos = np.random.default_rng(3).integers(1, 421, 50)
+    r = amortizacao.resumo_centavos(valor, juros, prazos, *ENCARGOS)
+    for k in range(50):
+        sac = amortizacao.tabela_sac_centavos(valor[k], juros[k], prazos[k], *ENCARGOS)['parcela']
+        price = amortizacao.tabela_price_centavos(valor[k], juros[k], prazos[k], *ENCARGOS)['parcela']
+        assert (r['sac_primeira'][k], r['sac_ultima'][k]) == (sac[0], sac[-1])
+        assert (r['price_primeira'][k], r['price_ultima'][k]) == (price[0], price[-1])
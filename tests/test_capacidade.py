@@ -0,0 +1,45 @@
+# tests/test_capacidade.py
+# /capacidade recusa entradas que não dão um número útil; /admin/capacidade usa a regra do
+# /simular para a elegibilidade e mostra a do motor (30% da renda, 80% financiado) ao lado.
+import csv
+import io
+
+import pytest
+
+
+@pytest.fixture(scope='module')
+def cliente():
+    import main
+    return main.app.test_client()
+
+
+@pytest.mark.parametrize('consulta', [
+    'renda=1e308', 'renda=3500&juros=nan', 'renda=3500&juros=inf', 'renda=nan', 'renda=-1',
+    'renda=3500&prazo=0', 'renda=3500&prazo=601', 'renda=3500&juros=-1', 'renda=20000000',
+])
+def test_capacidade_fora_do_intervalo(cliente, consulta):
+    r = cliente.get('/capacidade?' + consulta)
+    assert r.status_code == 400 and 'erro' in r.get_json()
+
+
+def test_capacidade_responde_numeros_finitos(cliente):
+    d = cliente.get('/capacidade?renda=3500,10000000&juros=8.47&prazo=420').get_json()
+    assert all(v > 0 for k in ('financiado_sac', 'imovel_sac', 'financiado_price', 'imovel_price') for v in d[k])
+
+
+def test_elegibilidade_segue_a_cotacao_do_simular(cliente):
+    # "até 3.500 / 210k" é cotado a 30% da renda na SAC; "até 3.500 / 500k" não tem SAC cotada
+    ids = {}
+    for imovel, tel in (('imovel ate 210k', '(62) 95555-0001'), ('imovel ate 500k', '(62) 95555-0002')):
+        r = cliente.post('/simular', data={'nome': 'Cap', 'telefone': tel, 'renda': 'até 3.500 reais',
+                                           'valor_imovel': imovel})
+        ids[imovel] = int(r.headers['Location'].rsplit('/', 1)[1])
+    cliente.post('/login', data={'senha': 'teste'})
+    r = cliente.get('/admin/capacidade?formato=csv')
+    linhas = {int(l['id']): l for l in csv.DictReader(io.StringIO(r.get_data(as_text=True)))}
+    cotado, sem_sac = linhas[ids['imovel ate 210k']], linhas[ids['imovel ate 500k']]
+    assert (cotado['elegivel_sac'], cotado['elegivel_price']) == ('1', '1')
+    assert (sem_sac['elegivel_sac'], sem_sac['elegivel_price']) == ('0', '1')
+    # o motor exige financiar 80% do teto do imóvel: 400 mil não cabem em 30% de 3.500
+    assert (sem_sac['cabe_sac'], sem_sac['cabe_price']) == ('0', '0')
+    assert 'Cabem SAC (motor)' in cliente.get('/admin/capacidade').get_data(as_text=True)
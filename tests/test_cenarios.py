@@ -0,0 +1,50 @@
+# tests/test_cenarios.py
+# /resultado/<id>/cenarios: limites dos eixos validados (400) e o ponto atual do cliente na grade.
+import json
+
+import pytest
+
+
+@pytest.fixture(scope='module')
+def lead():
+    import main
+    c = main.app.test_client()
+    with main.app.app_context():
+        s = main.Simulacao.query.filter(main.Simulacao.valor_liberado > 0).order_by(main.Simulacao.id).first()
+    r = c.post('/simular', data={'nome': 'Cenários', 'telefone': '(51) 94444-0000', 'renda': s.renda,
+                                 'valor_imovel': s.imovel})
+    return c, r.headers['Location'] + '/cenarios'
+
+
+def test_grade_contem_o_ponto_atual(lead):
+    c, url = lead
+    r = c.get(url)
+    assert r.status_code == 200
+    d = r.get_json()
+    for eixo in ('juros', 'prazo', 'entrada'):
+        assert d['atual'][eixo] in d['eixos'][eixo]
+    assert d['shape'] == [len(d['eixos'][k]) for k in ('juros', 'prazo', 'entrada')]
+    assert len(d['price_centavos']) == d['shape'][0] * d['shape'][1] * d['shape'][2]
+
+
+@pytest.mark.parametrize('args', [
+    'prazo_min=0&prazo_max=0',
+    'prazo_min=0.4&prazo_max=0.4',
+    'prazo_max=601',
+    'entrada_max=nan',
+    'juros_min=-inf',
+    'juros_max=inf',
+    'n_juros=0',
+])
+def test_limites_invalidos(lead, args):
+    c, url = lead
+    r = c.get(f'{url}?{args}')
+    assert r.status_code == 400
+    json.loads(r.get_data(as_text=True))
+
+
+def test_prazo_de_um_mes(lead):
+    c, url = lead
+    d = c.get(f'{url}?prazo_min=1&prazo_max=1').get_json()
+    assert d['eixos']['prazo'] == [1]
+    assert min(d['price_centavos']) > 0
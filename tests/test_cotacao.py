@@ -0,0 +1,74 @@
+# tests/test_cotacao.py
+# Cotação: o motor só substitui as parcelas do seed quando reproduz as quatro dentro de
+# TOLERANCIA_SEED, com um modelo de encargos só (amortizacao.conferir_seed).
+import pytest
+
+import amortizacao
+from indice_simulacoes import LinhaSimulacao
+
+ENCARGOS = (25.0, 0.000252)
+
+
+def linha(valor, juros, deslocamento=0.0, centavos=False, **parcelas):
+    # linha do seed gerada pelo próprio motor (mais um deslocamento em todas as parcelas)
+    if centavos:
+        r = {k: int(v) / 100 for k, v in amortizacao.resumo_centavos(valor, juros, 420, *ENCARGOS).items()}
+    else:
+        r = amortizacao.resumo(valor, juros, 420, *ENCARGOS)
+    semeadas = {k: round(float(r[k]) + deslocamento, 2) for k in amortizacao.TOLERANCIA_SEED}
+    semeadas.update(parcelas)
+    return LinhaSimulacao('até 3.500 reais', 'imovel ate 210k', juros, 0.0, 0.0, valor, **semeadas)
+
+
+@pytest.mark.parametrize('centavos', [False, True])
+def test_seed_do_modelo_usa_o_motor(centavos):
+    s = linha(150000.0, 8.47, centavos=centavos)
+    reproduz, calculado, _ = amortizacao.conferir_seed(s, 420, *ENCARGOS, centavos=centavos)
+    assert reproduz
+    assert amortizacao.parcelas(s, 420, *ENCARGOS, centavos=centavos) == (
+        calculado['price_primeira'], calculado['sac_primeira'], calculado['sac_ultima'])
+
+
+@pytest.mark.parametrize('s', [
+    linha(150000.0, 8.47, deslocamento=0.50),       # fora da tolerância
+    linha(150000.0, 8.47, price_ultima=1.0),        # só a última PRICE diverge
+    linha(150000.0, 8.47, sac_primeira=0.0, sac_ultima=0.0),  # SAC fora da faixa
+    linha(0.0, 0.0),                               # combinação sem financiamento
+])
+def test_fora_da_tolerancia_cota_o_seed(s):
+    assert not amortizacao.conferir_seed(s, 420, *ENCARGOS)[0]
+    assert amortizacao.parcelas(s, 420, *ENCARGOS) == (s.price_primeira, s.sac_primeira, s.sac_ultima)
+
+
+def test_cliente_cotado_pelo_seed():
+    import main
+    c = main.app.test_client()
+    r = c.post('/simular', data={'nome': 'Seed', 'telefone': '(61) 93333-0000', 'renda': 'até 3.500 reais',
+                                 'valor_imovel': 'imovel ate 500k'})
+    with main.app.app_context():
+        lead = main.db.session.get(main.Cliente, int(r.headers['Location'].rsplit('/', 1)[1]))
+        assert (lead.parcela_price, lead.parcela_sac_ini, lead.parcela_sac_fim) == (1050.0, 0.0, 0.0)
+        assert not main.cotacao_do_motor(lead)
+    d = c.get(r.headers['Location'] + '/cenarios').get_json()
+    assert d['cotacao'] == {'fonte': 'seed', 'price': 1050.0, 'sac': 0.0, 'elegivel_sac': False,
+                            'elegivel_price': True}
+
+
+def test_tabela_do_cliente_cotado_pelo_seed():
+    import main
+    c = main.app.test_client()
+    r = c.post('/simular', data={'nome': 'Tabela', 'telefone': '(61) 94444-0000', 'renda': 'até 3.500 reais',
+                                 'valor_imovel': 'imovel ate 500k'})
+    url = r.headers['Location']
+    pagina = c.get(url).get_data(as_text=True)
+    assert f'{url}/tabela?sistema=price' in pagina and 'Tabela de amortização (estimativa)' in pagina
+    # sem SAC cotada no seed: não há tabela SAC
+    assert c.get(url + '/tabela?sistema=sac').status_code == 422
+    r = c.get(url + '/tabela?sistema=price')
+    assert r.headers['X-Cotacao-Fonte'] == 'seed' and r.headers['X-Parcela-Cotada'] == '1050.00'
+    html = r.get_data(as_text=True)
+    assert 'Estimativa' in html and 'R$ 1.050,00' in html and 'ver SAC' not in html
+    r = c.get(url + '/tabela?sistema=price&formato=csv')
+    assert r.headers['X-Cotacao-Fonte'] == 'seed'
+    assert r.headers['Content-Disposition'].endswith('_estimativa.csv')
+    assert r.get_data(as_text=True).splitlines()[0] == ','.join(main.CAMPOS_TABELA)
@@ -0,0 +1,146 @@
+# tests/test_leads.py
+# Um lead por telefone (leads.py): normalização E.164 e o resumo do painel (resumo.py) sem
+# divergências depois de upsert, exclusão em lote, arquivo morto e `leads.py juntar`.
+import gzip
+import json
+import os
+from datetime import datetime
+
+import pytest
+
+import leads
+
+
+@pytest.mark.parametrize('telefone, esperado', [
+    ('(11) 99999-0000', '+5511999990000'),
+    ('+55 11 99999 0000', '+5511999990000'),
+    ('5511999990000', '+5511999990000'),
+    ('0055 11 99999-0000', '+5511999990000'),
+    ('011 9999-0000', '+5511999990000'),       # celular sem o nono dígito
+    ('0 21 11 99999-0000', '+5511999990000'),  # longa distância com operadora
+    ('11 9999-0000', '+5511999990000'),
+    ('(21) 3333-4444', '+552133334444'),       # fixo
+    ('+1 415 555 2671', '+14155552671'),       # outro país
+    ('(10) 99999-0000', None),                 # DDD com zero
+    ('(11) 1999-0000', None),                  # fixo começando em 1
+    ('99999-0000', None),                      # sem DDD
+    ('+1 23', None),
+    ('sem telefone', None),
+    ('', None),
+    (None, None),
+])
+def test_e164(telefone, esperado):
+    assert leads.e164(telefone) == esperado
+
+
+@pytest.fixture(scope='module')
+def main():
+    import main
+    return main
+
+
+@pytest.fixture
+def cliente(main):
+    c = main.app.test_client()
+    c.post('/login', data={'senha': os.environ['ADMIN_PASS']})
+    return c
+
+
+@pytest.fixture
+def combinacoes(main):
+    with main.app.app_context():
+        return [(s.renda, s.imovel) for s in main.Simulacao.query.filter(main.Simulacao.valor_liberado > 0)
+                .order_by(main.Simulacao.id).limit(4)]
+
+
+def divergencias(main):
+    import resumo
+    with main.app.app_context(), main.db.engine.connect() as con:
+        return resumo.verificar(con, main.ClienteResumo.__table__, main.Cliente.__table__)
+
+
+def simular(cliente, nome, telefone, combinacao):
+    r = cliente.post('/simular', data={'nome': nome, 'telefone': telefone, 'renda': combinacao[0],
+                                      'valor_imovel': combinacao[1]})
+    assert r.status_code == 302
+    return int(r.headers['Location'].rsplit('/', 1)[1])
+
+
+def test_upsert_mesmo_telefone_um_lead(main, cliente, combinacoes):
+    ids = [simular(cliente, 'Ana', t, combinacoes[n % len(combinacoes)])
+           for n, t in enumerate(['(11) 98888-1000', '+55 11 98888 1000', '011 8888-1000'])]
+    outro = simular(cliente, 'Bia', '(11) 98888-2000', combinacoes[0])
+    sem = [simular(cliente, 'Caio', 'sem telefone', combinacoes[0]) for _ in range(2)]
+    assert len(set(ids)) == 1 and outro != ids[0] and sem[0] != sem[1]
+    with main.app.app_context():
+        lead = main.db.session.get(main.Cliente, ids[0])
+        assert (lead.telefone_e164, lead.simulacoes, lead.renda) == ('+5511988881000', 3, combinacoes[2][0])
+        assert main.ClienteSimulacao.query.filter_by(cliente_id=ids[0]).count() == 3
+    assert divergencias(main) == []
+
+
+def test_exclusao_em_lote(main, cliente, combinacoes):
+    nomes = [f'Lote {n}' if n < 20 else f'Removido {n}' for n in range(30)]
+    ids = [simular(cliente, nome, f'(21) 97777-{n:04d}', combinacoes[n % len(combinacoes)])
+           for n, nome in enumerate(nomes)]
+    simular(cliente, 'Lote 0', '(21) 97777-0000', combinacoes[1])
+    r = cliente.post('/admin/excluir', data={'id': [str(i) for i in ids[:10]]})
+    assert r.status_code == 200
+    r = cliente.post('/admin/excluir', data={'acao': 'filtro', 'q': 'Removido'})
+    assert r.status_code == 200
+    with main.app.app_context():
+        restantes = {c.nome for c in main.Cliente.query.filter(main.Cliente.id.in_(ids))}
+        assert restantes == set(nomes[10:20])
+        assert main.ClienteSimulacao.query.filter(main.ClienteSimulacao.cliente_id.in_(ids[:10])).count() == 0
+    assert cliente.get(f'/resultado/{ids[0]}').status_code == 404
+    assert divergencias(main) == []
+
+
+def test_arquivo_morto(main, cliente, combinacoes, monkeypatch):
+    import arquivo
+
+    class Antigo(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return datetime(2020, 3, 15, 10, 30)
+
+    monkeypatch.setattr(main, 'datetime', Antigo)
+    antigos = [simular(cliente, f'Antigo {n}', f'(31) 96666-{n:04d}', combinacoes[n % len(combinacoes)])
+               for n in range(12)]
+    simular(cliente, 'Antigo 0', '(31) 96666-0000', combinacoes[1])
+    monkeypatch.undo()
+    with main.app.app_context():
+        total, _ = arquivo.arquivar(main, 12, os.environ['ARQUIVO_DIR'], lote=5)
+        assert total >= 12
+        assert main.Cliente.query.filter(main.Cliente.id.in_(antigos)).count() == 0
+    with gzip.open(os.path.join(os.environ['ARQUIVO_DIR'], arquivo.nome('2020-03')), 'rt') as fp:
+        arquivados = {r['nome']: r for r in map(json.loads, fp)}
+    assert len(arquivados['Antigo 0']['historico']) == 2
+    assert divergencias(main) == []
+
+
+def test_juntar_base_antiga(main, cliente, combinacoes):
+    # clientes repetidos de antes do índice único: sem telefone_e164, cada um com seu histórico
+    from sqlalchemy import insert
+    c, s, a = main.Cliente.__table__, main.ClienteSimulacao.__table__, main.ClienteAlias.__table__
+    import resumo
+    with main.app.app_context():
+        valores = main.dados_cliente('Velho', '(41) 98888-7000', *combinacoes[0])
+        ids = []
+        with main.db.engine.begin() as con:
+            for telefone in ('(41) 98888-7000', '41 98888 7000', '(41) 8888-7000'):
+                v = dict(valores, telefone=telefone, telefone_e164=None)
+                ids.append(con.execute(insert(c).values(v).returning(c.c.id)).scalar())
+                con.execute(insert(s).values(dict({k: v[k] for k in leads.CAMPOS_SIMULACAO}, cliente_id=ids[-1])))
+            resumo.reconstruir(con, main.ClienteResumo.__table__, c)
+            pares = leads.juntar(con, c, s, a)
+            resumo.reconstruir(con, main.ClienteResumo.__table__, c)
+        assert sorted(pares) == [(ids[0], ids[2]), (ids[1], ids[2])]
+        lead = main.db.session.get(main.Cliente, ids[2])
+        assert (lead.telefone_e164, lead.simulacoes) == ('+5541988887000', 3)
+    r = cliente.get(f'/resultado/{ids[0]}')
+    assert (r.status_code, r.headers['Location']) == (301, f'/resultado/{ids[2]}')
+    assert simular(cliente, 'Velho', '41988887000', combinacoes[1]) == ids[2]
+    assert divergencias(main) == []
+    cliente.post('/admin/excluir', data={'id': [str(ids[2])]})
+    assert cliente.get(f'/resultado/{ids[0]}').status_code == 404
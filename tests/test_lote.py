@@ -0,0 +1,54 @@
+# tests/test_lote.py
+# Entrada do /simular/lote: números em pt-BR, CSV com ';' e arquivos em Latin-1/cp1252.
+import csv
+import io
+
+import numpy as np
+import pytest
+
+import lote
+
+
+@pytest.mark.parametrize('texto, esperado', [
+    ('3500', 3500.0),
+    ('3500.5', 3500.5),
+    ('3.500,50', 3500.5),
+    ('R$ 3.500,50', 3500.5),
+    ('R$ 200.000', 200000.0),
+    ('1.250.000', 1250000.0),
+    ('8.47', 8.47),
+    ('200.00', 200.0),
+    ('1.2345', 1.2345),
+    (' 420 ', 420.0),
+])
+def test_numero(texto, esperado):
+    assert lote._numero(texto) == esperado
+
+
+@pytest.mark.parametrize('texto', ['', 'abc', '1.000.00', None])
+def test_numero_invalido(texto):
+    assert np.isnan(lote._numero(texto))
+
+
+def test_csv_com_ponto_e_virgula_em_latin1():
+    corpo = ('renda;valor_imovel;prazo;juros;observação\n'
+             '3.500,00;R$ 200.000;420;8,47;José\n'
+             '4.000;250.000,00;;9,5;São Paulo\n').encode('cp1252')
+    primeira, segunda = lote.ler_csv(lote.linhas_texto(io.BytesIO(corpo)))
+    assert primeira == (3500.0, 200000.0, 420.0, 8.47)
+    assert segunda[:2] == (4000.0, 250000.0) and np.isnan(segunda[2]) and segunda[3] == 9.5
+
+
+def test_linhas_texto_mistura_utf8_e_cp1252():
+    corpo = '﻿renda,valor_imovel\n'.encode('utf-8') + 'São,1\n'.encode('cp1252') + 'João,2\n'.encode('utf-8')
+    assert list(lote.linhas_texto(io.BytesIO(corpo))) == ['renda,valor_imovel\n', 'São,1\n', 'João,2\n']
+
+
+def test_endpoint_aceita_csv_latin1_com_ponto_e_virgula():
+    import main
+    corpo = 'renda;valor_imovel;prazo;juros;cidade\n3.500;R$ 200.000;420;8,47;Brasília\n'.encode('latin-1')
+    r = main.app.test_client().post('/simular/lote', data=corpo, content_type='text/csv')
+    assert r.status_code == 200
+    [linha] = list(csv.DictReader(io.StringIO(r.get_data(as_text=True))))
+    assert linha['erro'] == '' and float(linha['renda']) == 3500 and float(linha['valor_imovel']) == 200000
+    assert float(linha['valor_financiado']) > 0
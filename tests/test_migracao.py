@@ -0,0 +1,126 @@
+# tests/test_migracao.py
+# migrate_sqlite_to_postgres.py de ponta a ponta: um SQLite com o schema do modelos.py é
+# migrado, a migração é interrompida no meio de `cliente` e retomada pelo checkpoint, e o
+# destino tem de bater linha a linha com a origem. Precisa de um Postgres descartável:
+#
+#   TESTE_POSTGRES_URL=postgresql://postgres@127.0.0.1:5432/postgres python -m pytest tests/test_migracao.py
+#
+# (um banco novo é criado e apagado nesse servidor). Sem a variável os testes são pulados.
+import os
+import uuid
+
+import pytest
+from sqlalchemy import create_engine, insert, select
+
+import modelos
+
+URL = os.getenv('TESTE_POSTGRES_URL')
+pytestmark = pytest.mark.skipif(not URL, reason='defina TESTE_POSTGRES_URL para testar a migração')
+
+TABELAS = ('simulacao', 'cliente', 'cliente_simulacao', 'cliente_alias', 'seed_versao')
+
+
+@pytest.fixture
+def origem(tmp_path):
+    caminho = str(tmp_path / 'origem.db')
+    engine = create_engine(f'sqlite:///{caminho}')
+    modelos.db.metadata.create_all(engine)
+    t = modelos.db.metadata.tables
+    with engine.begin() as con:
+        con.execute(insert(t['simulacao']), [dict(renda=f'renda {i}', imovel='imovel ate 210k', juros=5.0 + i / 100,
+                                                  valor_liberado=1000.0 * i, price_primeira=0.1 * i)
+                                             for i in range(1, 25)])
+        con.execute(insert(t['cliente']), [dict(nome=f"Lead\t{i} \\ 'x'\n", telefone=f'(38) 9{i:08d}',
+                                                renda='até 3.500 reais', valor_imovel='imovel ate 210k',
+                                                valor_financiado=141444.84 + i, parcela_price=824.52,
+                                                prazo=420, faixa='Faixa 2', juros=5.64, simulacoes=1 + i % 3,
+                                                criado_em=f'{1 + i % 28:02d}/01/2025 10:00',
+                                                telefone_e164=f'+55389{i:08d}')
+                                           for i in range(1, 251)])
+        con.execute(insert(t['cliente_simulacao']), [dict(cliente_id=1 + i % 250, renda='até 3.500 reais', prazo=420,
+                                                          valor_financiado=1.5 * i) for i in range(300)])
+        con.execute(insert(t['cliente_alias']), [dict(id=1000 + i, cliente_id=i) for i in range(1, 6)])
+        con.execute(insert(t['seed_versao']), [dict(nome='simulacao', hash='abc', aplicado_em=1.0)])
+    engine.dispose()
+    return caminho
+
+
+@pytest.fixture
+def destino():
+    import psycopg2
+    nome = f'migracao_teste_{uuid.uuid4().hex[:8]}'
+    admin = psycopg2.connect(URL)
+    admin.autocommit = True
+    admin.cursor().execute(f"CREATE DATABASE {nome} ENCODING 'UTF8' TEMPLATE template0")
+    url = URL.rsplit('/', 1)[0] + '/' + nome
+    yield url
+    admin.cursor().execute(f'DROP DATABASE {nome} WITH (FORCE)')
+    admin.close()
+
+
+def linhas(url, tabela):
+    engine = create_engine(url)
+    with engine.connect() as con:
+        t = modelos.db.metadata.tables[tabela]
+        chave = [t.c.id] if 'id' in t.c else list(t.primary_key.columns)
+        r = [tuple(l) for l in con.execute(select(t).order_by(*chave))]
+    engine.dispose()
+    return r
+
+
+def checkpoints(url):
+    engine = create_engine(url)
+    with engine.connect() as con:
+        r = dict(con.exec_driver_sql('SELECT tabela, ultimo_id FROM migracao_checkpoint').fetchall())
+    engine.dispose()
+    return r
+
+
+def test_migracao_interrompida_retoma_do_checkpoint(origem, destino, monkeypatch):
+    import migrate_sqlite_to_postgres as migracao
+    pg = destino.replace('postgresql://', 'postgresql+psycopg2://', 1)
+    gravar_checkpoint = migracao._checkpoint
+    chamadas = []
+
+    def interromper(pg_cur, tabela, ultimo_id, n):
+        if tabela.name == 'cliente':
+            chamadas.append(ultimo_id)
+            if len(chamadas) == 3:
+                raise RuntimeError('interrompida')
+        gravar_checkpoint(pg_cur, tabela, ultimo_id, n)
+
+    monkeypatch.setattr(migracao, '_checkpoint', interromper)
+    with pytest.raises(RuntimeError):
+        migracao.migrate_sqlite_to_postgres(origem, destino, lote=40)
+    # dois blocos de cliente confirmados; o terceiro (COPY + checkpoint) foi desfeito junto
+    assert checkpoints(pg)['cliente'] == 80 and len(linhas(pg, 'cliente')) == 80
+
+    monkeypatch.setattr(migracao, '_checkpoint', gravar_checkpoint)
+    migracao.migrate_sqlite_to_postgres(origem, destino, lote=40)
+    sqlite = f'sqlite:///{origem}'
+    for tabela in TABELAS:
+        assert linhas(pg, tabela) == linhas(sqlite, tabela), tabela
+    leads = list(modelos.ClienteResumo.__table__.c.keys()).index('leads')
+    assert sum(l[leads] for l in linhas(pg, 'cliente_resumo')) == 250
+
+    # sequences ajustadas: o próximo id vem depois do maior migrado
+    engine = create_engine(pg)
+    with engine.begin() as con:
+        novo = con.execute(insert(modelos.Cliente.__table__).values(nome='novo').returning(
+            modelos.Cliente.__table__.c.id)).scalar()
+    engine.dispose()
+    assert novo == 251
+
+
+def test_reiniciar_sem_truncar_recusa_sem_alterar_nada(origem, destino, capsys):
+    import migrate_sqlite_to_postgres as migracao
+    pg = destino.replace('postgresql://', 'postgresql+psycopg2://', 1)
+    migracao.migrate_sqlite_to_postgres(origem, destino, lote=100)
+    antes = checkpoints(pg)
+    with pytest.raises(SystemExit, match='--truncar'):
+        migracao.migrate_sqlite_to_postgres(origem, destino, reiniciar=True)
+    assert checkpoints(pg) == antes
+
+    migracao.migrate_sqlite_to_postgres(origem, destino, lote=100, truncar=True, reiniciar=True)
+    for tabela in TABELAS:
+        assert linhas(pg, tabela) == linhas(f'sqlite:///{origem}', tabela), tabela
@@ -0,0 +1,65 @@
+# tests/test_paginas.py
+# Cache do /resultado entre workers (paginas.PaginasLRU): dois objetos no mesmo arquivo de
+# invalidações fazem o papel de dois workers; o arquivo é trocado de geração ao passar do limite.
+import os
+
+import pytest
+
+from paginas import PaginasLRU
+
+
+@pytest.fixture
+def caminho(tmp_path):
+    return str(tmp_path / 'resultado.invalidacoes')
+
+
+def com_paginas(lru, *chaves):
+    for c in chaves:
+        lru.guardar(c, f'<p>{c}</p>')
+    return lru
+
+
+def test_invalidacao_chega_ao_outro_worker(caminho):
+    a, b = PaginasLRU(caminho_invalidacoes=caminho), PaginasLRU(caminho_invalidacoes=caminho)
+    com_paginas(b, 1, 2)
+    a.invalidar(1)
+    assert b.buscar(1) is None and b.buscar(2) is not None
+
+
+def test_arquivo_trocado_de_geracao_nao_perde_invalidacoes(caminho):
+    a = PaginasLRU(caminho_invalidacoes=caminho, max_bytes=64)
+    b = com_paginas(PaginasLRU(caminho_invalidacoes=caminho, max_bytes=64), *range(100))
+    for c in range(0, 100, 2):
+        a.invalidar(c)
+        b.buscar(c)
+    assert a.rotacoes >= 2 and os.path.getsize(caminho) <= 64 + 8
+    assert all(b.buscar(c) is None for c in range(0, 100, 2))
+    assert all(b.buscar(c) is not None for c in range(1, 100, 2))
+
+
+def test_worker_que_dormiu_varias_geracoes_descarta_tudo(caminho):
+    a = PaginasLRU(caminho_invalidacoes=caminho, max_bytes=16)
+    b = com_paginas(PaginasLRU(caminho_invalidacoes=caminho, max_bytes=16), 'x', 'y')
+    for c in range(10):
+        a.invalidar(f'chave-{c}')
+    assert b.buscar('x') is None and b.buscar('y') is None
+
+
+def test_geracao_lida_por_inteiro_antes_da_troca(caminho):
+    a = PaginasLRU(caminho_invalidacoes=caminho, max_bytes=16)
+    b = com_paginas(PaginasLRU(caminho_invalidacoes=caminho, max_bytes=16), 'x', 'y', 'z')
+    a.invalidar('x')        # cria a geração 1
+    b.buscar('z')           # b abre a geração 1
+    a.invalidar('y' * 20)   # passa do limite: geração 2
+    a.invalidar('y')        # já na geração 2
+    assert b.buscar('x') is None and b.buscar('y') is None and b.buscar('z') is not None
+    assert b.estatisticas()['geracao'] == 2
+
+
+def test_geracao_pulada_descarta_tudo(caminho):
+    a = PaginasLRU(caminho_invalidacoes=caminho, max_bytes=8)
+    a.invalidar('inicio')   # geração 1 trocada pela 2 logo na primeira escrita
+    b = com_paginas(PaginasLRU(caminho_invalidacoes=caminho, max_bytes=8), 'x', 'y')
+    os.unlink(caminho)      # b ainda lê a geração 2 pelo descritor aberto
+    a.invalidar('outra')    # recria o arquivo (geração 1 de novo)
+    assert b.buscar('x') is None and b.buscar('y') is None